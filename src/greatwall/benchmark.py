@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from resources.calibration import machine_info
+from resources.greatwall import GreatWall
+from resources.helpers import constants
+from resources.helpers.arena import Argon2Arena
+from resources.knowledge.fractal import Fractal
+from resources.knowledge.mnemonic import mnemonic
+from resources.knowledge.mnemonic.mnemonic import Mnemonic
+
+try:
+    import resource
+except ImportError:  # NOTE: Not available on Windows.
+    resource = None
+
+BASELINE_PATH = (
+    Path(os.environ.get("GREATWALL_CACHE_DIR", Path.home() / ".cache" / "greatwall"))
+    / "benchmark_baseline.json"
+)
+RESULTS_VERSION = 1
+_shapes_dir: Optional[tempfile.TemporaryDirectory] = None
+
+
+class Benchmark:
+    """A timed hot path of the derivation.
+
+    The setup is called before each repeat, out of the timing, and returns
+    the function timed, which is called `number` times in the repeat. The
+    teardown, if any, is called with the function after each repeat, out of
+    the timing too.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        setup: Callable[[], Callable[[], object]],
+        repeats: int = 5,
+        number: int = 1,
+        is_slow: bool = False,
+        teardown: Optional[Callable[[Callable[[], object]], None]] = None,
+    ) -> None:
+        self.name: str = name
+        self.setup: Callable[[], Callable[[], object]] = setup
+        self.teardown: Optional[Callable[[Callable[[], object]], None]] = teardown
+        self.repeats: int = repeats
+        self.number: int = number
+        self.is_slow: bool = is_slow
+
+    def run(self, quick: bool = False) -> dict:
+        """Time the benchmark, in seconds per call of the timed function.
+
+        The minor page faults per call are counted too, where the platform
+        reports them.
+        """
+        repeats = 1 if quick else self.repeats
+        number = max(1, self.number // 10) if quick else self.number
+        timings = []
+        faults = []
+        for _ in range(repeats):
+            function = self.setup()
+            start_faults = page_faults()
+            start_time = time.perf_counter()
+            for _ in range(number):
+                function()
+            timings.append((time.perf_counter() - start_time) / number)
+            if start_faults is not None:
+                faults.append((page_faults() - start_faults) / number)
+            if self.teardown is not None:
+                self.teardown(function)
+            # NOTE: Free what the function holds before the next setup.
+            del function
+        return {
+            "median": statistics.median(timings),
+            "min": min(timings),
+            "max": max(timings),
+            "page_faults": statistics.median(faults) if faults else None,
+            "repeats": repeats,
+            "number": number,
+        }
+
+
+def greatwall_setup(arity: int, tlp_param: int = 0) -> GreatWall:
+    """A GreatWall at the first level of a derivation, without prefetching."""
+    greatwall = GreatWall()
+    greatwall.set_prefetch_budget(0)
+    greatwall.set_themed_mnemo(constants.BIP39)
+    greatwall.set_tlp_param(tlp_param)
+    greatwall.set_depth(2)
+    greatwall.set_arity(arity)
+    greatwall.set_fractal_function_type(constants.BURNING_SHIP)
+    greatwall.set_sa0(greatwall.mnemo.to_mnemonic(bytes(range(16))))
+    greatwall.state = bytes(range(128))
+    greatwall._saved_states[greatwall._derivation_path] = greatwall.state
+    random.seed(0)
+    return greatwall
+
+
+def derivation_setup() -> Callable[[], object]:
+    greatwall = greatwall_setup(2, tlp_param=1)
+    return greatwall.init_state_hashes
+
+
+def shapes_dir() -> Path:
+    """The temporary directory the shape queries save their shapes to.
+
+    It is created on first use, out of the package, and removed on exit.
+    """
+    global _shapes_dir
+    if _shapes_dir is None:
+        _shapes_dir = tempfile.TemporaryDirectory(prefix="greatwall-benchmark-")
+    return Path(_shapes_dir.name)
+
+
+def query_setup(tacit_knowledge: str, arity: int) -> Callable[[], object]:
+    greatwall = greatwall_setup(arity)
+    greatwall.shaper.icons_dir = shapes_dir()
+    if tacit_knowledge == constants.FRACTAL:
+        # NOTE: The rendering processes are started out of the timing.
+        greatwall._render_fractals(
+            [(constants.BURNING_SHIP, 2.5, 0.25)] * greatwall.rendering_workers, 8
+        )
+    return {
+        constants.FORMOSA: greatwall.get_li_str_query,
+        constants.SHAPE: greatwall.get_shape_query,
+        constants.FRACTAL: greatwall.get_fractal_query,
+    }[tacit_knowledge]
+
+
+def query_teardown(query: Callable[[], object]) -> None:
+    """Stop the rendering processes of the GreatWall of the query."""
+    query.__self__.shutdown_rendering_pool()
+
+
+def fractal_setup(func_type: str, resolution: int) -> Callable[[], object]:
+    fractal = Fractal()
+    return lambda: fractal.update(
+        func_type=func_type,
+        real_p=2.5,
+        imag_p=0.25,
+        width=resolution,
+        height=resolution,
+    )
+
+
+def long_hash_setup(use_hash_arena: bool) -> Callable[[], object]:
+    """One iteration of the long hash, in an arena mapped out of the timing."""
+    greatwall = greatwall_setup(2)
+    hash_arena = None
+    if use_hash_arena:
+        hash_arena = Argon2Arena(greatwall.LONG_HASH_MEMORY_COST)
+    return lambda: greatwall._long_hash(greatwall.state, hash_arena)
+
+
+def mnemonic_load_setup() -> Callable[[], object]:
+    mnemonic._loaded_indexes.clear()
+    return lambda: Mnemonic("medieval_fantasy")
+
+
+def to_mnemonic_setup() -> Callable[[], object]:
+    mnemo = Mnemonic("medieval_fantasy")
+    return lambda: mnemo.to_mnemonic(bytes(range(32)))
+
+
+def to_entropy_setup() -> Callable[[], object]:
+    mnemo = Mnemonic("medieval_fantasy")
+    mnemonic_words = mnemo.to_mnemonic(bytes(range(32)))
+    return lambda: mnemo.to_entropy(mnemonic_words)
+
+
+def expand_password_setup() -> Callable[[], object]:
+    mnemo = Mnemonic(constants.BIP39)
+    password = "".join(
+        word[:4].ljust(4, "-") for word in mnemo.to_mnemonic(bytes(range(32))).split()
+    )
+    return lambda: mnemo.expand_password(password)
+
+
+def detect_theme_setup() -> Callable[[], object]:
+    mnemonic_words = Mnemonic("medieval_fantasy").to_mnemonic(bytes(range(32)))
+    return lambda: Mnemonic.detect_theme(mnemonic_words)
+
+
+BENCHMARKS: list[Benchmark] = [
+    Benchmark("derivation/sa0_to_sa3/tlp=1", derivation_setup, repeats=1, is_slow=True),
+    Benchmark(
+        "long_hash/low_level",
+        lambda: long_hash_setup(False),
+        repeats=3,
+        is_slow=True,
+    ),
+    Benchmark("long_hash/arena", lambda: long_hash_setup(True), repeats=3, is_slow=True),
+    *(
+        Benchmark(
+            f"query/{tacit_knowledge.lower()}/arity={arity}",
+            lambda tacit_knowledge=tacit_knowledge, arity=arity: query_setup(
+                tacit_knowledge, arity
+            ),
+            repeats=3,
+            teardown=query_teardown,
+        )
+        for tacit_knowledge, arity in [
+            (constants.FORMOSA, 2),
+            (constants.FORMOSA, 16),
+            (constants.FORMOSA, 64),
+            (constants.SHAPE, 2),
+            (constants.SHAPE, 16),
+            (constants.SHAPE, 64),
+            (constants.FRACTAL, 2),
+            (constants.FRACTAL, 4),
+            (constants.FRACTAL, 8),
+        ]
+    ),
+    *(
+        Benchmark(
+            f"fractal/{func_type}/{resolution}x{resolution}",
+            lambda func_type=func_type, resolution=resolution: fractal_setup(
+                func_type, resolution
+            ),
+            repeats=3,
+        )
+        for func_type in constants.FRACTAL_FUNCTIONS
+        for resolution in [256, 512, 1024]
+    ),
+    Benchmark("mnemonic/load", mnemonic_load_setup, repeats=20),
+    Benchmark("mnemonic/to_mnemonic", to_mnemonic_setup, number=1000),
+    Benchmark("mnemonic/to_entropy", to_entropy_setup, number=1000),
+    Benchmark("mnemonic/expand_password", expand_password_setup, number=100),
+    Benchmark("mnemonic/detect_theme", detect_theme_setup, number=1000),
+]
+
+
+def page_faults() -> Optional[int]:
+    """The minor page faults of this process so far, None if unknown."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+
+
+def run_benchmarks(
+    name_filter: str = "", quick: bool = False, include_slow: bool = True
+) -> dict:
+    """Run the benchmarks whose name contains the filter.
+
+    Returns:
+        The machine-readable results, with the `machine` they ran on and the
+        timings of each benchmark by name.
+    """
+    results = {}
+    for benchmark in BENCHMARKS:
+        if name_filter not in benchmark.name:
+            continue
+        if benchmark.is_slow and not include_slow:
+            continue
+        results[benchmark.name] = benchmark.run(quick)
+        print(
+            f"{benchmark.name:<40} {results[benchmark.name]['median'] * 1000:12.3f} ms",
+            file=sys.stderr,
+        )
+    return {
+        "version": RESULTS_VERSION,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "quick": quick,
+        "machine": machine_info(),
+        "results": results,
+    }
+
+
+def compare_results(
+    results: dict, baseline: dict, tolerance: float
+) -> tuple[list[dict], list[str]]:
+    """Compare the median timings of the results to the baseline ones.
+
+    Returns:
+        The comparison of each benchmark in both, with the `ratio` of the
+        result to the baseline, and the names of the benchmarks slower than
+        the baseline by more than the tolerance.
+    """
+    comparisons = []
+    regressions = []
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        ratio = result["median"] / baseline["results"][name]["median"]
+        comparisons.append(
+            {
+                "name": name,
+                "baseline": baseline["results"][name]["median"],
+                "result": result["median"],
+                "ratio": ratio,
+            }
+        )
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return comparisons, regressions
+
+
+def main(args: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the derivation hot paths and compare them to a "
+        "baseline, exiting with 1 on regressions."
+    )
+    parser.add_argument("--filter", default="", help="run the benchmarks matching")
+    parser.add_argument(
+        "--quick", action="store_true", help="run fewer repeats and calls"
+    )
+    parser.add_argument(
+        "--skip-slow", action="store_true", help="skip the derivation with a TLP"
+    )
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        default=BASELINE_PATH,
+        help=f"the baseline results to compare to (default: {BASELINE_PATH})",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="save the results as the baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="the slowdown over the baseline counted as regression (default: 0.25)",
+    )
+    args = parser.parse_args(args)
+
+    results = run_benchmarks(args.filter, args.quick, not args.skip_slow)
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"Saved the baseline to {args.baseline}")
+        return 0
+    if not args.baseline.is_file():
+        print(f"No baseline at {args.baseline}, use --save-baseline to create it")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("quick") != results["quick"]:
+        print("WARNING: The baseline and the results differ in --quick mode.")
+    comparisons, regressions = compare_results(results, baseline, args.tolerance)
+    for comparison in comparisons:
+        flag = "REGRESSION" if comparison["name"] in regressions else ""
+        print(
+            f"{comparison['name']:<40} {comparison['baseline'] * 1000:12.3f} ms "
+            f"-> {comparison['result'] * 1000:12.3f} ms "
+            f"x{comparison['ratio']:.2f} {flag}"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import getpass
 import sys
 
-from mnemonic.mnemonic import Mnemonic
+from resources.knowledge.mnemonic.mnemonic import Mnemonic
 
 
 class UserInterface:
@@ -2,15 +2,18 @@ import numpy as np
 from PyQt5.QtCore import (
     QEvent,
     QMargins,
+    QObject,
     QPoint,
     QRect,
     QRectF,
+    QRunnable,
     QSignalTransition,
     QSize,
     QState,
     QStateMachine,
     Qt,
     QThread,
+    QThreadPool,
     pyqtSignal,
 )
 from PyQt5.QtGui import QBrush, QColor, QIcon, QImage, QPixmap
@@ -27,6 +30,7 @@ from PyQt5.QtWidgets import (
     QLayout,
     QMainWindow,
     QMessageBox,
+    QProgressBar,
     QPushButton,
     QScrollArea,
     QSizePolicy,
@@ -40,7 +44,10 @@ from PyQt5.QtWidgets import (
 from resources.greatwall import GreatWall
 from resources.helpers import constants
 from resources.helpers.colormaps import color_palettes
+from resources.helpers.profiles import DEFAULT_TLP_PROFILE, TLP_PROFILES
+from resources.helpers.progress import ProgressEvent
 from resources.helpers.utils import FractalTacitKnowledgeParam
+from resources.knowledge.fractal import render_fractal
 
 
 class GreatWallThread(QThread):
@@ -49,6 +56,7 @@ class GreatWallThread(QThread):
     finished = pyqtSignal()
     canceled = pyqtSignal()
     error_occurred = pyqtSignal(str)  # Signal for passing error messages
+    progress = pyqtSignal(ProgressEvent)  # Signal for passing progress events
 
     def __init__(self, greatwall: GreatWall):
         super().__init__()
@@ -56,8 +64,12 @@ class GreatWallThread(QThread):
         self._is_initializing: bool = True
         self._is_canceled: bool = False
         self.user_choice: int = 0
+        # NOTE: Each read of a signal binds it anew, the listener is bound once
+        # so that it can be removed.
+        self._emit_progress = self.progress.emit
 
     def run(self):
+        self.greatwall.add_progress_listener(self._emit_progress)
         try:
             if self._is_initializing and self.greatwall.current_level != 0:
                 raise ValueError(
@@ -76,12 +88,40 @@ class GreatWallThread(QThread):
 
         except Exception as e:
             self.error_occurred.emit(str(e))
+        finally:
+            self.greatwall.remove_progress_listener(self._emit_progress)
 
     def cancel(self):
         self._is_canceled = True
         self.canceled.emit()
 
 
+class FractalRefinementSignals(QObject):
+    rendered = pyqtSignal(object)  # Signal for passing the rendered fractal
+
+
+class FractalRefinement(QRunnable):
+    """Task rendering the fractal of an option at full size.
+
+    The task is skipped if its level is left before it starts, a render
+    cannot be stopped once started.
+    """
+
+    def __init__(self, fractal_params: tuple, size: int, is_stale):
+        super().__init__()
+        self.fractal_params: tuple = fractal_params
+        self.size: int = size
+        self.is_stale = is_stale
+        self.signals: FractalRefinementSignals = FractalRefinementSignals()
+
+    def run(self):
+        if self.is_stale():
+            return
+        self.signals.rendered.emit(
+            render_fractal(*self.fractal_params, self.size, self.size)
+        )
+
+
 class FlowLayout(QLayout):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -207,7 +247,13 @@ class FlowLayout(QLayout):
 
 
 class ImageViewer(QGraphicsView):
-    """Custom image viewer widget with zoom and pan capability."""
+    """Custom image viewer widget with zoom and pan capability.
+
+    A photo can be set as a preview, the first zoom in on it requests its
+    refinement, which replaces it keeping the zoom and position.
+    """
+
+    refinement_requested = pyqtSignal()
 
     def __init__(self, parent):
         super(ImageViewer, self).__init__(parent)
@@ -218,6 +264,7 @@ class ImageViewer(QGraphicsView):
 
         # The following attributes are for internal implementation only.
         self._zoom = 0
+        self._is_preview = False
 
         # The main purpose of the following attributes are to keep
         # the underline data preserved and not noisy and distorted
@@ -273,8 +320,9 @@ class ImageViewer(QGraphicsView):
             self.scale(factor, factor)
         self._zoom = 0
 
-    def setPhoto(self, pixmap=None):
+    def setPhoto(self, pixmap=None, is_preview=False):
         self._zoom = 0
+        self._is_preview = is_preview
         if pixmap and not pixmap.isNull():
             self.empty = False
             self.setDragMode(QGraphicsView.ScrollHandDrag)
@@ -285,11 +333,25 @@ class ImageViewer(QGraphicsView):
             self.image.setPixmap(QPixmap())
         self.fitInView()
 
+    def refinePhoto(self, pixmap):
+        """Replace the preview by its refined photo, keeping the zoom."""
+        if not self.hasPhoto() or not self._is_preview:
+            return
+        self._is_preview = False
+        ratio = self.image.pixmap().width() / pixmap.width()
+        center = self.mapToScene(self.viewport().rect().center())
+        self.image.setPixmap(pixmap)
+        self.setSceneRect(QRectF(pixmap.rect()))
+        self.scale(ratio, ratio)
+        self.centerOn(center / ratio)
+
     def wheelEvent(self, event):
         if self.hasPhoto():
             if event.angleDelta().y() > 0:
                 factor = 1.25
                 self._zoom += 1
+                if self._is_preview:
+                    self.refinement_requested.emit()
             else:
                 factor = 0.8
                 self._zoom -= 1
@@ -306,6 +368,11 @@ class GreatWallGui(QMainWindow):
     level_up_signal = pyqtSignal()
     level_down_signal = pyqtSignal()
 
+    # Sizes the fractals are displayed at, in the options and the result
+    FRACTAL_TILE_SIZE: int = 205
+    FRACTAL_RESULT_SIZE: int = 256
+    FRACTAL_RESULT_SUPERSAMPLING: int = 2
+
     def __init__(self):
         super().__init__()
         self.greatwall_finish_result: bytes = bytes(0000)
@@ -313,6 +380,7 @@ class GreatWallGui(QMainWindow):
         self.transitions_list: list[QSignalTransition] = []
 
         self.greatwall = GreatWall()
+        self.greatwall.set_fractal_preview_size(self.FRACTAL_TILE_SIZE)
 
         self.stacked = QStackedWidget()
         self.setCentralWidget(self.stacked)
@@ -390,6 +458,14 @@ class GreatWallGui(QMainWindow):
         self.tlp_param_spinbox = QSpinBox(self)
         self.config_spinbox(self.tlp_param_spinbox, 1, 24 * 7 * 4 * 3, 1, 1)
 
+        self.tlp_profile_label = QLabel("Choose TLP profile", self)
+        self.tlp_profile_combobox = QComboBox(self)
+        for version, profile in TLP_PROFILES.items():
+            self.tlp_profile_combobox.addItem(profile.description, version)
+        self.tlp_profile_combobox.setCurrentIndex(
+            self.tlp_profile_combobox.findData(DEFAULT_TLP_PROFILE)
+        )
+
         self.depth_label = QLabel("Choose tree depth from 1 to 256", self)
         self.depth_spinbox = QSpinBox(self)
         self.config_spinbox(self.depth_spinbox, 1, 256, 1, 1)
@@ -418,6 +494,8 @@ class GreatWallGui(QMainWindow):
             self.theme_combobox,
             self.tlp_param_label,
             self.tlp_param_spinbox,
+            self.tlp_profile_label,
+            self.tlp_profile_combobox,
             self.depth_label,
             self.depth_spinbox,
             self.arity_label,
@@ -510,12 +588,14 @@ class GreatWallGui(QMainWindow):
             "Please, wait until the derivation finish!\n"
             + "Be patient, this will take some time..."
         )
-        # self.wait_derivation_bar = QProgressBar()
+        self.wait_derivation_progress_label = QLabel(self)
+        self.wait_derivation_bar = QProgressBar()
 
         # Lists of waiting derivation widgets
         self.waiting_derivation_widgets_list = [
             self.waiting_derivation_label,
-            # self.wait_derivation_bar,
+            self.wait_derivation_progress_label,
+            self.wait_derivation_bar,
         ]
 
         self.waiting_reset_navigation_button = QPushButton("Reset", self)
@@ -566,6 +646,15 @@ class GreatWallGui(QMainWindow):
         # Lists of selecting derivation options widgets
         self.selecting_derivation_options_widgets_list = []
 
+        # Params of the fractal options and their refinements in progress
+        self.fractal_query_params: list[tuple] = []
+        self.fractal_refined_options: set[int] = set()
+        self.fractal_refinement_generation: int = 0
+        # NOTE: The refinements render in this process, one at a time so
+        # they do not take the cores of the derivation.
+        self.fractal_refinement_pool: QThreadPool = QThreadPool(self)
+        self.fractal_refinement_pool.setMaxThreadCount(1)
+
         self.selecting_reset_navigation_button = QPushButton("Reset", self)
         self.selecting_next_navigation_button = QPushButton("Next", self)
         self.selecting_next_navigation_button.setEnabled(False)
@@ -877,7 +966,10 @@ class GreatWallGui(QMainWindow):
             "Theme\n" + str(self.theme_combobox.currentText())
         )
         self.input_confirmation_tlp_label.setText(
-            "TLP parameter\n" + str(self.tlp_param_spinbox.value())
+            "TLP parameter\n"
+            + str(self.tlp_param_spinbox.value())
+            + "\nTLP profile\n"
+            + self.tlp_profile_combobox.currentText()
         )
         self.input_confirmation_depth_label.setText(
             "Tree depth\n" + str(self.depth_spinbox.value())
@@ -931,6 +1023,9 @@ class GreatWallGui(QMainWindow):
 
                 flow_layout.addWidget(selection_box_group)
 
+                view.refinement_requested.connect(
+                    lambda option=idx: self.on_fractal_refinement_request(option)
+                )
                 selection_button.clicked.connect(
                     lambda state, selection_idx=idx: self.on_selection_button_click(
                         selection_idx
@@ -1030,6 +1125,8 @@ class GreatWallGui(QMainWindow):
 
         if self.tacit_knowledge_combobox.currentText() == constants.FRACTAL:
             user_options = self.greatwall.get_fractal_query()
+            self.fractal_query_params = self.greatwall.get_fractal_query_params()
+            self.cancel_fractal_refinements()
             colormap = color_palettes[self.fractal_colormap_combobox.currentText()]
             for idx, widgets in enumerate(
                 self.selecting_derivation_options_widgets_list
@@ -1049,8 +1146,10 @@ class GreatWallGui(QMainWindow):
                     image = QPixmap.fromImage(
                         view.numpy_2darray_to_Qimage(user_options[idx], colormap)
                     )
-                    view.setFixedSize(QSize(205, 205))
-                    view.setPhoto(image)
+                    view.setFixedSize(
+                        QSize(self.FRACTAL_TILE_SIZE, self.FRACTAL_TILE_SIZE)
+                    )
+                    view.setPhoto(image, is_preview=True)
                     view.setVisible(True)
 
                     selection_button.setText(str(idx))
@@ -1140,6 +1239,7 @@ class GreatWallGui(QMainWindow):
             self.greatwall.set_tlp_param(
                 self.tlp_param_spinbox.value()
             )
+            self.greatwall.set_tlp_profile(self.tlp_profile_combobox.currentData())
             self.greatwall.set_depth(self.depth_spinbox.value())
             self.greatwall.set_arity(self.arity_spinbox.value())
             password_success = self.greatwall.set_sa0(self.password_text.toPlainText())
@@ -1159,6 +1259,9 @@ class GreatWallGui(QMainWindow):
             self.greatwall_thread.finished.connect(self.on_thread_finish)
             self.greatwall_thread.canceled.connect(self.on_thread_cancel)
             self.greatwall_thread.error_occurred.connect(self.on_thread_error)
+            self.greatwall_thread.progress.connect(self.on_thread_progress)
+            self.wait_derivation_progress_label.clear()
+            self.wait_derivation_bar.reset()
             self.init_selection_derivation_loop()
 
             self.stacked.setCurrentWidget(self.waiting_derivation_view)
@@ -1303,6 +1406,9 @@ class GreatWallGui(QMainWindow):
                         self.greatwall_finish_result,
                         imag_p="imag_p".encode(encoding="utf-8"),
                     ).get_value(),
+                    width=self.FRACTAL_RESULT_SIZE,
+                    height=self.FRACTAL_RESULT_SIZE,
+                    supersampling=self.FRACTAL_RESULT_SUPERSAMPLING,
                 )
 
                 image = ImageViewer(self)
@@ -1311,9 +1417,7 @@ class GreatWallGui(QMainWindow):
                 qimage = image.numpy_2darray_to_Qimage(formated_fractal, colormap)
                 image = QPixmap.fromImage(qimage)
 
-                self.result_confirmation_result_hash_label.setPixmap(
-                    image.scaled(QSize(256, 256))
-                )
+                self.result_confirmation_result_hash_label.setPixmap(image)
             if self.tacit_knowledge_combobox.currentText() == constants.FORMOSA:
                 formatted_mnemonic = self.greatwall.mnemo.format_mnemonic(
                     self.greatwall.mnemo.to_mnemonic(self.greatwall_finish_result)
@@ -1341,6 +1445,53 @@ class GreatWallGui(QMainWindow):
 
             self.stacked.setCurrentWidget(self.selecting_derivation_view)
 
+    def on_thread_progress(self, event: ProgressEvent):
+        progress_text = (
+            f"Deriving {event.phase}: {event.iteration} of {event.iterations}"
+        )
+        if event.remaining:
+            minutes, seconds = divmod(round(event.remaining), 60)
+            progress_text += f"\nAbout {minutes} min {seconds} s remaining"
+        self.wait_derivation_progress_label.setText(progress_text)
+        self.wait_derivation_bar.setRange(0, max(event.iterations, 1))
+        self.wait_derivation_bar.setValue(event.iteration)
+
+    def on_fractal_refinement_request(self, option: int):
+        if option in self.fractal_refined_options:
+            return
+        if option > len(self.fractal_query_params):
+            return
+        self.fractal_refined_options.add(option)
+        fractal_params = self.fractal_query_params[option - 1]
+
+        generation = self.fractal_refinement_generation
+        refinement = FractalRefinement(
+            fractal_params,
+            self.greatwall.FRACTAL_SIZE,
+            lambda: generation != self.fractal_refinement_generation,
+        )
+        refinement.signals.rendered.connect(
+            lambda pixels: self.on_fractal_refined(option, fractal_params, pixels)
+        )
+        self.fractal_refinement_pool.start(refinement)
+
+    def cancel_fractal_refinements(self):
+        """Drop the refinements of the options of the level left."""
+        self.fractal_refinement_generation += 1
+        self.fractal_refinement_pool.clear()
+        self.fractal_refined_options.clear()
+
+    def on_fractal_refined(self, option: int, fractal_params: tuple, pixels):
+        # NOTE: The refinement of an option of a previous level is dropped.
+        if option > len(self.fractal_query_params):
+            return
+        if self.fractal_query_params[option - 1] != fractal_params:
+            return
+        view, _, _ = self.selecting_derivation_options_widgets_list[option]
+        colormap = color_palettes[self.fractal_colormap_combobox.currentText()]
+        qimage = view.numpy_2darray_to_Qimage(pixels, colormap)
+        view.refinePhoto(QPixmap.fromImage(qimage))
+
     def on_thread_cancel(self):
         print("Task canceled")
 
@@ -1355,6 +1506,9 @@ class GreatWallGui(QMainWindow):
     def on_exit_app(self):
         """Close the parent which exit the application. Bye, come again!"""
         print("Closed")
+        self.greatwall.shutdown_rendering_pool()
+        self.cancel_fractal_refinements()
+        self.fractal_refinement_pool.waitForDone()
         self.close()
 
 
@@ -1,12 +1,38 @@
+import argparse
+import contextlib
+import json
 import sys
 
 from cli import UserInterface
-from greatwall import GreatWall
-from gui import main as gui_main
+from resources.batch import read_jobs, run_batch
+from resources.calibration import (
+    TLP_PARAM_MAX,
+    calibrate_tlp,
+    load_calibrations,
+    parse_duration,
+    save_calibration,
+)
+from resources.greatwall import GreatWall
+from resources.helpers.profiles import TLP_PROFILES
+from resources.helpers.scheduler import hash_scheduler
+from resources.solver import SolverServer, TLPSolver
 
 
-def run_greatwall_cli():
-    greatwall = GreatWall("Formosa")
+def run_greatwall_cli(args):
+    parser = argparse.ArgumentParser(
+        prog="main.py CLI", description="Derive a key in the terminal."
+    )
+    parser.add_argument(
+        "--solver",
+        metavar="URL",
+        default=None,
+        help="the URL of a TLP solver to outsource the TLP to, as started by "
+        '"main.py SOLVER"',
+    )
+    args = parser.parse_args(args)
+
+    greatwall = GreatWall()
+    greatwall.set_tlp_solver(args.solver)
     cli = UserInterface()
     greatwall.set_themed_mnemo(cli.mnemo.base_theme)
     # Topology of TLP derivation
@@ -16,6 +42,17 @@ def run_greatwall_cli():
         24 * 7 * 4 * 3,
     )
     greatwall.set_tlp_param(cli.index_input_int)
+    tlp_profiles = "".join(
+        f"{version}) {profile.description}\n"
+        for version, profile in TLP_PROFILES.items()
+    )
+    cli.prompt_integer(
+        "Choose TLP profile --- costs of each iteration, keep it with the "
+        "TLP parameter\n" + tlp_profiles,
+        min(TLP_PROFILES),
+        max(TLP_PROFILES),
+    )
+    greatwall.set_tlp_profile(cli.index_input_int)
     # Topology of iterative derivation
     cli.prompt_integer(
         "Choose tree depth --- # of iterative procedural memory choices needed", 1, 256
@@ -29,7 +66,7 @@ def run_greatwall_cli():
 
     while not greatwall.is_finished:
         if not greatwall.current_level and not greatwall.is_initialized:
-            greatwall.initialize_state_hashes()
+            greatwall.init_state_hashes()
         if greatwall.current_level < greatwall.tree_depth:
             listr = greatwall.get_li_str_query()
             cli.prompt_integer(
@@ -45,16 +82,206 @@ def run_greatwall_cli():
                 greatwall.derive_from_user_choice(cli.index_input_int)
 
 
+def run_greatwall_batch(args):
+    parser = argparse.ArgumentParser(
+        prog="main.py BATCH",
+        description="Derive the KA of each job of a JSON lines stream, "
+        "writing one JSON line per finished job.",
+    )
+    parser.add_argument(
+        "jobs",
+        nargs="?",
+        type=argparse.FileType("r"),
+        default=sys.stdin,
+        help="the JSON lines file of the jobs, the standard input by default",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=2048,
+        help="the memory the running jobs can take, in MiB (default: 2048)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="the number of jobs run at the same time at most",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=int,
+        default=0,
+        help="the number of TLP iterations between encrypted checkpoints a "
+        "restarted job resumes from, 0 for no checkpoints (default: 0)",
+    )
+    parser.add_argument(
+        "--solver",
+        metavar="URL",
+        default=None,
+        help="the URL of a TLP solver to outsource the TLP of the jobs to, as "
+        'started by "main.py SOLVER"',
+    )
+    args = parser.parse_args(args)
+    hash_scheduler.set_memory_budget(args.memory_budget * 1024 * 1024)
+
+    # NOTE: The progress of the derivations goes to the standard error, so
+    # the standard output only holds the results.
+    results_file = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        for result in run_batch(
+            read_jobs(args.jobs),
+            memory_budget=args.memory_budget * 1024 * 1024,
+            max_workers=args.workers,
+            checkpoint_interval=args.checkpoint_interval,
+            tlp_solver=args.solver,
+        ):
+            print(json.dumps(result), file=results_file, flush=True)
+
+
+def run_greatwall_calibration(args):
+    parser = argparse.ArgumentParser(
+        prog="main.py CALIBRATE",
+        description="Time iterations of the TLP memory-hard hash on this machine "
+        "and recommend the TLP parameter for a target duration.",
+    )
+    parser.add_argument(
+        "target",
+        nargs="?",
+        type=parse_duration,
+        default=None,
+        help='the duration the TLP should take, as "8 hours", "90 min" or seconds',
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=2,
+        help="the number of TLP iterations timed (default: 2)",
+    )
+    parser.add_argument(
+        "--profile",
+        type=int,
+        choices=list(TLP_PROFILES),
+        default=None,
+        help="the version of the TLP profile timed (default: 1)",
+    )
+    parser.add_argument(
+        "--history",
+        action="store_true",
+        help="print the saved calibrations instead of calibrating",
+    )
+    args = parser.parse_args(args)
+    if args.iterations < 1:
+        parser.error("at least one TLP iteration must be timed")
+
+    if args.history:
+        for calibration in load_calibrations():
+            print(
+                f"{calibration['time']} {calibration['machine']['node']} "
+                f"({calibration['machine']['machine']}, "
+                f"{calibration['machine']['cpu_count']} CPUs): "
+                f"{calibration['seconds_per_iteration']:.2f} s per iteration "
+                f"of profile {calibration.get('tlp_profile', 1)}, "
+                f"{calibration['memory_bandwidth'] / 2**30:.2f} GiB/s"
+            )
+        return
+
+    print(f"Timing {args.iterations} iterations of the TLP...")
+    calibration = calibrate_tlp(args.iterations, args.target, tlp_profile=args.profile)
+    print(f"Seconds per iteration: {calibration['seconds_per_iteration']:.2f}")
+    print(f"Iterations per hour: {calibration['iterations_per_hour']:.0f}")
+    print(
+        "Estimated memory bandwidth: "
+        f"{calibration['memory_bandwidth'] / 2**30:.2f} GiB/s"
+    )
+    if args.target is not None:
+        print(
+            f"Recommended TLP parameter: {calibration['recommended_tlp_param']} "
+            f"(about {calibration['recommended_seconds'] / 3600:.2f} hours)"
+        )
+        if calibration["recommended_tlp_param"] == TLP_PARAM_MAX:
+            print("The target takes more than the maximum TLP parameter.")
+    print(f"Saved to {save_calibration(calibration)}")
+
+
+def run_greatwall_solver(args):
+    parser = argparse.ArgumentParser(
+        prog="main.py SOLVER",
+        description="Solve the TLP of GreatWall clients, as a local HTTP service "
+        "with a persistent job queue.",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="the address to listen on (default: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--port", type=int, default=8421, help="the port to listen on (default: 8421)"
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        default=2048,
+        help="the memory the running jobs can take, in MiB (default: 2048)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="the number of jobs run at the same time at most",
+    )
+    parser.add_argument(
+        "--state-dir",
+        default=None,
+        help="the directory of the saved jobs and their checkpoints",
+    )
+    parser.add_argument(
+        "--max-queued-jobs",
+        type=int,
+        default=TLPSolver.MAX_QUEUED_JOBS,
+        help="the number of jobs waiting to run at most, beyond which new jobs "
+        f"are refused (default: {TLPSolver.MAX_QUEUED_JOBS})",
+    )
+    args = parser.parse_args(args)
+    hash_scheduler.set_memory_budget(args.memory_budget * 1024 * 1024)
+
+    solver = TLPSolver(
+        args.memory_budget * 1024 * 1024,
+        max_workers=args.workers,
+        state_dir=args.state_dir,
+        max_queued_jobs=args.max_queued_jobs,
+    )
+    server = SolverServer((args.host, args.port), solver)
+    solver.start()
+    print(f"Solving the TLP at http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        solver.stop()
+
+
 def main():
-    if len(sys.argv) == 2:
-        if sys.argv[1].upper() == "GUI":
-            gui_main()
-        elif sys.argv[1].upper() == "CLI":
-            run_greatwall_cli()
+    if len(sys.argv) == 2 and sys.argv[1].upper() == "GUI":
+        from gui import main as gui_main
+
+        gui_main()
+    elif len(sys.argv) >= 2 and sys.argv[1].upper() == "CLI":
+        run_greatwall_cli(sys.argv[2:])
+    elif len(sys.argv) >= 2 and sys.argv[1].upper() == "BATCH":
+        run_greatwall_batch(sys.argv[2:])
+    elif len(sys.argv) >= 2 and sys.argv[1].upper() == "CALIBRATE":
+        run_greatwall_calibration(sys.argv[2:])
+    elif len(sys.argv) >= 2 and sys.argv[1].upper() == "SOLVER":
+        run_greatwall_solver(sys.argv[2:])
     else:
         print(
             f'  (use "main.py GUI" to run the GreatWall application with graphic user interface)\n'
-            f'  (or "main.py CLI" to run with command-line interface)'
+            f'  (or "main.py CLI [--solver URL]" to run with command-line interface)\n'
+            f'  (or "main.py BATCH [jobs file]" to derive keys of JSON lines jobs)\n'
+            f'  (or "main.py CALIBRATE [target duration]" to size the TLP parameter)\n'
+            f'  (or "main.py SOLVER" to solve the TLP of other GreatWall clients)'
         )
 
 
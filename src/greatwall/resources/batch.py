@@ -0,0 +1,253 @@
+import json
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Union
+
+from .greatwall import GreatWall
+from .helpers import constants
+from .helpers.profiles import DEFAULT_TLP_PROFILE, TLP_PROFILES, get_tlp_profile
+
+
+class BatchJob:
+    """A key derivation run without user interaction.
+
+    A job is described by a JSON object with the keys `sa0`, `tlp_param`,
+    `depth`, `arity` and `path`, and optionally `id`, `tlp_profile`, `theme`
+    and `tacit_knowledge`. The path holds the choice at each level, from 1 to
+    `arity`, each choice taking the branch of that index before shuffling.
+    """
+
+    TLP_PARAM_RANGE: range = range(0, 24 * 7 * 4 * 3 + 1)
+    DEPTH_RANGE: range = range(1, 257)
+    ARITY_RANGE: range = range(2, 257)
+    # NOTE: The quick hashes take 1 MiB, the rest of a derivation is small.
+    BASE_MEMORY_BYTES: int = 16 * 1024 * 1024
+
+    def __init__(
+        self,
+        job_id,
+        sa0: str,
+        tlp_param: int,
+        depth: int,
+        arity: int,
+        path: list[int],
+        theme: str = constants.BIP39,
+        tacit_knowledge: str = constants.FORMOSA,
+        tlp_profile: int = DEFAULT_TLP_PROFILE,
+    ) -> None:
+        """
+        Args:
+            job_id: The identifier of the job, given back with its result.
+            sa0 (str): The SA0 password or mnemonic in the given theme.
+            tlp_param (int): The number of iterations of the long hash, from
+                0 to 24*7*4*3. With 0 the time-lock puzzle is skipped, which
+                is only meant for testing.
+            depth (int): The depth of the tree, from 1 to 256.
+            arity (int): The arity of the tree, from 2 to 256.
+            path (list[int]): The choice at each level of the tree.
+            theme (str): The Formosa theme of SA0.
+            tacit_knowledge (str): The tacit knowledge type the path was
+                memorized with, it does not change the derived key.
+            tlp_profile (int): The version of the TLP profile of the long
+                hash, the first one by default.
+        """
+        self.job_id = job_id
+        self.sa0: str = sa0
+        self.tlp_param: int = tlp_param
+        self.depth: int = depth
+        self.arity: int = arity
+        self.path: list[int] = path
+        self.theme: str = theme
+        self.tacit_knowledge: str = tacit_knowledge
+        self.tlp_profile: int = tlp_profile
+        self._validate()
+
+    @classmethod
+    def from_dict(cls, job: dict, default_id=None) -> "BatchJob":
+        """Build a job from its JSON object."""
+        try:
+            return cls(
+                job_id=job.get("id", default_id),
+                sa0=job["sa0"],
+                tlp_param=job["tlp_param"],
+                depth=job["depth"],
+                arity=job["arity"],
+                path=job["path"],
+                theme=job.get("theme", constants.BIP39),
+                tacit_knowledge=job.get("tacit_knowledge", constants.FORMOSA),
+                tlp_profile=job.get("tlp_profile", DEFAULT_TLP_PROFILE),
+            )
+        except KeyError as error:
+            raise ValueError(f"The job is missing the key {error}.") from None
+
+    @property
+    def memory_bytes(self) -> int:
+        """The memory the derivation of the job is expected to take."""
+        long_hash_bytes = get_tlp_profile(self.tlp_profile).memory_bytes
+        return self.BASE_MEMORY_BYTES + (long_hash_bytes if self.tlp_param else 0)
+
+    def run(
+        self, checkpoint_interval: int = 0, tlp_solver: Optional[str] = None
+    ) -> bytes:
+        """Derive the key KA of the job.
+
+        Args:
+            checkpoint_interval (int): The number of iterations of the long
+                hash between checkpoints, with 0 the job does not resume from
+                nor save checkpoints.
+            tlp_solver (Optional[str]): The URL of the TLP solver the long
+                hash is outsourced to, with None it is computed here.
+        """
+        greatwall = GreatWall()
+        greatwall.set_prefetch_budget(0)
+        greatwall.set_checkpointing(checkpoint_interval)
+        greatwall.set_tlp_solver(tlp_solver)
+        if not greatwall.set_themed_mnemo(self.theme):
+            raise ValueError(f"The theme {self.theme} is not available.")
+        greatwall.set_tlp_param(self.tlp_param)
+        greatwall.set_tlp_profile(self.tlp_profile)
+        greatwall.set_depth(self.depth)
+        greatwall.set_arity(self.arity)
+        if not greatwall.set_sa0(self.sa0):
+            raise ValueError(f"The SA0 is not valid in the theme {self.theme}.")
+        return greatwall.derive_key(self.path)
+
+    def _validate(self) -> None:
+        # NOTE: A bool is an int, true would be taken as 1.
+        for name, value_range in (
+            ("tlp_param", self.TLP_PARAM_RANGE),
+            ("depth", self.DEPTH_RANGE),
+            ("arity", self.ARITY_RANGE),
+        ):
+            value = getattr(self, name)
+            if (
+                isinstance(value, bool)
+                or not isinstance(value, int)
+                or value not in value_range
+            ):
+                raise ValueError(
+                    f"The {name} must be an integer from {value_range.start} "
+                    f"to {value_range.stop - 1}."
+                )
+        if (
+            isinstance(self.tlp_profile, bool)
+            or not isinstance(self.tlp_profile, int)
+            or self.tlp_profile not in TLP_PROFILES
+        ):
+            raise ValueError(
+                f"The tlp_profile must be one of {', '.join(map(str, TLP_PROFILES))}."
+            )
+        if not isinstance(self.sa0, str):
+            raise ValueError("The sa0 must be a string.")
+        if not isinstance(self.path, list) or not all(
+            isinstance(choice, int) and not isinstance(choice, bool)
+            for choice in self.path
+        ):
+            raise ValueError("The path must be a list of integers.")
+        if len(self.path) != self.depth or not all(
+            1 <= choice <= self.arity for choice in self.path
+        ):
+            raise ValueError(
+                f"The path must have {self.depth} choices from 1 to {self.arity}."
+            )
+        if self.tacit_knowledge not in constants.AVAILABLE_TACIT_KNOWLEDGE_TYPES:
+            raise ValueError(
+                f"The tacit knowledge type {self.tacit_knowledge} is not available."
+            )
+
+
+def read_jobs(lines: Iterable[str]) -> Iterator[Union[dict, str]]:
+    """Read the jobs of a JSON lines stream, skipping the blank lines.
+
+    The lines which are not valid JSON objects are given back as they are,
+    so `run_batch` reports them as failed jobs.
+    """
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+        except json.JSONDecodeError:
+            yield line
+            continue
+        yield job if isinstance(job, dict) else line
+
+
+def run_batch(
+    jobs: Iterable[Union[BatchJob, dict, str]],
+    memory_budget: int,
+    max_workers: Optional[int] = None,
+    checkpoint_interval: int = 0,
+    tlp_solver: Optional[str] = None,
+) -> Iterator[dict]:
+    """Derive the keys of the jobs concurrently, streaming their results.
+
+    The jobs are read lazily and started while the memory they are expected
+    to take fits in the budget, a job taking more than the whole budget is
+    run alone. The results are given as the jobs finish, as dicts with the
+    `id` of the job and either the hexadecimal `ka` or an `error`, and the
+    `seconds` the job took.
+
+    Args:
+        jobs (Iterable): The jobs, as `BatchJob`, JSON objects, or invalid
+            lines of a JSON lines stream.
+        memory_budget (int): The memory the running jobs can take, in bytes.
+        max_workers (Optional[int]): The number of jobs run at the same time
+            at most, by default the number of CPUs.
+        checkpoint_interval (int): The number of iterations of the long hash
+            between checkpoints of the jobs, with 0 there are no checkpoints.
+        tlp_solver (Optional[str]): The URL of the TLP solver the long hashes
+            are outsourced to, then the jobs only take their base memory here.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    finished = queue.Queue()
+    running = 0
+    reserved_bytes = 0
+
+    def memory_bytes(job: BatchJob) -> int:
+        return job.memory_bytes if tlp_solver is None else job.BASE_MEMORY_BYTES
+
+    def run_job(job: BatchJob) -> None:
+        start_time = time.perf_counter()
+        result = {"id": job.job_id}
+        try:
+            result["ka"] = job.run(checkpoint_interval, tlp_solver).hex()
+        except Exception as error:  # NOTE: A failed job must not stop the batch.
+            result["error"] = str(error)
+        result["seconds"] = round(time.perf_counter() - start_time, 3)
+        finished.put((result, memory_bytes(job)))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for job_number, job in enumerate(jobs, start=1):
+            try:
+                if isinstance(job, str):
+                    # NOTE: The line is not echoed, it may hold the SA0.
+                    raise ValueError("The job is not a JSON object.")
+                if isinstance(job, dict):
+                    job = BatchJob.from_dict(job, default_id=job_number)
+            except ValueError as error:
+                job_id = job_number
+                if isinstance(job, dict):
+                    job_id = job.get("id", job_number)
+                yield {"id": job_id, "error": str(error)}
+                continue
+
+            while running and (
+                running >= max_workers
+                or reserved_bytes + memory_bytes(job) > memory_budget
+            ):
+                result, released_bytes = finished.get()
+                running -= 1
+                reserved_bytes -= released_bytes
+                yield result
+
+            running += 1
+            reserved_bytes += memory_bytes(job)
+            executor.submit(run_job, job)
+
+        while running:
+            result, _ = finished.get()
+            running -= 1
+            yield result
@@ -0,0 +1,191 @@
+import json
+import math
+import os
+import platform
+import re
+import secrets
+import statistics
+import time
+from pathlib import Path
+from typing import Optional
+
+from .greatwall import GreatWall
+from .helpers.progress import SA1_TO_SA2, ProgressEvent
+
+CALIBRATION_PATH = (
+    Path(os.environ.get("GREATWALL_CACHE_DIR", Path.home() / ".cache" / "greatwall"))
+    / "calibration.jsonl"
+)
+
+TLP_PARAM_MIN: int = 1
+TLP_PARAM_MAX: int = 24 * 7 * 4 * 3
+
+# Seconds of each unit of a duration, the units of more than two letters
+# can be plural
+DURATION_UNITS: dict[str, float] = {
+    "ms": 0.001,
+    "msec": 0.001,
+    "millisecond": 0.001,
+    "s": 1,
+    "sec": 1,
+    "second": 1,
+    "m": 60,
+    "min": 60,
+    "minute": 60,
+    "h": 60 * 60,
+    "hour": 60 * 60,
+    "d": 24 * 60 * 60,
+    "day": 24 * 60 * 60,
+    "w": 7 * 24 * 60 * 60,
+    "week": 7 * 24 * 60 * 60,
+}
+
+
+def parse_duration(duration: str) -> float:
+    """Parse a duration like "8 hours", "90 min", "1h30m" or "3600" in seconds.
+
+    Args:
+        duration (str): The duration, a number of seconds or numbers followed
+            by the units ms, s, min, h, d or w, singular or plural.
+
+    Returns:
+        The duration in seconds.
+
+    Raises:
+        ValueError: If it is not a duration, or not a finite positive one.
+    """
+    duration = duration.strip().lower()
+    try:
+        seconds = float(duration)
+    except ValueError:
+        seconds = _parse_duration_units(duration)
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError(f"{duration!r} is not a positive duration.")
+    return seconds
+
+
+def _parse_duration_units(duration: str) -> float:
+    part_pattern = r"(\d+(?:\.\d+)?)\s*([a-z]+)\s*"
+    if not re.fullmatch(f"({part_pattern})+", duration):
+        raise ValueError(f"{duration!r} is not a duration.")
+    seconds = 0.0
+    for amount, unit in re.findall(part_pattern, duration):
+        # NOTE: Only words are plural, "ms" is not "m" plural.
+        if unit not in DURATION_UNITS and len(unit) > 3 and unit.endswith("s"):
+            unit = unit[:-1]
+        if unit not in DURATION_UNITS:
+            raise ValueError(f"{unit!r} is not a unit of duration.")
+        seconds += float(amount) * DURATION_UNITS[unit]
+    return seconds
+
+
+def machine_info() -> dict:
+    """The description of this machine saved with calibrations and benchmarks."""
+    return {
+        "node": platform.node(),
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def recommend_tlp_param(seconds_per_iteration: float, target_seconds: float) -> int:
+    """The TLP param whose long hash takes the closest to the target duration."""
+    tlp_param = round(target_seconds / seconds_per_iteration)
+    return min(max(tlp_param, TLP_PARAM_MIN), TLP_PARAM_MAX)
+
+
+def calibrate_tlp(
+    iterations: int = 2,
+    target_seconds: Optional[float] = None,
+    greatwall: Optional[GreatWall] = None,
+    tlp_profile: Optional[int] = None,
+) -> dict:
+    """Time iterations of the long hash on this machine.
+
+    Args:
+        iterations (int): The number of iterations of the long hash timed.
+        target_seconds (Optional[float]): The duration the time-lock puzzle
+            should take, to recommend a TLP param for.
+        greatwall (Optional[GreatWall]): The GreatWall whose long hash is
+            timed, a new one by default.
+        tlp_profile (Optional[int]): The version of the TLP profile timed,
+            the one of the GreatWall by default.
+
+    Returns:
+        A dict with the `seconds_per_iteration`, the median of the timed
+        iterations, the `iterations_per_hour`, the estimated
+        `memory_bandwidth` in bytes per second, the `recommended_tlp_param`
+        and its `recommended_seconds` when a target is given, the
+        `tlp_profile` timed, and the `machine` the calibration ran on.
+
+    Raises:
+        ValueError: If less than one iteration is to be timed.
+        RuntimeError: If the GreatWall is canceled before an iteration is
+            timed.
+    """
+    if not isinstance(iterations, int) or iterations < 1:
+        raise ValueError("At least one iteration must be timed.")
+    greatwall = GreatWall() if greatwall is None else greatwall
+    if tlp_profile is not None:
+        greatwall.set_tlp_profile(tlp_profile)
+    iteration_seconds = []
+
+    def record_iteration(event: ProgressEvent):
+        if event.phase == SA1_TO_SA2 and event.hash_seconds is not None:
+            iteration_seconds.append(event.hash_seconds)
+
+    greatwall.add_progress_listener(record_iteration)
+    try:
+        greatwall.set_tlp_param(iterations)
+        greatwall.state = secrets.token_bytes(128)
+        greatwall.update_with_long_hash()
+    finally:
+        greatwall.remove_progress_listener(record_iteration)
+
+    if not iteration_seconds:
+        raise RuntimeError("The calibration was canceled before an iteration.")
+    seconds_per_iteration = statistics.median(iteration_seconds)
+    memory_bytes = greatwall.LONG_HASH_MEMORY_COST * 1024
+    # NOTE: Each pass of Argon2 computes every 1 KiB block from two blocks
+    # it reads and writes it, 3 KiB moved per block and pass.
+    moved_bytes = greatwall.LONG_HASH_TIME_COST * 3 * memory_bytes
+    calibration = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "iterations": len(iteration_seconds),
+        "tlp_profile": greatwall.tlp_profile,
+        "memory_bytes": memory_bytes,
+        "seconds_per_iteration": seconds_per_iteration,
+        "iterations_per_hour": 3600 / seconds_per_iteration,
+        "memory_bandwidth": moved_bytes / seconds_per_iteration,
+        "target_seconds": target_seconds,
+        "recommended_tlp_param": None,
+        "recommended_seconds": None,
+        "machine": machine_info(),
+    }
+    if target_seconds is not None:
+        tlp_param = recommend_tlp_param(seconds_per_iteration, target_seconds)
+        calibration["recommended_tlp_param"] = tlp_param
+        calibration["recommended_seconds"] = tlp_param * seconds_per_iteration
+    return calibration
+
+
+def save_calibration(calibration: dict, path: Optional[Path] = None) -> Path:
+    """Append the calibration to the JSON lines file of the calibrations."""
+    path = CALIBRATION_PATH if path is None else Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as file:
+        file.write(json.dumps(calibration) + "\n")
+    return path
+
+
+def load_calibrations(path: Optional[Path] = None) -> list[dict]:
+    """Load the saved calibrations, from the oldest to the newest."""
+    path = CALIBRATION_PATH if path is None else Path(path)
+    try:
+        with open(path) as file:
+            return [json.loads(line) for line in file if line.strip()]
+    except FileNotFoundError:
+        return []
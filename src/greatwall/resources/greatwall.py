@@ -1,15 +1,40 @@
+import multiprocessing
+import multiprocessing.pool
+import os
 import random
-from typing import Optional
+import time
+from pathlib import Path
+from typing import Callable, Optional
 
 from argon2 import low_level
 
+from .helpers.arena import Argon2Arena
+from .helpers.cache import LRUCache
+from .helpers.checkpoint import TLPCheckpoint
+from .helpers.prefetcher import Prefetcher
+from .helpers.profiles import DEFAULT_TLP_PROFILE, get_tlp_profile
+from .helpers.progress import (
+    LEVEL,
+    SA0_TO_SA1,
+    SA1_TO_SA2,
+    SA2_TO_SA3,
+    PhaseTimings,
+    ProgressEvent,
+)
+from .helpers.scheduler import HashScheduler, hash_scheduler
+from .helpers.solver_client import (
+    TLPSolverClient,
+    TLPSolverConnectionError,
+    TLPSolverError,
+)
 from .helpers.utils import (
     DerivationPath,
     FormosaTacitKnowledgeParam,
     FractalTacitKnowledgeParam,
     ShapeTacitKnowledgeParam,
+    TacitKnowledgeParam,
 )
-from .knowledge.fractal import Fractal
+from .knowledge.fractal import Fractal, render_fractal
 from .knowledge.mnemonic.mnemonic import Mnemonic
 from .knowledge.shaper import Shaper
 
@@ -17,6 +42,24 @@ from .knowledge.shaper import Shaper
 class GreatWall:
     ARGON2_SALT: bytes = bytes("00000000000000000000000000000000", "utf-8")
     NUM_BYTES_FORM: int = 4
+    # Passes over, memory in KiB and lanes of each iteration of the long hash,
+    # those of the TLP profile set
+    LONG_HASH_TIME_COST: int = 8
+    LONG_HASH_MEMORY_COST: int = 1048576
+    LONG_HASH_PARALLELISM: int = 1
+    QUICK_HASH_MEMORY_BYTES: int = 1024 * 1024
+    PREFETCH_BUDGET: int = 512
+    # Interval of the cancel checks while waiting for the rendering processes
+    CANCEL_POLL_SECONDS: float = 0.05
+    # Interval of the status requests to the TLP solver
+    SOLVER_POLL_SECONDS: float = 1.0
+    # Longest interval of the status requests while the solver is unreachable
+    SOLVER_MAX_RETRY_SECONDS: float = 60.0
+    SAVED_STATES_MAX_BYTES: int = 16 * 1024 * 1024
+    SAVED_FRACTALS_MAX_BYTES: int = 1024 * 1024 * 1024
+    # Sizes of the fractals of the options, previewed first then refined
+    FRACTAL_PREVIEW_SIZE: int = 128
+    FRACTAL_SIZE: int = 1024
 
     def __init__(self):
         self.is_finished: bool = False
@@ -24,8 +67,18 @@ class GreatWall:
         self.is_initialized: bool = False
 
         self._derivation_path: DerivationPath = DerivationPath()
-        self._saved_states: dict = {}
-        self._saved_fractals = {}
+        self._saved_states: LRUCache = LRUCache(
+            max_bytes=self.SAVED_STATES_MAX_BYTES,
+            is_pinned=self._is_on_derivation_path,
+        )
+        self._saved_fractals: LRUCache = LRUCache(
+            max_bytes=self.SAVED_FRACTALS_MAX_BYTES
+        )
+        self._saved_fractals_params: LRUCache = LRUCache(
+            max_bytes=self.SAVED_STATES_MAX_BYTES
+        )
+        self.fractal_preview_size: int = self.FRACTAL_PREVIEW_SIZE
+        self.fractal_preview_supersampling: int = 1
 
         # Palettes
         self.mnemo: Optional[Mnemonic] = None
@@ -36,6 +89,37 @@ class GreatWall:
         self.tree_depth: int = 0
         self.tree_arity: int = 0
         self.tlp_param: int = 0
+        self.tlp_profile: int = DEFAULT_TLP_PROFILE
+
+        # Rendering and hashing pools
+        self.rendering_workers: int = os.cpu_count() or 1
+        self.hashing_workers: int = os.cpu_count() or 1
+        self._rendering_pool: Optional[multiprocessing.pool.Pool] = None
+
+        # Checkpoints of the time-lock puzzle, every given iterations
+        self.checkpoint_interval: int = 0
+        self.checkpoint_dir: Optional[Path] = None
+        self.resume_from_checkpoint: bool = True
+        self._long_hash_progress: dict = self._new_long_hash_progress(0, 0)
+
+        # Solver the time-lock puzzle is outsourced to, if any
+        self.tlp_solver: Optional[TLPSolverClient] = None
+
+        # Process-wide admission of the hashes by the memory they take
+        self.hash_scheduler: HashScheduler = hash_scheduler
+
+        # Memory arena reused by the iterations of the long hash
+        self.use_hash_arena: bool = True
+        self.hash_arena_huge_pages: bool = True
+
+        # Progress of the derivation phases and timings of their hashes
+        self._progress_listeners: list[Callable[[ProgressEvent], None]] = []
+        self.phase_timings: PhaseTimings = PhaseTimings()
+
+        # Speculative precomputation of the next level
+        self._prefetcher: Prefetcher = Prefetcher(
+            max_workers=self.hashing_workers, budget=self.PREFETCH_BUDGET
+        )
 
         # Dummy initialization of protocol values
         self.init_protocol_values()
@@ -72,6 +156,24 @@ class GreatWall:
         """
         self.tlp_param = iter_num
 
+    def set_tlp_profile(self, version: int):
+        """Set the versioned profile of the costs of the long hash.
+
+        The profile changes the derived keys, so it has to be recorded along
+        with the TLP param.
+
+        Args:
+            version (int): The version of the profile, one of `TLP_PROFILES`.
+
+        Raises:
+            ValueError: If there is no profile of the version.
+        """
+        profile = get_tlp_profile(version)
+        self.tlp_profile = profile.version
+        self.LONG_HASH_TIME_COST = profile.time_cost
+        self.LONG_HASH_MEMORY_COST = profile.memory_cost
+        self.LONG_HASH_PARALLELISM = profile.parallelism
+
     def set_depth(self, tree_depth: int):
         """Set the number of needed choices of iteration of procedural memory.
 
@@ -96,6 +198,194 @@ class GreatWall:
         """
         self.tree_arity = tree_arity
 
+    def set_fractal_preview_size(self, size: int, supersampling: int = 1):
+        """Set the size the fractals of the options are previewed at.
+
+        Args:
+            size (int): The width and height of the previews, the size they
+                are displayed at.
+            supersampling (int): The number of samples along each axis of
+                every pixel of the previews.
+        """
+        if size < 1 or supersampling < 1:
+            raise ValueError("The size and supersampling must be positive.")
+        self.fractal_preview_size = size
+        self.fractal_preview_supersampling = supersampling
+
+    def set_rendering_workers(self, workers: int):
+        """Set the number of processes rendering the fractals of a level.
+
+        Args:
+            workers (int): The number of rendering processes, with 1 the
+                fractals are rendered in the current process.
+        """
+        if workers != self.rendering_workers:
+            self.shutdown_rendering_pool()
+        self.rendering_workers = max(1, workers)
+
+    def set_hashing_workers(self, workers: int):
+        """Set the number of threads hashing the branches of a level.
+
+        Args:
+            workers (int): The number of hashing threads.
+        """
+        self.hashing_workers = max(1, workers)
+        self._prefetcher.max_workers = self.hashing_workers
+
+    def set_prefetch_budget(self, budget: int):
+        """Set the number of hashes speculatively computed while the user chooses.
+
+        Args:
+            budget (int): The number of quick hashes computed in background
+                for the child states and next level options of each level,
+                with 0 nothing is precomputed.
+        """
+        self._prefetcher.budget = budget
+
+    def set_hash_arena(self, enabled: bool, huge_pages: bool = True):
+        """Set whether the long hash iterations reuse a memory arena.
+
+        Args:
+            enabled (bool): Whether the iterations are hashed in one arena
+                mapped and faulted in for the whole long hash, instead of
+                allocating their memory on every iteration.
+            huge_pages (bool): Whether the arena is advised to be backed by
+                transparent huge pages.
+        """
+        self.use_hash_arena = enabled
+        self.hash_arena_huge_pages = huge_pages
+
+    def set_tlp_solver(self, url: Optional[str], timeout: float = 10.0):
+        """Set the solver the time-lock puzzle is outsourced to.
+
+        WARNING: The solver gets SA1 and gives back SA2, so whoever runs it
+        and has SA0 skips the time-lock puzzle, it should only be a trusted
+        machine.
+
+        Args:
+            url (Optional[str]): The URL of the solver, as
+                "http://127.0.0.1:8421", with None the puzzle is computed
+                in-process.
+            timeout (float): The seconds a request to the solver can take.
+        """
+        self.tlp_solver = None if url is None else TLPSolverClient(url, timeout)
+
+    def set_checkpointing(
+        self, interval: int, directory: Optional[Path] = None, resume: bool = True
+    ):
+        """Set the checkpoints of the time-lock puzzle.
+
+        The state reached by the long hash is saved encrypted, so a derivation
+        interrupted by a crash or a cancel can be resumed from its last
+        checkpoint instead of from the start. The checkpoint is removed once
+        the time-lock puzzle is solved.
+
+        WARNING: While a checkpoint exists, whoever has it and SA0 skips the
+        iterations it holds, so checkpoints should only be kept on a trusted
+        device.
+
+        Args:
+            interval (int): The number of iterations between checkpoints, with
+                0 no checkpoint is saved nor resumed.
+            directory (Optional[Path]): The directory of the checkpoints, by
+                default the `checkpoints` directory of the GreatWall cache.
+            resume (bool): Whether a derivation resumes from a checkpoint.
+        """
+        self.checkpoint_interval = max(0, interval)
+        self.checkpoint_dir = directory
+        self.resume_from_checkpoint = resume
+
+    def add_progress_listener(self, listener: Callable[[ProgressEvent], None]):
+        """Call the listener with the progress events of the derivation.
+
+        The listener is called from the thread running the derivation, when
+        each phase starts and after each of its hashes.
+
+        Args:
+            listener (Callable): The function called with each `ProgressEvent`.
+        """
+        self._progress_listeners.append(listener)
+
+    def remove_progress_listener(self, listener: Callable[[ProgressEvent], None]):
+        """Stop calling the listener with the progress events."""
+        if listener in self._progress_listeners:
+            self._progress_listeners.remove(listener)
+
+    def timing_info(self) -> dict[str, dict]:
+        """The latency histograms of the hashes of each derivation phase."""
+        return self.phase_timings.info()
+
+    def _emit_progress(self, event: ProgressEvent):
+        self.phase_timings.record(event)
+        for listener in list(self._progress_listeners):
+            listener(event)
+
+    def _quick_hash_phase(self, phase: str):
+        """Update the state with its quick hash, emitting the phase progress."""
+        self._emit_progress(ProgressEvent(phase, 0, 1))
+        start_time = time.perf_counter()
+        self.update_with_quick_hash()
+        hash_seconds = time.perf_counter() - start_time
+        self._emit_progress(
+            ProgressEvent(phase, 1, 1, hash_seconds, 0.0, hash_seconds)
+        )
+
+    def long_hash_progress(self) -> dict:
+        """The progress of the running, or last, time-lock puzzle.
+
+        Returns:
+            A dict with the `iterations_done` out of `iterations`, the
+            `resumed_iterations` taken from a checkpoint, the `elapsed`
+            seconds and the `remaining` seconds estimated from the iterations
+            done so far, None before the first one is done.
+        """
+        return dict(self._long_hash_progress)
+
+    @staticmethod
+    def _new_long_hash_progress(iterations: int, resumed_iterations: int) -> dict:
+        return {
+            "iterations_done": resumed_iterations,
+            "iterations": iterations,
+            "resumed_iterations": resumed_iterations,
+            "elapsed": 0.0,
+            "remaining": None if resumed_iterations < iterations else 0.0,
+        }
+
+    def shutdown_rendering_pool(self):
+        """Shut down the rendering processes, if any are running."""
+        if self._rendering_pool is not None:
+            self._rendering_pool.close()
+            self._rendering_pool = None
+
+    def set_saved_fractals_cache(
+        self, max_bytes: Optional[int], dtype: Optional[type] = None
+    ):
+        """Set the memory budget of the rendered fractals kept for each level.
+
+        Args:
+            max_bytes (Optional[int]): The budget of the cache in bytes, None
+                for an unbounded cache.
+            dtype (Optional[type]): The dtype the fractals are stored with,
+                `np.float16` or `np.uint8` to store them lossily in less
+                memory, None to keep them as rendered.
+        """
+        saved_fractals = LRUCache(max_bytes=max_bytes, dtype=dtype)
+        for path in self._saved_fractals.keys():
+            saved_fractals[path] = self._saved_fractals.pop(path)
+        self._saved_fractals = saved_fractals
+
+    def cache_info(self) -> dict[str, dict]:
+        """The hits, misses and sizes of the saved states, fractals and links."""
+        return {
+            "states": self._saved_states.info(),
+            "fractals": self._saved_fractals.info(),
+            "links": TacitKnowledgeParam.links_info(),
+        }
+
+    def _is_on_derivation_path(self, path: DerivationPath) -> bool:
+        """Whether the path leads to the current level of derivation."""
+        return path.is_prefix_of(self._derivation_path)
+
     def set_sa0(self, mnemonic: str) -> bool:
         self.is_canceled = False
         try:
@@ -111,16 +401,19 @@ class GreatWall:
             return False
 
     def init_state_hashes(self):
+        self._prefetcher.cancel()
         self.state = self.sa0
         self.current_level = 0
 
         self._derivation_path = DerivationPath()
-        self._saved_states = {}
-        self._saved_fractals = {}
+        self._saved_states.clear()
+        self._saved_fractals.clear()
+        self._saved_fractals_params.clear()
+        TacitKnowledgeParam.clear_links()
 
         # Actual work
         self.time_intensive_derivation()
-        self.is_initialized = True
+        self.is_initialized = not self.is_canceled
 
     def time_intensive_derivation(self):
         print("Initializing SA0")
@@ -129,93 +422,484 @@ class GreatWall:
             print("Task canceled")
             return  # Exit the task if canceled
         print("Deriving SA0 -> SA1")
-        self.update_with_quick_hash()
+        self._quick_hash_phase(SA0_TO_SA1)
         self.sa1 = self.state
         if self.is_canceled:
             print("Task canceled")
             return  # Exit the task if canceled
         print("Deriving SA1 -> SA2")
-        self.update_with_long_hash()
-        self.sa2 = self.state
-        self.state = self.sa0 + self.state
+        if self.tlp_solver is not None:
+            self.update_with_solver()
+        else:
+            self.update_with_long_hash()
         if self.is_canceled:
             print("Task canceled")
             return  # Exit the task if canceled
+        self.sa2 = self.state
+        self.state = self.sa0 + self.state
         print("Deriving SA2 -> SA3")
-        self.update_with_quick_hash()
+        self._quick_hash_phase(SA2_TO_SA3)
         self.sa3 = self.state
 
-        self._saved_states[self._derivation_path.copy()] = self.state
+        self._saved_states[self._derivation_path] = self.state
 
     def update_with_long_hash(self):
-        """Update the state with the its hash taking presumably a long time."""
-        for i in range(self.tlp_param):
-            print("iteration #", i + 1, " of TLP:")
-            self.state = low_level.hash_secret_raw(
-                secret=self.state,
-                salt=self.ARGON2_SALT,
-                time_cost=8,
-                memory_cost=1048576,
-                parallelism=1,
-                hash_len=128,
-                type=low_level.Type.I,
+        """Update the state with the its hash taking presumably a long time.
+
+        The progress is given by `long_hash_progress`, and with checkpointing
+        set, the state is resumed from and saved to an encrypted checkpoint.
+        The cancel is checked before each iteration, so it takes one iteration
+        at most, and the iterations done are checkpointed. The iterations are
+        hashed in the same memory arena, unless it is disabled or cannot be
+        mapped.
+
+        Each iteration waits for its turn in the hash scheduler, and gives
+        the turn back, with the arena, when other long hashes are queued.
+        """
+        checkpoint = None
+        resumed_iterations = 0
+        if self.checkpoint_interval:
+            checkpoint = TLPCheckpoint(
+                self.state, self.checkpoint_dir, tlp_profile=self.tlp_profile
+            )
+            saved_checkpoint = None
+            if self.resume_from_checkpoint:
+                saved_checkpoint = checkpoint.load()
+            # NOTE: A checkpoint further than the TLP param is of no use.
+            if saved_checkpoint is not None and saved_checkpoint[0] <= self.tlp_param:
+                resumed_iterations, self.state = saved_checkpoint
+
+        progress = self._new_long_hash_progress(self.tlp_param, resumed_iterations)
+        self._long_hash_progress = progress
+        self._emit_progress(
+            ProgressEvent(
+                SA1_TO_SA2,
+                resumed_iterations,
+                self.tlp_param,
+                remaining=progress["remaining"],
             )
+        )
+        long_hash_bytes = self.LONG_HASH_MEMORY_COST * 1024
+        is_admitted = False
+        hash_arena = None
+        try:
+            start_time = time.perf_counter()
+            for iterations_done in range(resumed_iterations + 1, self.tlp_param + 1):
+                if not is_admitted:
+                    is_admitted = self.hash_scheduler.acquire(
+                        long_hash_bytes, is_canceled=lambda: self.is_canceled
+                    )
+                if self.is_canceled:
+                    if (
+                        checkpoint is not None
+                        and iterations_done - 1 > resumed_iterations
+                    ):
+                        checkpoint.save(iterations_done - 1, self.state)
+                    return
+                if hash_arena is None and self.use_hash_arena:
+                    hash_arena = self._open_hash_arena()
+                hash_start_time = time.perf_counter()
+                self.state = self._long_hash(self.state, hash_arena)
+
+                elapsed = time.perf_counter() - start_time
+                seconds_per_iteration = elapsed / (iterations_done - resumed_iterations)
+                progress = dict(progress)
+                progress["iterations_done"] = iterations_done
+                progress["elapsed"] = elapsed
+                progress["remaining"] = seconds_per_iteration * (
+                    self.tlp_param - iterations_done
+                )
+                self._long_hash_progress = progress
+                self._emit_progress(
+                    ProgressEvent(
+                        SA1_TO_SA2,
+                        iterations_done,
+                        self.tlp_param,
+                        elapsed,
+                        progress["remaining"],
+                        time.perf_counter() - hash_start_time,
+                    )
+                )
 
-    def update_with_quick_hash(self):
-        """Update the state with the its hash taking presumably a quick time."""
-        self.state = low_level.hash_secret_raw(
-            secret=self.state,
+                if (
+                    checkpoint is not None
+                    and iterations_done < self.tlp_param
+                    and iterations_done % self.checkpoint_interval == 0
+                ):
+                    checkpoint.save(iterations_done, self.state)
+
+                if self.hash_scheduler.has_waiting_long_hashes():
+                    # NOTE: The turn goes to the queued long hashes, with the
+                    # memory of the arena.
+                    if hash_arena is not None:
+                        hash_arena.close()
+                        hash_arena = None
+                    self.hash_scheduler.release(long_hash_bytes)
+                    is_admitted = False
+
+            if checkpoint is not None:
+                checkpoint.remove()
+        finally:
+            if hash_arena is not None:
+                hash_arena.close()
+            if is_admitted:
+                self.hash_scheduler.release(long_hash_bytes)
+
+    def update_with_solver(self):
+        """Update the state with its long hash computed by the TLP solver.
+
+        The puzzle is submitted to the solver, which is then polled for its
+        progress until SA2 is given back, and the job is deleted from the
+        solver once done or canceled. While the solver cannot be reached, it
+        is polled again with a doubling interval until the derivation is
+        canceled, the job goes on there meanwhile.
+
+        Raises:
+            TLPSolverError: If the solver cannot be reached on submit, or if
+                it fails or loses the job.
+        """
+        job = self.tlp_solver.submit(self.state, self.tlp_param, self.tlp_profile)
+        progress = self._new_long_hash_progress(self.tlp_param, 0)
+        self._long_hash_progress = progress
+        self._emit_progress(ProgressEvent(SA1_TO_SA2, 0, self.tlp_param))
+        start_time = time.perf_counter()
+        poll_seconds = self.SOLVER_POLL_SECONDS
+        while job["status"] != "done":
+            if job["status"] == "failed":
+                raise TLPSolverError(f"The solver failed the job: {job['error']}")
+            if job["iterations_done"] != progress["iterations_done"]:
+                progress = dict(progress)
+                progress["iterations_done"] = job["iterations_done"]
+                progress["elapsed"] = time.perf_counter() - start_time
+                progress["remaining"] = job["remaining"]
+                self._long_hash_progress = progress
+                self._emit_progress(
+                    ProgressEvent(
+                        SA1_TO_SA2,
+                        job["iterations_done"],
+                        self.tlp_param,
+                        progress["elapsed"],
+                        job["remaining"],
+                    )
+                )
+            poll_time = time.perf_counter() + poll_seconds
+            while time.perf_counter() < poll_time:
+                if self.is_canceled:
+                    self._delete_solver_job(job["id"])
+                    return
+                time.sleep(self.CANCEL_POLL_SECONDS)
+            try:
+                job = self.tlp_solver.get(job["id"])
+                poll_seconds = self.SOLVER_POLL_SECONDS
+            except TLPSolverConnectionError:
+                poll_seconds = min(2 * poll_seconds, self.SOLVER_MAX_RETRY_SECONDS)
+        self._delete_solver_job(job["id"])
+
+        self.state = bytes.fromhex(job["sa2"])
+        progress = dict(progress)
+        progress["iterations_done"] = self.tlp_param
+        progress["elapsed"] = time.perf_counter() - start_time
+        progress["remaining"] = 0.0
+        self._long_hash_progress = progress
+        self._emit_progress(
+            ProgressEvent(
+                SA1_TO_SA2, self.tlp_param, self.tlp_param, progress["elapsed"], 0.0
+            )
+        )
+
+    def _delete_solver_job(self, job_id: str) -> None:
+        # NOTE: A job left behind is only a record on the solver, it does not
+        # fail the derivation.
+        try:
+            self.tlp_solver.delete(job_id)
+        except TLPSolverError:
+            pass
+
+    def _open_hash_arena(self) -> Optional[Argon2Arena]:
+        """Map the arena of the long hash, None if it cannot be mapped."""
+        try:
+            return Argon2Arena(
+                self.LONG_HASH_MEMORY_COST, huge_pages=self.hash_arena_huge_pages
+            )
+        except (OSError, MemoryError):
+            return None
+
+    def _long_hash(self, secret: bytes, hash_arena: Optional[Argon2Arena]) -> bytes:
+        """Hash the secret taking presumably a long time, in the arena if any."""
+        hash_secret_raw = low_level.hash_secret_raw
+        if hash_arena is not None:
+            hash_secret_raw = hash_arena.hash_secret_raw
+        return hash_secret_raw(
+            secret=secret,
             salt=self.ARGON2_SALT,
-            time_cost=32,
-            memory_cost=1024,
-            parallelism=1,
+            time_cost=self.LONG_HASH_TIME_COST,
+            memory_cost=self.LONG_HASH_MEMORY_COST,
+            parallelism=self.LONG_HASH_PARALLELISM,
             hash_len=128,
             type=low_level.Type.I,
         )
 
+    def update_with_quick_hash(self):
+        """Update the state with the its hash taking presumably a quick time."""
+        self.state = self._quick_hash(self.state)
+
+    def _quick_hash(self, secret: bytes) -> bytes:
+        """Hash the secret taking presumably a quick time."""
+        self.hash_scheduler.acquire(self.QUICK_HASH_MEMORY_BYTES, interactive=True)
+        try:
+            return low_level.hash_secret_raw(
+                secret=secret,
+                salt=self.ARGON2_SALT,
+                time_cost=32,
+                memory_cost=1024,
+                parallelism=1,
+                hash_len=128,
+                type=low_level.Type.I,
+            )
+        finally:
+            self.hash_scheduler.release(self.QUICK_HASH_MEMORY_BYTES, interactive=True)
+
     def _shuffle_arity_indxes(self):
         """Shuffles the indexes in range `tree_arity` attribute."""
         self.shuffled_arity_indxes = [arity_idx for arity_idx in range(self.tree_arity)]
         random.shuffle(self.shuffled_arity_indxes)
 
+    def _get_branches_values(
+        self, param_cls: type[TacitKnowledgeParam], **kwargs
+    ) -> Optional[list]:
+        """Get the values of the shuffled branches of the current state.
+
+        The values speculatively precomputed while the user was choosing are
+        reused, the missing ones are computed across the hashing threads.
+
+        Returns:
+            The values of the branches, or None if the execution was canceled
+            meanwhile.
+        """
+        adjustment_key = tuple(kwargs.items())
+        values = {
+            arity_idx: self._prefetcher.get(
+                ("value", self.state, param_cls, adjustment_key, arity_idx)
+            )
+            for arity_idx in self.shuffled_arity_indxes
+        }
+        missing_idxs = [
+            arity_idx for arity_idx, value in values.items() if value is None
+        ]
+        if missing_idxs:
+            missing_values = param_cls.get_branches_values(
+                self.state,
+                missing_idxs,
+                max_workers=self.hashing_workers,
+                is_canceled=lambda: self.is_canceled,
+                **kwargs,
+            )
+            if missing_values is None:
+                return None
+            values.update(zip(missing_idxs, missing_values))
+        return [values[arity_idx] for arity_idx in self.shuffled_arity_indxes]
+
+    def _prefetch_next_level(
+        self, param_cls: type[TacitKnowledgeParam], adjustments: list[dict]
+    ):
+        """Speculatively compute the next level while the user is choosing.
+
+        The child states of the shuffled branches are computed first, then
+        the values of the branches of each child state for every given
+        adjustment params, within the prefetch budget.
+
+        Args:
+            param_cls (type[TacitKnowledgeParam]): The tacit knowledge param
+                of the options.
+            adjustments (list[dict]): The adjustment params following the
+                branch index of each value of an option.
+        """
+        state = self.state
+        shuffled_arity_indxes = list(self.shuffled_arity_indxes)
+        is_last_level = self.current_level + 1 >= self.tree_depth
+        tree_arity = self.tree_arity
+
+        def child_states_jobs():
+            for arity_idx in shuffled_arity_indxes:
+                yield (
+                    ("state", state, arity_idx),
+                    lambda arity_idx=arity_idx: self._quick_hash(
+                        state + bytes(arity_idx)
+                    ),
+                )
+
+        def next_level_values_jobs():
+            if is_last_level:
+                return
+            for arity_idx in shuffled_arity_indxes:
+                child_state = self._prefetcher.get(("state", state, arity_idx))
+                if child_state is None:
+                    continue
+                for kwargs in adjustments:
+                    adjustment_key = tuple(kwargs.items())
+                    for branch_idx in range(tree_arity):
+                        yield (
+                            (
+                                "value",
+                                child_state,
+                                param_cls,
+                                adjustment_key,
+                                branch_idx,
+                            ),
+                            lambda param=param_cls(
+                                child_state,
+                                branch_idx=branch_idx.to_bytes(length=4, byteorder="big"),
+                                **kwargs,
+                            ): param.get_value(),
+                        )
+
+        self._prefetcher.start([child_states_jobs, next_level_values_jobs])
+
+    def _render_fractals(
+        self,
+        fractals_params: list[tuple],
+        size: Optional[int] = None,
+        supersampling: int = 1,
+    ) -> Optional[list]:
+        """Render the fractals of the given params across the rendering pool.
+
+        Args:
+            fractals_params (list[tuple]): The `(func_type, real_p, imag_p)`
+                params of each fractal, in the order they should be returned.
+            size (Optional[int]): The width and height of the fractals, by
+                default `FRACTAL_SIZE`.
+            supersampling (int): The number of samples along each axis of
+                every pixel of the fractals.
+
+        Returns:
+            The list of rendered fractals in the same order as the params, or
+            None if the execution was canceled meanwhile.
+        """
+        size = self.FRACTAL_SIZE if size is None else size
+        if self.rendering_workers == 1 or len(fractals_params) == 1:
+            fractals = []
+            for func_type, real_p, imag_p in fractals_params:
+                if self.is_canceled:
+                    return None
+                fractals.append(
+                    self.fractal.update(
+                        func_type=func_type,
+                        real_p=real_p,
+                        imag_p=imag_p,
+                        width=size,
+                        height=size,
+                        supersampling=supersampling,
+                    )
+                )
+            return fractals
+
+        if self._rendering_pool is None:
+            # NOTE: We spawn the rendering processes instead of forking them,
+            # the GUI process is running Qt threads.
+            self._rendering_pool = multiprocessing.get_context("spawn").Pool(
+                self.rendering_workers
+            )
+        results = [
+            self._rendering_pool.apply_async(
+                render_fractal, (*fractal_params, size, size, supersampling)
+            )
+            for fractal_params in fractals_params
+        ]
+        for result in results:
+            while not result.ready():
+                if self.is_canceled:
+                    self._abort_rendering_pool()
+                    return None
+                result.wait(self.CANCEL_POLL_SECONDS)
+        return [result.get() for result in results]
+
+    def _abort_rendering_pool(self):
+        """Shut down the rendering pool, terminating the running renders."""
+        rendering_pool = self._rendering_pool
+        if rendering_pool is None:
+            return
+        self._rendering_pool = None
+        # NOTE: A running render cannot be stopped, so the processes of the
+        # pool are terminated, the next render starts a new pool.
+        rendering_pool.terminate()
+
     def get_fractal_query(self) -> list:
-        if self._derivation_path in self._saved_fractals:
-            return self._saved_fractals[self._derivation_path]
+        adjustments = [
+            {"real_p": "real_p".encode(encoding="utf-8")},
+            {"imag_p": "imag_p".encode(encoding="utf-8")},
+        ]
+        # NOTE: The previews are saved by size, and a level queried again is
+        # rendered from its saved params and shuffling, so a saved preview is
+        # always the one which would be rendered at the current preview size.
+        previews_key = (
+            self._derivation_path,
+            self.fractal_preview_size,
+            self.fractal_preview_supersampling,
+        )
+        saved_query = self._saved_fractals_params.get(self._derivation_path)
+        if saved_query is not None:
+            shuffled_arity_indxes, fractals_params = saved_query
+            self.shuffled_arity_indxes = list(shuffled_arity_indxes)
+            saved_fractals = self._saved_fractals.get(previews_key)
+            if saved_fractals is not None:
+                self._prefetch_next_level(FractalTacitKnowledgeParam, adjustments)
+                return saved_fractals
         else:
             self._shuffle_arity_indxes()
-            shuffled_fractals = [
-                self.fractal.update(
-                    func_type=self.fractal.func_type,
-                    real_p=FractalTacitKnowledgeParam(
-                        self.state,
-                        branch_idx=arity_idx.to_bytes(length=4, byteorder="big"),
-                        real_p="real_p".encode(encoding="utf-8"),
-                    ).get_value(),
-                    imag_p=FractalTacitKnowledgeParam(
-                        self.state,
-                        branch_idx=arity_idx.to_bytes(length=4, byteorder="big"),
-                        imag_p="imag_p".encode(encoding="utf-8"),
-                    ).get_value(),
-                )
-                for arity_idx in self.shuffled_arity_indxes
+            real_ps = self._get_branches_values(
+                FractalTacitKnowledgeParam, **adjustments[0]
+            )
+            imag_ps = self._get_branches_values(
+                FractalTacitKnowledgeParam, **adjustments[1]
+            )
+            if real_ps is None or imag_ps is None:
+                print("Task canceled")
+                return []
+            fractals_params = [
+                (self.fractal.func_type, real_p, imag_p)
+                for real_p, imag_p in zip(real_ps, imag_ps)
             ]
-            listr = f"Choose 1, ..., {self.tree_arity} for level {self.current_level}"
-            listr += f"{'' if not self.current_level else ', choose 0 to go back'}\n"
-            shuffled_fractals = [listr] + shuffled_fractals
-            self._saved_fractals[self._derivation_path.copy()] = shuffled_fractals
-            return shuffled_fractals
+
+        # NOTE: The options are previewed quickly at the size they are
+        # displayed, the GUI refines them to `FRACTAL_SIZE` when zoomed in.
+        shuffled_fractals = self._render_fractals(
+            fractals_params,
+            self.fractal_preview_size,
+            self.fractal_preview_supersampling,
+        )
+        if shuffled_fractals is None:
+            print("Task canceled")
+            return []
+        listr = f"Choose 1, ..., {self.tree_arity} for level {self.current_level}"
+        listr += f"{'' if not self.current_level else ', choose 0 to go back'}\n"
+        shuffled_fractals = [listr] + shuffled_fractals
+        self._saved_fractals[previews_key] = shuffled_fractals
+        self._saved_fractals_params[self._derivation_path] = (
+            list(self.shuffled_arity_indxes),
+            fractals_params,
+        )
+        self._prefetch_next_level(FractalTacitKnowledgeParam, adjustments)
+        return shuffled_fractals
+
+    def get_fractal_query_params(self) -> list[tuple]:
+        """The params of the fractals of the last fractal query at this level.
+
+        Returns:
+            The `(func_type, real_p, imag_p)` params of each option, in the
+            order of the query, to render the options with `render_fractal`
+            at another size, or an empty list if there was no query.
+        """
+        saved_query = self._saved_fractals_params.get(self._derivation_path)
+        return [] if saved_query is None else saved_query[1]
 
     def get_li_str_query(self) -> str:
         self._shuffle_arity_indxes()
-        shuffled_sentences = [
-            self.mnemo.to_mnemonic(
-                FormosaTacitKnowledgeParam(
-                    self.state,
-                    branch_idx=arity_idx.to_bytes(length=4, byteorder="big"),
-                ).get_value()
-            )
-            for arity_idx in self.shuffled_arity_indxes
-        ]
+        values = self._get_branches_values(FormosaTacitKnowledgeParam)
+        if values is None:
+            print("Task canceled")
+            return ""
+        shuffled_sentences = [self.mnemo.to_mnemonic(value) for value in values]
+        self._prefetch_next_level(FormosaTacitKnowledgeParam, [{}])
         listr = f"Choose 1, ..., {self.tree_arity} for level {self.current_level}"
         listr += f"{'' if not self.current_level else ', choose 0 to go back'}\n"
         for i in range(len(shuffled_sentences)):
@@ -224,15 +908,12 @@ class GreatWall:
 
     def get_shape_query(self) -> list:
         self._shuffle_arity_indxes()
-        shuffled_shapes = [
-            self.shaper.draw_regular_shape(
-                ShapeTacitKnowledgeParam(
-                    self.state,
-                    branch_idx=arity_idx.to_bytes(length=4, byteorder="big"),
-                ).get_value()
-            )
-            for arity_idx in self.shuffled_arity_indxes
-        ]
+        values = self._get_branches_values(ShapeTacitKnowledgeParam)
+        if values is None:
+            print("Task canceled")
+            return []
+        shuffled_shapes = [self.shaper.draw_regular_shape(value) for value in values]
+        self._prefetch_next_level(ShapeTacitKnowledgeParam, [{}])
         listr = f"Choose 1, ..., {self.tree_arity} for level {self.current_level}"
         listr += f"{'' if not self.current_level else ', choose 0 to go back'}\n"
         shuffled_shapes = [listr] + shuffled_shapes
@@ -252,19 +933,60 @@ class GreatWall:
                 greater than 0, this method will update the state depending on
                 this choice.
         """
+        self._prefetcher.cancel()
         if chosen_input > 0:
             self.current_level += 1
-            self._derivation_path.append(chosen_input)
+            self._derivation_path = self._derivation_path.child(chosen_input)
 
-            if self._derivation_path in self._saved_states.keys():
-                self.state = self._saved_states[self._derivation_path]
+            saved_state = self._saved_states.get(self._derivation_path)
+            if saved_state is not None:
+                self.state = saved_state
             else:
-                self.state += bytes(self.shuffled_arity_indxes[chosen_input - 1])
-                self.update_with_quick_hash()
-                self._saved_states[self._derivation_path.copy()] = self.state
+                arity_idx = self.shuffled_arity_indxes[chosen_input - 1]
+                prefetched_state = self._prefetcher.get(("state", self.state, arity_idx))
+                if prefetched_state is not None:
+                    self.state = prefetched_state
+                else:
+                    self.state += bytes(arity_idx)
+                    self._quick_hash_phase(LEVEL)
+                self._saved_states[self._derivation_path] = self.state
         else:
             self.return_level()
 
+    def derive_key(self, path: list[int]) -> Optional[bytes]:
+        """Derive the key of the given choices without user interaction.
+
+        The state hashes are initialized from SA0, then each choice is taken
+        in turn with the branches in their natural order, so a choice `i`
+        always takes the branch `i - 1`, whatever the shuffling of the
+        options shown to the user.
+
+        Args:
+            path (list[int]): The choice at each level of the tree, from 1 to
+                `tree_arity`, as many as `tree_depth`.
+
+        Returns:
+            The derived key KA, or None if the execution was canceled.
+        """
+        if len(path) != self.tree_depth:
+            raise ValueError(
+                f"The path has {len(path)} choices, the tree depth is {self.tree_depth}."
+            )
+        if any(not 1 <= choice <= self.tree_arity for choice in path):
+            raise ValueError(f"The choices must be from 1 to {self.tree_arity}.")
+
+        self.is_finished = False
+        self.init_state_hashes()
+        for choice in path:
+            if self.is_canceled:
+                return None
+            self.shuffled_arity_indxes = list(range(self.tree_arity))
+            self.derive_from_user_choice(choice)
+        if self.is_canceled:
+            return None
+        self.is_finished = True
+        return self.state
+
     def return_level(self):
         if not self.current_level:
             return
@@ -272,9 +994,17 @@ class GreatWall:
             self.is_finished = False
 
         self.current_level -= 1
-        self._derivation_path.pop()
+        self._derivation_path = self._derivation_path.parent
 
         self.state = self._saved_states[self._derivation_path]
 
     def cancel_execution(self):
+        """Cancel the running derivation, query or rendering.
+
+        The cancel is checked before each hash and while waiting for the
+        rendering processes, whose running renders are terminated, so the
+        execution stops within the hash, long hash iteration or in-process
+        render running when it is canceled.
+        """
         self.is_canceled = True
+        self._prefetcher.cancel()
@@ -0,0 +1,123 @@
+import mmap
+from typing import Optional
+
+from argon2 import low_level
+
+
+class Argon2Arena:
+    """A long-lived memory arena the Argon2 hashes are computed in.
+
+    Argon2 allocates, page faults and frees its whole memory on every hash,
+    1 GiB for each iteration of the long hash. The arena maps that memory
+    once, faults it in up front, optionally on huge pages, and hands it to
+    Argon2 through the allocation callbacks of its context, so the hashes
+    computed in it reuse the same pages.
+
+    Argon2 still wipes its memory at the end of each hash, before handing
+    it back to the arena. An arena is not thread-safe, each worker hashing
+    concurrently needs its own.
+    """
+
+    CHUNK_SIZE: int = 2 * 1024 * 1024
+
+    def __init__(self, memory_cost: int, huge_pages: bool = False) -> None:
+        """
+        Args:
+            memory_cost (int): The memory of the arena in KiB, the largest
+                memory cost of the hashes computed in it.
+            huge_pages (bool): Whether to advise the kernel to back the arena
+                with transparent huge pages, where it is supported.
+
+        Raises:
+            OSError: If the memory cannot be mapped.
+            MemoryError: If the allocation callbacks cannot be created.
+        """
+        self.memory_cost: int = memory_cost
+        self.size: int = memory_cost * 1024
+        self._map: Optional[mmap.mmap] = mmap.mmap(-1, self.size)
+        if huge_pages and hasattr(mmap, "MADV_HUGEPAGE"):
+            self._map.madvise(mmap.MADV_HUGEPAGE)
+        # NOTE: The pages are faulted in once here instead of on every hash.
+        zeros = bytes(self.CHUNK_SIZE)
+        for offset in range(0, self.size, self.CHUNK_SIZE):
+            chunk_size = min(self.CHUNK_SIZE, self.size - offset)
+            self._map[offset : offset + chunk_size] = zeros[:chunk_size]
+        self._memory = low_level.ffi.from_buffer("uint8_t[]", self._map)
+
+        @low_level.ffi.callback("int(uint8_t **, size_t)")
+        def allocate(memory, bytes_to_allocate):
+            if self._memory is None or bytes_to_allocate > self.size:
+                return low_level.lib.ARGON2_MEMORY_ALLOCATION_ERROR
+            memory[0] = self._memory
+            return low_level.lib.ARGON2_OK
+
+        @low_level.ffi.callback("void(uint8_t *, size_t)")
+        def free(memory, bytes_to_allocate):
+            pass
+
+        self._allocate = allocate
+        self._free = free
+
+    def __enter__(self) -> "Argon2Arena":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def hash_secret_raw(
+        self,
+        secret: bytes,
+        salt: bytes,
+        time_cost: int,
+        memory_cost: int,
+        parallelism: int,
+        hash_len: int,
+        type: low_level.Type,
+        version: int = low_level.ARGON2_VERSION,
+    ) -> bytes:
+        """Hash the secret in the arena, as `argon2.low_level.hash_secret_raw`.
+
+        Raises:
+            argon2.exceptions.HashingError: If the hashing fails, or if the
+                memory cost is larger than the arena.
+        """
+        ffi = low_level.ffi
+        out = ffi.new("uint8_t[]", hash_len)
+        password = ffi.new("uint8_t[]", secret)
+        salt_buffer = ffi.new("uint8_t[]", salt)
+        context = ffi.new(
+            "argon2_context *",
+            {
+                "version": version,
+                "out": out,
+                "outlen": hash_len,
+                "pwd": password,
+                "pwdlen": len(secret),
+                "salt": salt_buffer,
+                "saltlen": len(salt),
+                "secret": ffi.NULL,
+                "secretlen": 0,
+                "ad": ffi.NULL,
+                "adlen": 0,
+                "t_cost": time_cost,
+                "m_cost": memory_cost,
+                "lanes": parallelism,
+                "threads": parallelism,
+                "allocate_cbk": self._allocate,
+                "free_cbk": self._free,
+                "flags": low_level.lib.ARGON2_DEFAULT_FLAGS,
+            },
+        )
+        result = low_level.core(context, type.value)
+        if result != low_level.lib.ARGON2_OK:
+            raise low_level.HashingError(low_level.error_to_str(result))
+        return bytes(ffi.buffer(out, hash_len))
+
+    def close(self) -> None:
+        """Unmap the memory of the arena, no hash can be computed after."""
+        if self._map is None:
+            return
+        low_level.ffi.release(self._memory)
+        self._memory = None
+        self._map.close()
+        self._map = None
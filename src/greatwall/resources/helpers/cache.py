@@ -0,0 +1,144 @@
+import sys
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+import numpy as np
+
+
+class LRUCache:
+    """A memory-bounded cache evicting the least recently used entries.
+
+    The size of an entry is the size of its bytes, strings and numpy arrays,
+    or of the ones in it when the entry is a list or tuple. The arrays can
+    optionally be stored downcast to `float16` or `uint8`, which is lossy,
+    and are given back as `float64` arrays.
+    """
+
+    STORAGE_DTYPES = (None, np.float16, np.uint8)
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        dtype: Optional[type] = None,
+        is_pinned: Optional[Callable[[Hashable], bool]] = None,
+    ) -> None:
+        """
+        Args:
+            max_bytes (Optional[int]): The budget of the cache in bytes, None
+                for an unbounded cache.
+            dtype (Optional[type]): The dtype the arrays in the entries are
+                stored with, None to store them as they are.
+            is_pinned (Optional[Callable]): Whether the entry of a key must
+                not be evicted.
+        """
+        if dtype not in self.STORAGE_DTYPES:
+            raise ValueError(f"{dtype} is not a supported storage dtype.")
+        self.max_bytes: Optional[int] = max_bytes
+        self.dtype: Optional[type] = dtype
+        self.is_pinned: Optional[Callable[[Hashable], bool]] = is_pinned
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.size: int = 0
+
+        self._entries: OrderedDict = OrderedDict()
+        self._sizes: dict = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, key: Hashable):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: Hashable, value) -> None:
+        self.pop(key)
+        value = self._to_storage(value)
+        self._entries[key] = value
+        self._sizes[key] = self._sizeof(value)
+        self.size += self._sizes[key]
+        self._evict()
+
+    def keys(self) -> list:
+        """The keys of the entries, from the least to the most recently used."""
+        return list(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        """Get the entry of the key, counting the cache hits and misses."""
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._from_storage(self._entries[key])
+
+    def pop(self, key: Hashable, default=None):
+        """Remove the entry of the key and return it."""
+        if key not in self._entries:
+            return default
+        self.size -= self._sizes.pop(key)
+        return self._from_storage(self._entries.pop(key))
+
+    def clear(self) -> None:
+        """Remove all the entries, the counters are kept."""
+        self._entries.clear()
+        self._sizes.clear()
+        self.size = 0
+
+    def info(self) -> dict:
+        """The counters and the size of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _evict(self) -> None:
+        if self.max_bytes is None:
+            return
+        for key in list(self._entries):
+            if self.size <= self.max_bytes:
+                return
+            if self.is_pinned is not None and self.is_pinned(key):
+                continue
+            self.pop(key)
+            self.evictions += 1
+
+    def _sizeof(self, value) -> int:
+        if isinstance(value, np.ndarray):
+            return value.nbytes
+        if isinstance(value, (list, tuple)):
+            return sum(self._sizeof(item) for item in value)
+        if isinstance(value, (bytes, bytearray, str)):
+            return len(value)
+        return sys.getsizeof(value)
+
+    def _to_storage(self, value):
+        if isinstance(value, (list, tuple)):
+            return type(value)(self._to_storage(item) for item in value)
+        if not isinstance(value, np.ndarray) or self.dtype is None:
+            return value
+        if self.dtype is np.uint8:
+            # NOTE: The images are truncated as they are when displayed.
+            return np.require(value * 255, np.uint8)
+        return value.astype(self.dtype)
+
+    def _from_storage(self, value):
+        if isinstance(value, (list, tuple)):
+            return type(value)(self._from_storage(item) for item in value)
+        if not isinstance(value, np.ndarray) or value.dtype == np.float64:
+            return value
+        if value.dtype == np.uint8:
+            # NOTE: The half level offset keeps the truncation to the same
+            # level when the image is displayed.
+            return (value + 0.5) / 255
+        return value.astype(np.float64)
@@ -0,0 +1,148 @@
+import hashlib
+import hmac
+import os
+import secrets
+import struct
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+CHECKPOINT_PATH = (
+    Path(os.environ.get("GREATWALL_CACHE_DIR", Path.home() / ".cache" / "greatwall"))
+    / "checkpoints"
+)
+
+
+class TLPCheckpoint:
+    """An encrypted checkpoint of the progress of a time-lock puzzle.
+
+    The checkpoint holds the number of iterations done and the state reached,
+    encrypted and authenticated with keys derived from the state the puzzle
+    started from, so only who can derive that state can read the checkpoint
+    or even tell which file is its checkpoint.
+
+    The checkpoints are written only readable by their owner, in a folder
+    only they can list.
+
+    The keys are bound to the TLP profile too, as the states reached with
+    different profiles differ.
+
+    The cipher is a SHAKE-256 keystream over a random nonce, authenticated
+    with HMAC-SHA256 in encrypt-then-MAC, as no cipher library is required.
+
+    WARNING: The file name is itself derived from the state the puzzle
+    started from, so whoever can list the checkpoints can test guesses of
+    SA0 against their names at the cost of the quick hashes, without solving
+    the puzzle. They should only be kept on a trusted device.
+    """
+
+    # Magic, format version and nonce of a checkpoint file
+    HEADER = struct.Struct(">4sH16s")
+    MAGIC = b"GWCP"
+    VERSION = 1
+    ITERATION = struct.Struct(">Q")
+    TAG_SIZE = 32
+
+    def __init__(
+        self, secret: bytes, directory: Optional[Path] = None, tlp_profile: int = 1
+    ) -> None:
+        """
+        Args:
+            secret (bytes): The state the time-lock puzzle starts from.
+            directory (Optional[Path]): The directory of the checkpoint files,
+                by default `CHECKPOINT_PATH`.
+            tlp_profile (int): The version of the TLP profile of the puzzle.
+        """
+        self.tlp_profile: int = tlp_profile
+        directory = CHECKPOINT_PATH if directory is None else Path(directory)
+        self._encryption_key = self._derive_key(secret, b"encryption")
+        self._authentication_key = self._derive_key(secret, b"authentication")
+        file_name = self._derive_key(secret, b"file name")[:16].hex()
+        self.path: Path = directory / f"{file_name}.ckpt"
+
+    def _derive_key(self, secret: bytes, purpose: bytes) -> bytes:
+        message = b"GreatWall TLP checkpoint " + purpose
+        # NOTE: The checkpoints of the first profile predate the profiles.
+        if self.tlp_profile != 1:
+            message += b" profile %d" % self.tlp_profile
+        return hmac.new(secret, message, "sha256").digest()
+
+    def _keystream(self, nonce: bytes, size: int) -> bytes:
+        return hashlib.shake_256(self._encryption_key + nonce).digest(size)
+
+    def _tag(self, message: bytes) -> bytes:
+        return hmac.new(self._authentication_key, message, "sha256").digest()
+
+    def save(self, iteration: int, state: bytes) -> bool:
+        """Save the checkpoint, replacing the previous one atomically.
+
+        Args:
+            iteration (int): The number of iterations done.
+            state (bytes): The state reached after these iterations.
+
+        Returns:
+            Whether the checkpoint could be written.
+        """
+        plaintext = self.ITERATION.pack(iteration) + state
+        nonce = secrets.token_bytes(16)
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, nonce)
+        ciphertext = bytes(
+            a ^ b for a, b in zip(plaintext, self._keystream(nonce, len(plaintext)))
+        )
+        tag = self._tag(header + ciphertext)
+        try:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            # NOTE: The temporary file is unique to each save, so concurrent
+            # saves of the same checkpoint never write to the same file.
+            descriptor, temporary_file = tempfile.mkstemp(
+                suffix=".tmp", dir=self.path.parent
+            )
+        except OSError:
+            return False
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(header + ciphertext + tag)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary_file, self.path)
+            return True
+        except OSError:
+            try:
+                os.unlink(temporary_file)
+            except OSError:
+                pass
+            return False
+
+    def load(self) -> Optional[tuple[int, bytes]]:
+        """Load the checkpoint.
+
+        Returns:
+            The number of iterations done and the state reached, or None if
+            there is no checkpoint or it is not valid.
+        """
+        try:
+            data = self.path.read_bytes()
+        except OSError:
+            return None
+        if len(data) < self.HEADER.size + self.ITERATION.size + self.TAG_SIZE:
+            return None
+        header = data[: self.HEADER.size]
+        ciphertext = data[self.HEADER.size : -self.TAG_SIZE]
+        magic, version, nonce = self.HEADER.unpack(header)
+        if magic != self.MAGIC or version != self.VERSION:
+            return None
+        tag = self._tag(header + ciphertext)
+        if not hmac.compare_digest(tag, data[-self.TAG_SIZE :]):
+            return None
+        plaintext = bytes(
+            a ^ b for a, b in zip(ciphertext, self._keystream(nonce, len(ciphertext)))
+        )
+        (iteration,) = self.ITERATION.unpack(plaintext[: self.ITERATION.size])
+        return iteration, plaintext[self.ITERATION.size :]
+
+    def remove(self) -> None:
+        """Remove the checkpoint, if any."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Hashable, Iterable, Optional
+
+
+class Prefetcher:
+    """A speculative computation of values in background threads.
+
+    The jobs are run stage after stage, in the given order, until the budget
+    of jobs is spent or the prefetching is canceled. The results are kept by
+    key, so a stage can build its jobs on the results of the previous ones.
+    """
+
+    def __init__(self, max_workers: int = 1, budget: int = 0) -> None:
+        self.max_workers: int = max_workers
+        self.budget: int = budget
+
+        self._results: dict = {}
+        self._lock = threading.Lock()
+        self._cancel_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(
+        self, stages: list[Callable[[], Iterable[tuple[Hashable, Callable]]]]
+    ) -> None:
+        """Cancel the running prefetching and start a new one.
+
+        Args:
+            stages (list[Callable]): The stages of the prefetching, each one
+                returning the `(key, job)` pairs to be run once the previous
+                stages are finished.
+        """
+        self.cancel()
+        with self._lock:
+            self._results = {}
+        if self.budget <= 0:
+            return
+
+        self._cancel_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(stages, self._cancel_event), daemon=True
+        )
+        self._thread.start()
+
+    def cancel(self) -> None:
+        """Cancel the running prefetching, already computed results are kept."""
+        self._cancel_event.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait until the running prefetching is finished or canceled."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get(self, key: Hashable):
+        """Get the result of the job of the given key, None if not computed."""
+        with self._lock:
+            return self._results.get(key)
+
+    def _run(self, stages, cancel_event: threading.Event) -> None:
+        remaining_budget = self.budget
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for stage in stages:
+                futures = []
+                for key, job in stage():
+                    if remaining_budget <= 0 or cancel_event.is_set():
+                        break
+                    remaining_budget -= 1
+                    futures.append(
+                        executor.submit(self._run_job, key, job, cancel_event)
+                    )
+                wait(futures)
+                if remaining_budget <= 0 or cancel_event.is_set():
+                    return
+
+    def _run_job(self, key: Hashable, job: Callable, cancel_event) -> None:
+        if cancel_event.is_set():
+            return
+        result = job()
+        with self._lock:
+            if not cancel_event.is_set():
+                self._results[key] = result
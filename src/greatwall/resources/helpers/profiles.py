@@ -0,0 +1,71 @@
+class TLPProfile:
+    """A versioned set of Argon2 costs of each iteration of the long hash.
+
+    A profile is frozen once released, the keys derived with it depend on
+    its costs, so new costs always take a new version. The profiles with
+    several lanes hash them in as many threads, which divides the wall-clock
+    time of the time-lock puzzle on a machine with as many cores for the
+    same memory and passes, the cost of an attacker.
+
+    WARNING: An attacker with as many cores gets the same speed-up, so the
+    sequential lower bound of the puzzle is divided by the lanes too, it is
+    the TLP param that sets how long the puzzle takes.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        time_cost: int,
+        memory_cost: int,
+        parallelism: int,
+        description: str,
+    ) -> None:
+        """
+        Args:
+            version (int): The version of the profile, recorded with the
+                parameters of the derivation.
+            time_cost (int): The passes over the memory of each iteration.
+            memory_cost (int): The memory of each iteration, in KiB.
+            parallelism (int): The lanes, and threads, of each iteration.
+            description (str): The description of the profile shown to users.
+        """
+        self.version: int = version
+        self.time_cost: int = time_cost
+        self.memory_cost: int = memory_cost
+        self.parallelism: int = parallelism
+        self.description: str = description
+
+    def __repr__(self):
+        return (
+            f"TLPProfile(version={self.version}, time_cost={self.time_cost}, "
+            f"memory_cost={self.memory_cost}, parallelism={self.parallelism})"
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        """The memory each iteration of the long hash takes, in bytes."""
+        return self.memory_cost * 1024
+
+
+# NOTE: The profiles are frozen, never change the costs of a released one.
+TLP_PROFILES: dict[int, TLPProfile] = {
+    profile.version: profile
+    for profile in [
+        TLPProfile(1, 8, 1048576, 1, "v1: 1 GiB, 8 passes, 1 lane"),
+        TLPProfile(2, 8, 1048576, 4, "v2: 1 GiB, 8 passes, 4 lanes"),
+        TLPProfile(3, 4, 2097152, 8, "v3: 2 GiB, 4 passes, 8 lanes"),
+    ]
+}
+DEFAULT_TLP_PROFILE: int = 1
+
+
+def get_tlp_profile(version: int) -> TLPProfile:
+    """The TLP profile of the version.
+
+    Raises:
+        ValueError: If there is no profile of the version.
+    """
+    try:
+        return TLP_PROFILES[version]
+    except (KeyError, TypeError):
+        raise ValueError(f"There is no TLP profile {version!r}.") from None
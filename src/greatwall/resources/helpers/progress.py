@@ -0,0 +1,114 @@
+import math
+import threading
+from typing import Optional
+
+# Phases of a derivation
+SA0_TO_SA1 = "SA0 -> SA1"
+SA1_TO_SA2 = "SA1 -> SA2"
+SA2_TO_SA3 = "SA2 -> SA3"
+LEVEL = "Level"
+
+
+class ProgressEvent:
+    """A step of a phase of the derivation.
+
+    An event is emitted when a phase starts, with `iteration` 0, and after
+    each of its hashes, with the time the hash took.
+    """
+
+    __slots__ = (
+        "phase",
+        "iteration",
+        "iterations",
+        "elapsed",
+        "remaining",
+        "hash_seconds",
+    )
+
+    def __init__(
+        self,
+        phase: str,
+        iteration: int,
+        iterations: int,
+        elapsed: float = 0.0,
+        remaining: Optional[float] = None,
+        hash_seconds: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            phase (str): The phase of the derivation.
+            iteration (int): The number of hashes done in the phase.
+            iterations (int): The number of hashes of the phase.
+            elapsed (float): The seconds since the phase started.
+            remaining (Optional[float]): The estimated seconds until the phase
+                is finished, None until it can be estimated.
+            hash_seconds (Optional[float]): The seconds the last hash took,
+                None when the phase starts.
+        """
+        self.phase: str = phase
+        self.iteration: int = iteration
+        self.iterations: int = iterations
+        self.elapsed: float = elapsed
+        self.remaining: Optional[float] = remaining
+        self.hash_seconds: Optional[float] = hash_seconds
+
+    def __repr__(self):
+        return f"ProgressEvent({self.as_dict()})"
+
+    def as_dict(self) -> dict:
+        """The fields of the event."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class PhaseTimings:
+    """The latency histograms of the hashes of each phase of the derivation.
+
+    The hashes are counted in buckets of milliseconds with power of two
+    upper bounds.
+    """
+
+    def __init__(self) -> None:
+        self._phases: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, event: ProgressEvent) -> None:
+        """Record the hash time of the event, if it has one."""
+        if event.hash_seconds is None:
+            return
+        milliseconds = event.hash_seconds * 1000
+        bucket = 2 ** max(0, math.ceil(math.log2(max(milliseconds, 1))))
+        with self._lock:
+            timings = self._phases.setdefault(
+                event.phase,
+                {
+                    "count": 0,
+                    "total": 0.0,
+                    "min": math.inf,
+                    "max": 0.0,
+                    "histogram": {},
+                },
+            )
+            timings["count"] += 1
+            timings["total"] += event.hash_seconds
+            timings["min"] = min(timings["min"], event.hash_seconds)
+            timings["max"] = max(timings["max"], event.hash_seconds)
+            timings["histogram"][bucket] = timings["histogram"].get(bucket, 0) + 1
+
+    def clear(self) -> None:
+        """Forget the recorded timings."""
+        with self._lock:
+            self._phases.clear()
+
+    def info(self) -> dict[str, dict]:
+        """The count, total, min and max seconds and the histogram by phase.
+
+        The histogram maps the upper bound of each bucket, in milliseconds,
+        to the number of hashes in it.
+        """
+        with self._lock:
+            return {
+                phase: dict(
+                    timings, histogram=dict(sorted(timings["histogram"].items()))
+                )
+                for phase, timings in self._phases.items()
+            }
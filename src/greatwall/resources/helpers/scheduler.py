@@ -0,0 +1,194 @@
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+# Classes of the hashes admitted by the scheduler
+LONG_HASH = "long hash"
+QUICK_HASH = "quick hash"
+
+
+def available_memory() -> Optional[int]:
+    """The memory available to new allocations on this machine, None if unknown.
+
+    It is the `MemAvailable` of Linux, and the free physical pages elsewhere
+    they can be counted.
+    """
+    try:
+        with open("/proc/meminfo") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class HashScheduler:
+    """A process-wide admission of the memory-hard hashes.
+
+    The long hashes, an iteration of the time-lock puzzle each, are admitted
+    in the order they asked while their memory fits in the budget and in the
+    memory available on the machine, so the concurrent derivations of a
+    batch or of several GUI sessions take turns instead of running the host
+    out of memory. A long hash is always admitted when no other is running,
+    as it could never be otherwise.
+
+    The quick hashes of the queries are interactive, they do not queue
+    behind the long hashes but take a small reserve of memory of their own,
+    so the options keep showing up quickly while puzzles are solved.
+
+    NOTE: The memory available is read when a long hash is admitted, the
+    hashes of other processes are only seen through it.
+    """
+
+    QUICK_HASHES_MEMORY_BYTES: int = 64 * 1024 * 1024
+    # Interval of the checks of the memory available and of the cancels
+    POLL_SECONDS: float = 0.05
+
+    def __init__(
+        self,
+        memory_budget: Optional[int] = None,
+        available_memory: Callable[[], Optional[int]] = available_memory,
+    ) -> None:
+        """
+        Args:
+            memory_budget (Optional[int]): The memory the long hashes can take
+                at the same time, in bytes, with None only the memory
+                available on the machine bounds them.
+            available_memory (Callable): The function giving the memory
+                available on the machine, None if unknown.
+        """
+        self.memory_budget: Optional[int] = memory_budget
+        self._available_memory: Callable[[], Optional[int]] = available_memory
+
+        self._condition = threading.Condition()
+        self._tickets = itertools.count()
+        self._queues: dict[str, deque] = {LONG_HASH: deque(), QUICK_HASH: deque()}
+        self._running: dict[str, int] = {LONG_HASH: 0, QUICK_HASH: 0}
+        self._reserved_bytes: dict[str, int] = {LONG_HASH: 0, QUICK_HASH: 0}
+        self._waits: dict[str, dict] = {}
+        self.clear_metrics()
+
+    def set_memory_budget(self, memory_budget: Optional[int]) -> None:
+        """Set the memory the long hashes can take at the same time, in bytes."""
+        with self._condition:
+            self.memory_budget = memory_budget
+            self._condition.notify_all()
+
+    def _fits(self, hash_class: str, memory_bytes: int) -> bool:
+        if not self._running[hash_class]:
+            return True
+        reserved_bytes = self._reserved_bytes[hash_class] + memory_bytes
+        if hash_class == QUICK_HASH:
+            return reserved_bytes <= self.QUICK_HASHES_MEMORY_BYTES
+        if self.memory_budget is not None and reserved_bytes > self.memory_budget:
+            return False
+        available_bytes = self._available_memory()
+        return available_bytes is None or memory_bytes <= available_bytes
+
+    def acquire(
+        self,
+        memory_bytes: int,
+        interactive: bool = False,
+        is_canceled: Optional[Callable[[], bool]] = None,
+    ) -> bool:
+        """Wait for the turn of a hash taking the given memory.
+
+        Args:
+            memory_bytes (int): The memory the hash takes, in bytes.
+            interactive (bool): Whether it is a quick hash of a query, which
+                does not queue behind the long hashes.
+            is_canceled (Optional[Callable]): Whether the hash is canceled,
+                checked while waiting.
+
+        Returns:
+            Whether the hash was admitted, False if it was canceled before,
+            otherwise `release` must be called once it is done.
+        """
+        hash_class = QUICK_HASH if interactive else LONG_HASH
+        start_time = time.perf_counter()
+        with self._condition:
+            ticket = next(self._tickets)
+            queue = self._queues[hash_class]
+            queue.append(ticket)
+            try:
+                while queue[0] != ticket or not self._fits(hash_class, memory_bytes):
+                    if is_canceled is not None and is_canceled():
+                        return False
+                    # NOTE: The memory available changes without notice, it
+                    # is polled while waiting.
+                    self._condition.wait(self.POLL_SECONDS)
+            finally:
+                queue.remove(ticket)
+                self._condition.notify_all()
+            self._running[hash_class] += 1
+            self._reserved_bytes[hash_class] += memory_bytes
+            self._record_wait(hash_class, time.perf_counter() - start_time)
+            return True
+
+    def release(self, memory_bytes: int, interactive: bool = False) -> None:
+        """End the turn of a hash admitted by `acquire`."""
+        hash_class = QUICK_HASH if interactive else LONG_HASH
+        with self._condition:
+            self._running[hash_class] -= 1
+            self._reserved_bytes[hash_class] -= memory_bytes
+            self._condition.notify_all()
+
+    def has_waiting_long_hashes(self) -> bool:
+        """Whether long hashes are queued, waiting for their turn."""
+        with self._condition:
+            return bool(self._queues[LONG_HASH])
+
+    def _record_wait(self, hash_class: str, wait_seconds: float) -> None:
+        waits = self._waits[hash_class]
+        milliseconds = wait_seconds * 1000
+        bucket = 2 ** max(0, math.ceil(math.log2(max(milliseconds, 1))))
+        waits["count"] += 1
+        waits["total"] += wait_seconds
+        waits["max"] = max(waits["max"], wait_seconds)
+        waits["histogram"][bucket] = waits["histogram"].get(bucket, 0) + 1
+
+    def clear_metrics(self) -> None:
+        """Forget the recorded wait times."""
+        with self._condition:
+            self._waits = {
+                hash_class: {"count": 0, "total": 0.0, "max": 0.0, "histogram": {}}
+                for hash_class in (LONG_HASH, QUICK_HASH)
+            }
+
+    def info(self) -> dict:
+        """The queue depth, running hashes, memory and wait times by class.
+
+        The wait times are the count, total and max seconds the admitted
+        hashes waited, and their histogram, mapping the upper bound of each
+        bucket in milliseconds, power of two, to the number of hashes in it.
+        """
+        with self._condition:
+            return {
+                "memory_budget": self.memory_budget,
+                **{
+                    hash_class: {
+                        "queued": len(self._queues[hash_class]),
+                        "running": self._running[hash_class],
+                        "reserved_bytes": self._reserved_bytes[hash_class],
+                        "waits": dict(
+                            self._waits[hash_class],
+                            histogram=dict(
+                                sorted(self._waits[hash_class]["histogram"].items())
+                            ),
+                        ),
+                    }
+                    for hash_class in (LONG_HASH, QUICK_HASH)
+                },
+            }
+
+
+# NOTE: The hashes of every GreatWall of the process share the scheduler.
+hash_scheduler: HashScheduler = HashScheduler()
@@ -0,0 +1,62 @@
+import json
+import urllib.error
+import urllib.request
+from typing import Optional
+
+
+class TLPSolverError(Exception):
+    """The solver could not be reached or could not solve the puzzle."""
+
+
+class TLPSolverConnectionError(TLPSolverError):
+    """The solver could not be reached, it may be reached again later."""
+
+
+class TLPSolverClient:
+    """A client of the JSON API of a TLP solver, see `resources.solver`."""
+
+    def __init__(self, url: str, timeout: float = 10.0) -> None:
+        """
+        Args:
+            url (str): The URL of the solver, as "http://127.0.0.1:8421".
+            timeout (float): The seconds a request to the solver can take.
+        """
+        self.url: str = url.rstrip("/")
+        self.timeout: float = timeout
+
+    def _request(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(
+            self.url + path,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response_data = response.read()
+        except urllib.error.HTTPError as error:
+            try:
+                message = json.loads(error.read())["error"]
+            except (ValueError, KeyError, TypeError):
+                message = error.reason
+            raise TLPSolverError(f"The solver answered {error.code}: {message}")
+        except (urllib.error.URLError, OSError) as error:
+            raise TLPSolverConnectionError(f"The solver cannot be reached: {error}")
+        return json.loads(response_data) if response_data else {}
+
+    def submit(self, sa1: bytes, tlp_param: int, tlp_profile: int) -> dict:
+        """Submit the time-lock puzzle of SA1, returning its job."""
+        return self._request(
+            "POST",
+            "/jobs",
+            {"sa1": sa1.hex(), "tlp_param": tlp_param, "tlp_profile": tlp_profile},
+        )
+
+    def get(self, job_id: str) -> dict:
+        """The status and progress of the job, with its `sa2` once done."""
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def delete(self, job_id: str) -> None:
+        """Delete the job, canceling it if it is running."""
+        self._request("DELETE", f"/jobs/{job_id}")
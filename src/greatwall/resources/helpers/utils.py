@@ -1,39 +1,75 @@
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
 
 from argon2 import low_level
 
+from .cache import LRUCache
+from .scheduler import hash_scheduler
 
-class DerivationPath(list):
-    """A representation of the tree-like derivation key."""
 
-    def copy(self):
-        """Create a shallow copy of the path"""
-        new_instance = DerivationPath(self)
+class DerivationPath(tuple):
+    """An immutable representation of the tree-like derivation key.
+
+    The hash is computed once on creation and two paths are equal when they
+    have the same nodes, so paths are cheap keys for the saved levels.
+    """
+
+    def __new__(cls, nodes: Iterable = ()):
+        new_instance = super().__new__(cls, nodes)
+        new_instance._hash = tuple.__hash__(new_instance)
         return new_instance
 
-    def __contains__(self, item):
-        return item in " -> ".join(str(node) for node in self)
+    def __reduce__(self):
+        return DerivationPath, (tuple(self),)
 
     def __eq__(self, other):
-        return " -> ".join(str(node) for node in self) == other
+        if self is other:
+            return True
+        if isinstance(other, DerivationPath) and self._hash != other._hash:
+            return False
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
 
     def __hash__(self):
-        return hash(" -> ".join(str(node) for node in self))
+        return self._hash
 
     def __str__(self):
-        if len(self) > 1:
-            return " -> ".join(str(node) for node in self)
-        elif len(self) == 1:
-            return "".join(str(node) for node in self)
-        else:
-            return ""
+        return " -> ".join(str(node) for node in self)
+
+    @property
+    def parent(self) -> "DerivationPath":
+        """The path one level up, the root path is its own parent."""
+        return DerivationPath(self[:-1])
+
+    def child(self, node) -> "DerivationPath":
+        """The path one level down through the given node."""
+        return DerivationPath(self + (node,))
+
+    def is_prefix_of(self, other: "DerivationPath") -> bool:
+        """Whether the path is an ancestor of, or the same as, the other path."""
+        return len(self) <= len(other) and tuple.__eq__(self, other[: len(self)])
 
 
 class TacitKnowledgeParam:
-    """A representation of the tacit knowledge params."""
+    """A representation of the tacit knowledge params.
+
+    The value of a param is the end of a chain of hashes, one per adjustment
+    param. The links are memoized by state and adjustment params hashed so
+    far, so the chains sharing a prefix, like the `real_p` and `imag_p` of a
+    fractal branch, hash it once.
+    """
 
     ARGON2_SALT: bytes = bytes("00000000000000000000000000000000", "utf-8")
     NUM_BYTES_FORM: int = 4
+    LINKS_MAX_BYTES: int = 1024 * 1024
+    HASH_MEMORY_BYTES: int = 1024 * 1024
+
+    # NOTE: The links are shared by all params and hashing threads.
+    _links: LRUCache = LRUCache(max_bytes=LINKS_MAX_BYTES)
+    _links_lock: threading.Lock = threading.Lock()
 
     def __init__(self, state: bytes, **kwargs) -> None:
         self.state: bytes = state
@@ -47,24 +83,95 @@ class TacitKnowledgeParam:
 
         return self._value
 
+    @classmethod
+    def get_branches_values(
+        cls,
+        state: bytes,
+        branch_idxs: list[int],
+        max_workers: Optional[int] = None,
+        is_canceled: Optional[Callable[[], bool]] = None,
+        **kwargs,
+    ) -> Optional[list]:
+        """Get the values of the param for many branches of the same state.
+
+        The values are computed across a thread pool, the memory-hard hash
+        releases the GIL while running.
+
+        Args:
+            state (bytes): The state the branches are derived from.
+            branch_idxs (list[int]): The indexes of the branches.
+            max_workers (Optional[int]): The number of hashing threads,
+                defaults to the number of CPUs.
+            is_canceled (Optional[Callable]): Whether the computation is
+                canceled, checked before hashing each branch.
+            **kwargs: The adjustment params following the branch index.
+
+        Returns:
+            The list of values in the same order as `branch_idxs`, or None
+            if the computation was canceled meanwhile.
+        """
+        params = [
+            cls(
+                state,
+                branch_idx=branch_idx.to_bytes(length=4, byteorder="big"),
+                **kwargs,
+            )
+            for branch_idx in branch_idxs
+        ]
+        if is_canceled is None:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                return list(executor.map(cls.get_value, params))
+
+        def get_value_unless_canceled(param: TacitKnowledgeParam):
+            return None if is_canceled() else param.get_value()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            values = list(executor.map(get_value_unless_canceled, params))
+        return None if is_canceled() else values
+
+    @classmethod
+    def clear_links(cls) -> None:
+        """Forget the memoized links of the hash chains."""
+        with cls._links_lock:
+            cls._links.clear()
+
+    @classmethod
+    def links_info(cls) -> dict:
+        """The hits, misses and size of the memoized links."""
+        with cls._links_lock:
+            return cls._links.info()
+
     def _compute_value(self):
         """Get a valid tacit knowledge value from provided adjustment params."""
 
         # jth candidate L_(i+1), the state resulting from appending bytes of j
         # (here, branch_idx_bytes to current state L_i and hashing it)
         next_state_candidate = self.state
+        hashed_params_bytes = ()
         for param in self.adjustment_params:
             tacit_knowledge_param_bytes = self.adjustment_params[param]
-
-            next_state_candidate = low_level.hash_secret_raw(
-                secret=next_state_candidate + tacit_knowledge_param_bytes,
-                salt=self.ARGON2_SALT,
-                time_cost=32,
-                memory_cost=1024,
-                parallelism=1,
-                hash_len=128,
-                type=low_level.Type.I,
-            )
+            hashed_params_bytes += (tacit_knowledge_param_bytes,)
+
+            link_key = (self.state, hashed_params_bytes)
+            with self._links_lock:
+                link = self._links.get(link_key)
+            if link is None:
+                hash_scheduler.acquire(self.HASH_MEMORY_BYTES, interactive=True)
+                try:
+                    link = low_level.hash_secret_raw(
+                        secret=next_state_candidate + tacit_knowledge_param_bytes,
+                        salt=self.ARGON2_SALT,
+                        time_cost=32,
+                        memory_cost=1024,
+                        parallelism=1,
+                        hash_len=128,
+                        type=low_level.Type.I,
+                    )
+                finally:
+                    hash_scheduler.release(self.HASH_MEMORY_BYTES, interactive=True)
+                with self._links_lock:
+                    self._links[link_key] = link
+            next_state_candidate = link
 
         return next_state_candidate[0 : self.NUM_BYTES_FORM]
 
@@ -105,6 +212,3 @@ class ShapeTacitKnowledgeParam(TacitKnowledgeParam):
 
     def _compute_value(self):
         return super()._compute_value()
-
-
-
@@ -5,6 +5,19 @@ import numpy as np
 
 from ..helpers import constants
 
+# Element-wise `math.log`, keeping the exact results of the scalar engine
+_log = np.frompyfunc(math.log, 1, 1)
+
+# Distance to the boundaries of the known interior of the Mandelbrot set
+MANDELBROT_INTERIOR_MARGIN = 1e-9
+
+
+def _abs(z: np.ndarray) -> np.ndarray:
+    """Return the modulus of complex numbers exactly as the scalar `abs`."""
+    # NOTE: `np.abs` on complex arrays uses a vectorized routine which may
+    # differ in the last bit from the `hypot` used by the scalar `abs`.
+    return np.hypot(z.real, z.imag)
+
 
 class Fractal:
     """
@@ -28,6 +41,7 @@ class Fractal:
         height=None,
         escape_radius=None,
         max_iters=None,
+        supersampling=1,
     ) -> None:
         self.func_type = func_type
         self.x_min: Optional[float] = x_min
@@ -40,6 +54,7 @@ class Fractal:
         self.height: Optional[int] = height
         self.escape_radius: Optional[int] = escape_radius
         self.max_iters: Optional[int] = max_iters
+        self.supersampling: int = supersampling
 
         self._image_pixels: Optional[np.array] = None
 
@@ -64,7 +79,20 @@ class Fractal:
         height=None,
         escape_radius=None,
         max_iters=None,
+        supersampling=1,
     ):
+        """
+        Render the fractal of the given function type and params.
+
+        Args:
+            width (Optional[int]): The width of the image, as displayed.
+            height (Optional[int]): The height of the image, as displayed.
+            supersampling (int): The number of samples along each axis of
+                every pixel, the image is rendered `supersampling` times
+                larger then downsampled to the given size.
+        """
+        if not isinstance(supersampling, int) or supersampling < 1:
+            raise ValueError("The supersampling must be a positive integer.")
         self.x_min = x_min
         self.x_max = x_max
         self.y_min = y_min
@@ -75,6 +103,7 @@ class Fractal:
         self.height = height
         self.escape_radius = escape_radius
         self.max_iters = max_iters
+        self.supersampling = supersampling
         self.func_type = func_type
 
         if func_type in constants.FRACTAL_FUNCTIONS:
@@ -87,19 +116,125 @@ class Fractal:
         else:
             raise ValueError(f"{func_type} does not supported.")
 
-    def _smooth_stability(self, z: complex, escape_count: int, max_iters: int):
+    def _smooth_stability(self, z: np.ndarray, escape_count: int, max_iters: int):
         """
         Return a smoothed ratio of the escape count to maximum number iterations,
             using a smoothing logarithms formula.
 
         Args:
-            z (complex): The complex number that produced the excape count.
-            escape_count (int): The escapt count that needs to be smoothed.
+            z (np.ndarray): The complex numbers that produced the escape count.
+            escape_count (int): The escape count that needs to be smoothed.
             max_iters (int): The maximum number of iterations.
         """
-        smooth_value = escape_count + 1 - math.log(math.log(abs(z))) / math.log(2)
+        # NOTE: `math.log` is applied element-wise on purpose, `np.log` may
+        # differ in the last bit and the pixels must stay reproducible.
+        log_abs = _log(_abs(z)).astype(float)
+        smooth_value = escape_count + 1 - _log(log_abs).astype(float) / math.log(2)
         stability = smooth_value / max_iters
-        return max(0.0, min(stability, 1.0))
+        return np.clip(stability, 0.0, 1.0)
+
+    def _grid(self, x_min, x_max, y_min, y_max, width, height) -> np.ndarray:
+        """
+        Return the 2D grid of the complex points sampled, `supersampling`
+            points along each axis of every pixel.
+        """
+        x = np.linspace(x_min, x_max, width * self.supersampling)
+        y = np.linspace(y_min, y_max, height * self.supersampling)
+
+        return x[np.newaxis, :] + y[:, np.newaxis] * 1j
+
+    def _downsample(self, pixels: np.ndarray) -> np.ndarray:
+        """
+        Return the mean of the samples of every pixel.
+
+        The samples are averaged in a fixed order, so an image downsampled
+            from a supersampled render is always the same for the same size.
+        """
+        factor = self.supersampling
+        if factor == 1:
+            return pixels
+        height, width = pixels.shape[0] // factor, pixels.shape[1] // factor
+        return pixels.reshape(height, factor, width, factor).mean(axis=(1, 3))
+
+    def _escape_time(
+        self,
+        c: np.ndarray,
+        step,
+        escape_radius,
+        max_iters,
+        interior: Optional[np.ndarray] = None,
+        check_periodicity: bool = False,
+    ):
+        """
+        Return the smoothed escape time of every point of the grid `c`.
+
+        All still bounded points are iterated together, the escaped ones are
+            smoothed and dropped from the working set at each iteration.
+
+        Args:
+            c (np.ndarray): The 2D grid of complex starting points.
+            step (callable): The map `step(z, c)` giving the next iterate.
+            escape_radius (int): The radius beyond which a point escaped.
+            max_iters (int): The maximum number of iterations.
+            interior (Optional[np.ndarray]): The mask of the points known to
+                never escape, which are not iterated.
+            check_periodicity (bool): Whether to drop the points whose iterate
+                comes back exactly to a previous one, which never escape.
+        """
+        pixels = np.ones(c.shape)
+        flat_pixels = pixels.reshape(-1)
+        indexes = np.arange(c.size)
+        c = c.reshape(-1)
+        if interior is not None:
+            exterior = ~interior.reshape(-1)
+            indexes, c = indexes[exterior], c[exterior]
+        z = c
+        # NOTE: The iterate is compared to the one saved at the last power of
+        # two iteration, which finds the cycles of any period (Brent). As the
+        # iterations are exact repetitions of the same operations, a point
+        # coming back to a bounded iterate cycles forever.
+        saved_z = z
+        next_save = 1
+        with np.errstate(all="ignore"):
+            for escape_count in range(max_iters):
+                escaped = _abs(z) > escape_radius
+                if escaped.any():
+                    flat_pixels[indexes[escaped]] = self._smooth_stability(
+                        z[escaped], escape_count, max_iters
+                    )
+                    bounded = ~escaped
+                    indexes, z, c = indexes[bounded], z[bounded], c[bounded]
+                    saved_z = saved_z[bounded]
+                if not indexes.size:
+                    break
+                z = step(z, c)
+                if not check_periodicity:
+                    continue
+                cycling = z == saved_z
+                if cycling.any():
+                    aperiodic = ~cycling
+                    indexes, z, c = indexes[aperiodic], z[aperiodic], c[aperiodic]
+                    saved_z = saved_z[aperiodic]
+                if escape_count + 1 == next_save:
+                    saved_z = z
+                    next_save *= 2
+        return pixels
+
+    @staticmethod
+    def _mandelbrot_interior(c: np.ndarray) -> np.ndarray:
+        """
+        Return the mask of the points in the main cardioid or the period-2
+            bulb of the Mandelbrot set of exponent 2, which never escape.
+
+        The points within `MANDELBROT_INTERIOR_MARGIN` of the boundaries are
+            left out, so rounding errors never take in a point outside.
+        """
+        x, y = c.real, c.imag
+        y2 = y * y
+        q = (x - 0.25) ** 2 + y2
+        in_cardioid = q * (q + (x - 0.25)) < 0.25 * y2 - MANDELBROT_INTERIOR_MARGIN
+        in_bulb = (x + 1) ** 2 + y2 < 0.0625 - MANDELBROT_INTERIOR_MARGIN
+        return in_cardioid | in_bulb
 
     def burningship_set(
         self,
@@ -125,23 +260,13 @@ class Fractal:
         escape_radius = escape_radius if self.escape_radius is None else self.escape_radius
         max_iters = max_iters if self.max_iters is None else self.max_iters
 
-        x = np.linspace(x_min, x_max, width)
-        y = np.linspace(y_min, y_max, height)
-
-        pixels = np.zeros((height, width))
-        for i in range(height):
-            for j in range(width):
-                c = x[j] + y[i] * 1j
-                z = c
-                for escape_count in range(max_iters):
-                    if abs(z) > escape_radius:
-                        pixels[i, j] = self._smooth_stability(z, escape_count, max_iters)
-                        break
-                    exponent = complex(real_p, imag_p)
-                    z = (abs(z.real) + (1j * abs(z.imag))) ** exponent + c
-                else:
-                    pixels[i, j] = 1
-        return pixels
+        c = self._grid(x_min, x_max, y_min, y_max, width, height)
+        exponent = complex(real_p, imag_p)
+
+        def step(z, c):
+            return np.power(np.abs(z.real) + (1j * np.abs(z.imag)), exponent) + c
+
+        return self._downsample(self._escape_time(c, step, escape_radius, max_iters))
 
     def mandelbrot_set(
         self,
@@ -167,19 +292,47 @@ class Fractal:
         escape_radius = escape_radius if self.escape_radius is None else self.escape_radius
         max_iters = max_iters if self.max_iters is None else self.max_iters
 
-        x = np.linspace(x_min, x_max, width)
-        y = np.linspace(y_min, y_max, height)
-
-        pixels = np.zeros((height, width))
-        for i in range(height):
-            for j in range(width):
-                c = x[j] + y[i] * 1j
-                z = c
-                for escape_count in range(max_iters):
-                    if abs(z) > escape_radius:
-                        pixels[i, j] = self._smooth_stability(z, escape_count, max_iters)
-                        break
-                    z = z ** complex(real_p, imag_p) + c
-                else:
-                    pixels[i, j] = 1
-        return pixels
+        c = self._grid(x_min, x_max, y_min, y_max, width, height)
+        exponent = complex(real_p, imag_p)
+
+        def step(z, c):
+            return np.power(z, exponent) + c
+
+        # NOTE: The orbits of the points of the Mandelbrot set of exponent 2
+        # stay within the radius 2, so its cardioid and bulb can be skipped.
+        # The bounded orbits of the integer exponents mostly converge to
+        # cycles, which are rare within the iterations for the others.
+        interior = None
+        if exponent == 2 and escape_radius >= 2:
+            interior = self._mandelbrot_interior(c)
+        is_integer_exponent = not exponent.imag and exponent.real.is_integer()
+
+        return self._downsample(
+            self._escape_time(
+                c,
+                step,
+                escape_radius,
+                max_iters,
+                interior=interior,
+                check_periodicity=is_integer_exponent,
+            )
+        )
+
+
+def render_fractal(
+    func_type: str,
+    real_p: float,
+    imag_p: float,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    supersampling: int = 1,
+) -> np.ndarray:
+    """Render a fractal with default settings, to be run in a worker process."""
+    return Fractal().update(
+        func_type=func_type,
+        real_p=real_p,
+        imag_p=imag_p,
+        width=width,
+        height=height,
+        supersampling=supersampling,
+    )
@@ -17,15 +17,20 @@
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+import functools
 import hashlib
 import hmac
 import itertools
 import json
+import marshal
+import mmap
 import os
+import struct
 import sys
+import threading
 import unicodedata
 from pathlib import Path
-from typing import TypeVar, Union
+from typing import Optional, TypeVar, Union
 
 # This prevents IDE from creating a cache file
 sys.dont_write_bytecode = True
@@ -45,10 +50,26 @@ class ThemeNotFound(Exception):
     pass
 
 
+def _memoized_property(method):
+    """A ThemeDict property computed once, until the ThemeDict is modified"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def memoized_method(self):
+        if name not in self._structure:
+            self._structure[name] = method(self)
+        return self._structure[name]
+
+    return property(memoized_method)
+
+
 class ThemeDict(dict):
     """
     This class inherits builtin dict and facilitate the access to structural keys
     mitigating issues with string references
+
+    The nested ThemeDict wrappers and the structural properties are computed once
+    and kept until the ThemeDict is modified through its own methods
     """
 
     FILL_SEQUENCE_KEY = "FILLING_ORDER"
@@ -61,6 +82,8 @@ class ThemeDict(dict):
     BITS_KW = "BIT_LENGTH"
 
     def __init__(self, mapping=None):
+        self._wrapped_items = {}
+        self._structure = {}
         mapping = {} if mapping is None else mapping
         self.inner_dict = mapping
         if isinstance(mapping, ThemeDict):
@@ -76,8 +99,12 @@ class ThemeDict(dict):
         Overloads __getitem__ from dict to return ThemeDict type when the returned item is a dict
         Work as dict.__getitem__ in all other ways
         """
+        if item in self._wrapped_items:
+            return self._wrapped_items[item]
         ret = dict.__getitem__(self, item)
-        ret = ThemeDict(ret) if isinstance(ret, dict) else ret
+        if isinstance(ret, dict):
+            ret = ThemeDict(ret)
+            self._wrapped_items[item] = ret
         return ret
 
     def __setitem__(self, key, value):
@@ -85,18 +112,28 @@ class ThemeDict(dict):
         Overloads __setitem__ from dict to set ThemeDict type when the set item is a dict
         Work as dict.__setitem__ in all other ways
         """
+        self._clear_memoized()
         (
             dict.__setitem__(self, key, ThemeDict(value))
             if isinstance(value, dict)
             else dict.__setitem__(self, key, value)
         )
 
+    def __delitem__(self, key):
+        self._clear_memoized()
+        dict.__delitem__(self, key)
+
+    def _clear_memoized(self):
+        """Forget the nested wrappers and structural properties computed so far"""
+        self._wrapped_items.clear()
+        self._structure.clear()
+
     def update(self, *args, **kwargs):
         """Overloads update from dict to call this class overloaded methods"""
         for k, v in ThemeDict(*args, **kwargs).items():
             self[k] = v
 
-    @property
+    @_memoized_property
     def filling_order(self) -> list[str]:
         """The list of words in restriction sequence to form a sentence"""
         filling_order = (
@@ -106,7 +143,7 @@ class ThemeDict(dict):
         )
         return filling_order
 
-    @property
+    @_memoized_property
     def natural_order(self) -> list[str]:
         """The list of words in natural speech to form a sentence"""
         natural_order = (
@@ -116,25 +153,25 @@ class ThemeDict(dict):
         )
         return natural_order
 
-    @property
+    @_memoized_property
     def leads(self) -> list:
         """The list of words led by this dictionary"""
         leads = self[self.LEADS_KW] if self.LEADS_KW in self.keys() else []
         return leads
 
-    @property
+    @_memoized_property
     def total_words(self) -> list:
         """The list of all words of this syntactic word"""
         total_words = self[self.TOTALS_KW] if self.TOTALS_KW in self.keys() else []
         return total_words
 
-    @property
+    @_memoized_property
     def image(self) -> list:
         """The list of all words led by current syntactic word"""
         image = self[self.IMAGE_KW] if self.IMAGE_KW in self.keys() else []
         return image
 
-    @property
+    @_memoized_property
     def mapping(self) -> "ThemeDict":
         """The list of all words led by this syntactic word"""
         mapping = (
@@ -144,13 +181,13 @@ class ThemeDict(dict):
         )
         return mapping
 
-    @property
+    @_memoized_property
     def bit_length(self) -> int:
         """The number of bits to map the words"""
         bit_length = self[self.BITS_KW] if self.BITS_KW in self.keys() else 0
         return bit_length
 
-    @property
+    @_memoized_property
     def led_by(self) -> str:
         """The word that leads this dictionary"""
         led_by = self[self.LED_KW] if self.LED_KW in self.keys() else ""
@@ -174,7 +211,7 @@ class ThemeDict(dict):
         led_by_mapping = self[syntactic_leads][led_by].mapping
         return led_by_mapping
 
-    @property
+    @_memoized_property
     def bits_per_phrase(self) -> int:
         """Bits mapped by each phrase in this theme"""
         bits_per_phrase = sum(
@@ -182,13 +219,13 @@ class ThemeDict(dict):
         )
         return bits_per_phrase
 
-    @property
+    @_memoized_property
     def bits_fill_sequence(self) -> list[int]:
         """The bit length of the word in the filling order"""
         bit_sequence = [self[each_word].bit_length for each_word in self.filling_order]
         return bit_sequence
 
-    @property
+    @_memoized_property
     def words_per_phrase(self) -> int:
         """Words mapping in each phrase in this theme"""
         words_per_phrase = len(self.filling_order)
@@ -197,7 +234,7 @@ class ThemeDict(dict):
             raise Exception(error_message)
         return words_per_phrase
 
-    @property
+    @_memoized_property
     def wordlist(self) -> list[str]:
         """All words used in the theme"""
         # Remove duplicates with list(dict.fromkeys(x)), concatenate all lists with itertools.chain.from_iterable(y)
@@ -212,7 +249,7 @@ class ThemeDict(dict):
         )
         return wordlist
 
-    @property
+    @_memoized_property
     def restriction_sequence(self) -> list[tuple[str, str]]:
         """The list of restrictions used in this theme"""
         restriction_sequence = [
@@ -236,22 +273,32 @@ class ThemeDict(dict):
         int
             The index of the word given in the natural speech of the sentence
         """
-        natural_index = self.natural_order.index(syntactic_word)
+        if syntactic_word not in self._natural_indexes:
+            raise ValueError("%r is not in the natural order" % syntactic_word)
+        natural_index = self._natural_indexes[syntactic_word]
         return natural_index
 
-    @property
+    @_memoized_property
+    def _natural_indexes(self) -> dict[str, int]:
+        """The index of each syntactic word in the natural order"""
+        natural_indexes = {}
+        for natural_index, syntactic_word in enumerate(self.natural_order):
+            natural_indexes.setdefault(syntactic_word, natural_index)
+        return natural_indexes
+
+    @_memoized_property
     def natural_map(self) -> list[int]:
         """The mapping of indexes of the natural order in the filling order"""
         natural_map = list(map(self.natural_index, self.filling_order))
         return natural_map
 
-    @property
+    @_memoized_property
     def filling_map(self) -> list[int]:
         """The mapping of indexes of the filling order in the natural order"""
         filling_map = list(map(self.fill_index, self.natural_order))
         return filling_map
 
-    @property
+    @_memoized_property
     def restriction_indexes(self) -> list[tuple[int, int]]:
         """The indexes of the restriction sequence of the sentence in natural speech"""
         leads_indexes = [
@@ -260,7 +307,7 @@ class ThemeDict(dict):
         ]
         return leads_indexes
 
-    @property
+    @_memoized_property
     def prime_syntactic_leads(self) -> list[str]:
         """Syntactic words which does not follow any other syntactic word"""
         prime_syntactic_leads = [
@@ -303,9 +350,19 @@ class ThemeDict(dict):
         int
             The index of the word given in the filling order
         """
-        fill_index = self.filling_order.index(syntactic_word)
+        if syntactic_word not in self._fill_indexes:
+            raise ValueError("%r is not in the filling order" % syntactic_word)
+        fill_index = self._fill_indexes[syntactic_word]
         return fill_index
 
+    @_memoized_property
+    def _fill_indexes(self) -> dict[str, int]:
+        """The index of each syntactic word in the filling order"""
+        fill_indexes = {}
+        for fill_index, syntactic_word in enumerate(self.filling_order):
+            fill_indexes.setdefault(syntactic_word, fill_index)
+        return fill_indexes
+
     def restriction_pairs(self, sentence: list[str]) -> list[tuple[str, str]]:
         """
             Find the pairs of restriction from a given sentence
@@ -591,6 +648,509 @@ class ThemeDict(dict):
         return sentences
 
 
+class BitReader:
+    """
+    Read unsigned integers of given bit lengths from a big-endian bit stream
+
+    A marker bit is kept above the stream, so the size of the underlying integer
+    does not depend on the leading zeroes of the data and the shifts and masks
+    take the same time whatever the data is
+    """
+
+    def __init__(self, value: int, bit_length: int):
+        self.bit_length = bit_length
+        self.remaining = bit_length
+        self._value = (1 << bit_length) | value
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BitReader":
+        """Read the bits of the given bytes"""
+        return cls(int.from_bytes(data, byteorder="big"), len(data) * 8)
+
+    def read(self, bit_length: int) -> int:
+        """
+            Read the next integer of the stream
+
+        Parameters
+        ----------
+        bit_length : int
+            The number of bits of the integer
+
+        Returns
+        -------
+        int
+            The integer made of the next bit_length bits of the stream
+        """
+        if bit_length > self.remaining:
+            error_message = "Cannot read %d bits, only %d remain"
+            raise ValueError(error_message % (bit_length, self.remaining))
+        self.remaining -= bit_length
+        return (self._value >> self.remaining) & ((1 << bit_length) - 1)
+
+
+class BitWriter:
+    """
+    Write unsigned integers of given bit lengths to a big-endian bit stream
+
+    As BitReader, it keeps a marker bit above the stream
+    """
+
+    def __init__(self):
+        self.bit_length = 0
+        self._value = 1
+
+    def write(self, value: int, bit_length: int) -> None:
+        """
+            Append an integer to the stream
+
+        Parameters
+        ----------
+        value : int
+            The integer to be written, lower than 2 ** bit_length
+        bit_length : int
+            The number of bits the integer takes in the stream
+        """
+        if value >> bit_length:
+            error_message = "The value does not fit in %d bits"
+            raise ValueError(error_message % bit_length)
+        self._value = (self._value << bit_length) | value
+        self.bit_length += bit_length
+
+    @property
+    def value(self) -> int:
+        """The integer made of the bits written so far"""
+        return self._value ^ (1 << self.bit_length)
+
+    def split(self, bit_length: int) -> tuple[int, int]:
+        """
+            Split the stream in its first and last bits
+
+        Parameters
+        ----------
+        bit_length : int
+            The number of bits of the last part
+
+        Returns
+        -------
+        tuple[int, int]
+            The integers made of the first bits and of the last bit_length bits
+        """
+        mask = (1 << bit_length) - 1
+        head = (self._value >> bit_length) ^ (1 << (self.bit_length - bit_length))
+        return head, self._value & mask
+
+
+THEMES_PATH = Path(__file__).parent.absolute() / Path("themes")
+INDEX_PATH = (
+    Path(os.environ.get("GREATWALL_CACHE_DIR", Path.home() / ".cache" / "greatwall"))
+    / "themes"
+)
+
+# Magic, format version, marshal version, interpreter cache tag, SHA256 of the
+# source JSON and SHA256 of the payload of a compiled index file
+INDEX_HEADER = struct.Struct(">4sHH16s32s32s")
+INDEX_MAGIC = b"GWTI"
+INDEX_VERSION = 2
+# NOTE: The marshal format is only stable for a version of an interpreter,
+# the indexes of another one are compiled again.
+INDEX_MARSHAL_VERSION = marshal.version
+INDEX_CACHE_TAG = (sys.implementation.cache_tag or "").encode()
+
+
+class ThemeIndex:
+    """
+    The compiled, read-only index of a theme
+
+    Besides the theme dictionary, it keeps the flat word lists in filling order,
+    the restriction mappings as indexes into the led word lists and the
+    filling and natural maps, so they are not derived from the dictionary again.
+    """
+
+    def __init__(self, theme: str, source_hash: bytes, payload: dict):
+        self.theme = theme
+        self.source_hash = source_hash
+        self.words_dictionary = ThemeDict(payload["dictionary"])
+
+        self.filling_order: tuple[str, ...] = payload["filling_order"]
+        self.natural_order: tuple[str, ...] = payload["natural_order"]
+        self.natural_map: tuple[int, ...] = payload["natural_map"]
+        self.filling_map: tuple[int, ...] = payload["filling_map"]
+        self.bits_fill_sequence: tuple[int, ...] = payload["bits_fill_sequence"]
+        self.bits_per_phrase: int = sum(self.bits_fill_sequence)
+        # Word lists of the syntactic words in filling order
+        self.words: tuple[tuple[str, ...], ...] = payload["words"]
+        # Filling index of the leading syntactic word, -1 when not led
+        self.led_by: tuple[int, ...] = payload["led_by"]
+        # Indexes into the word list of the led word, by index of leading word
+        self.mappings: tuple[Optional[tuple[tuple[int, ...], ...]], ...] = payload[
+            "mappings"
+        ]
+        self.wordlist: tuple[str, ...] = payload["wordlist"]
+
+        # The first index of each word, as list.index would find it
+        self.word_indexes: tuple[dict[str, int], ...] = tuple(
+            _first_indexes(words) for words in self.words
+        )
+        self.words_per_phrase: int = len(self.filling_order)
+        # Position in the led word list of each word index, built on first use
+        self._mapping_positions: dict[tuple[int, int], dict[int, int]] = {}
+
+    def _mapping_position(self, fill_index: int, leading_index: int, word_index: int):
+        key = (fill_index, leading_index)
+        if key not in self._mapping_positions:
+            self._mapping_positions[key] = _first_indexes(
+                self.mappings[fill_index][leading_index]
+            )
+        return self._mapping_positions[key].get(word_index)
+
+    def assemble_sentence(self, data_bits: BitReader) -> list[str]:
+        """
+            Build sentence using bits given following the dictionary filling order
+
+        Parameters
+        ----------
+        data_bits : BitReader
+            The information as bits from the entropy and checksum
+            Each step from it represents an index to the list of led words
+
+        Returns
+        -------
+        list[str]
+            The resulting words ordered of sentence in natural language
+        """
+        word_indexes = [0] * self.words_per_phrase
+        current_sentence = [""] * self.words_per_phrase
+        for fill_index, bit_length in enumerate(self.bits_fill_sequence):
+            # Index of current word within its list
+            list_index = data_bits.read(bit_length)
+
+            leading_index = self.led_by[fill_index]
+            if leading_index == -1:
+                word_index = list_index
+            else:
+                led_list = self.mappings[fill_index][word_indexes[leading_index]]
+                word_index = led_list[list_index]
+            word_indexes[fill_index] = word_index
+            natural_index = self.natural_map[fill_index]
+            current_sentence[natural_index] = self.words[fill_index][word_index]
+        return current_sentence
+
+    def get_sentences_from_bits(self, data_bits: BitReader) -> list[str]:
+        """
+            Get the mnemonic sentences in the natural speech order from given bits
+
+        Parameters
+        ----------
+        data_bits : BitReader
+            The bits of the entropy and checksum to get the sentences from
+        Returns
+        -------
+        list[str]
+            Return a list of words forming the sentences of the mnemonic
+        """
+        sentences = []
+        for _ in range(data_bits.remaining // self.bits_per_phrase):
+            sentences += self.assemble_sentence(data_bits)
+        return sentences
+
+    def get_bits_from_sentences(self, mnemonic: Union[str, list[str]]) -> BitWriter:
+        """
+            Get the bits of the entropy and checksum from the sentences of a mnemonic
+            The mnemonic must have complete sentences otherwise raises ValueError exception
+
+        Parameters
+        ----------
+        mnemonic : Union[str, list[str]]
+            The words to get the bits from, must have complete sentences
+        Returns
+        -------
+        BitWriter
+            The bits of the indexes of the words in their led lists
+        """
+        data_bits = BitWriter()
+        bit_lengths = itertools.cycle(self.bits_fill_sequence)
+        for list_index in self.get_phrase_indexes(mnemonic):
+            data_bits.write(list_index, next(bit_lengths))
+        return data_bits
+
+    def get_filling_indexes(self, sentence: Union[str, list]) -> list[int]:
+        """
+            Return the indexes of a sentence from the lists ordered as the filling order of this theme
+            The sentence can be given as a list or a string and must be a complete sentence
+             otherwise raises ValueError exception
+
+        Parameters
+        ----------
+        sentence : Union[str, list]
+            The words to be searched, must be a complete sentence
+
+        Returns
+        -------
+        list[int]
+            The list of indexes of the words in their led lists and ordered as the filling order
+        """
+        sentence = ThemeDict.normalize_mnemonic(sentence)
+        if len(sentence) != self.words_per_phrase:
+            error_message = "The number of words in sentence must be %d, but it is %d"
+            raise ValueError(error_message % (self.words_per_phrase, len(sentence)))
+
+        word_indexes = [0] * self.words_per_phrase
+        fill_indexes = [0] * self.words_per_phrase
+        for fill_index, natural_index in enumerate(self.natural_map):
+            word = sentence[natural_index]
+            word_index = self.word_indexes[fill_index].get(word)
+            if word_index is None:
+                raise ValueError("%r is not in the theme %s" % (word, self.theme))
+            leading_index = self.led_by[fill_index]
+            if leading_index == -1:
+                list_index = word_index
+            else:
+                list_index = self._mapping_position(
+                    fill_index, word_indexes[leading_index], word_index
+                )
+                if list_index is None:
+                    leading_word = sentence[self.natural_map[leading_index]]
+                    raise ValueError("%r is not led by %r" % (word, leading_word))
+            word_indexes[fill_index] = word_index
+            fill_indexes[fill_index] = list_index
+        return fill_indexes
+
+    def get_phrase_indexes(self, mnemonic: Union[str, list[str]]) -> list[int]:
+        """
+            Get the indexes of a given mnemonic from each sentence in it
+            The mnemonic can be given as a list or a string and must have complete sentences
+             otherwise raises ValueError exception
+
+        Parameters
+        ----------
+        mnemonic : Union[str, list[str]]
+            The words to be searched, must have complete sentences
+
+        Returns
+        -------
+        list[int]
+            The list of indexes of the words in this theme lists and ordered as the filling order
+        """
+        mnemonic = ThemeDict.normalize_mnemonic(mnemonic)
+        phrase_size = self.words_per_phrase
+        indexes = []
+        for sentence_index in range(0, len(mnemonic) - phrase_size + 1, phrase_size):
+            indexes += self.get_filling_indexes(
+                mnemonic[sentence_index : sentence_index + phrase_size]
+            )
+        return indexes
+
+    @staticmethod
+    def compile(theme_dict: dict) -> dict:
+        """
+            Compile the payload of the index from a theme dictionary
+
+        Parameters
+        ----------
+        theme_dict : dict
+            The theme dictionary as loaded from its JSON file
+
+        Returns
+        -------
+        dict
+            The payload of the index, made of builtin types only
+        """
+        # NOTE: Interning the words lets marshal store each word only once,
+        # which makes the index file several times faster to load.
+        theme_dict = _intern_words(theme_dict)
+        words_dictionary = ThemeDict(theme_dict)
+        filling_order = tuple(words_dictionary.filling_order)
+        words = tuple(
+            tuple(words_dictionary[each_word].total_words) for each_word in filling_order
+        )
+        word_indexes = [_first_indexes(each_words) for each_words in words]
+
+        led_by = []
+        mappings = []
+        for fill_index, syntactic_word in enumerate(filling_order):
+            leading_word = words_dictionary[syntactic_word].led_by
+            if leading_word == "NONE":
+                led_by.append(-1)
+                mappings.append(None)
+                continue
+            leading_index = filling_order.index(leading_word)
+            mapping = words_dictionary.get_lead_mapping(syntactic_word)
+            led_by.append(leading_index)
+            mappings.append(
+                tuple(
+                    tuple(
+                        word_indexes[fill_index][each_word]
+                        for each_word in mapping[leading_mnemonic_word]
+                    )
+                    if leading_mnemonic_word in mapping
+                    else ()
+                    for leading_mnemonic_word in words[leading_index]
+                )
+            )
+
+        return {
+            "dictionary": theme_dict,
+            "filling_order": filling_order,
+            "natural_order": tuple(words_dictionary.natural_order),
+            "natural_map": tuple(words_dictionary.natural_map),
+            "filling_map": tuple(words_dictionary.filling_map),
+            "bits_fill_sequence": tuple(words_dictionary.bits_fill_sequence),
+            "words": words,
+            "led_by": tuple(led_by),
+            "mappings": tuple(mappings),
+            "wordlist": tuple(
+                dict.fromkeys(
+                    itertools.chain.from_iterable(
+                        words_dictionary[each_word].total_words
+                        for each_word in filling_order
+                        if each_word in words_dictionary.keys()
+                    )
+                )
+            ),
+        }
+
+
+_loaded_indexes: dict[str, ThemeIndex] = {}
+_loaded_indexes_lock = threading.Lock()
+
+
+def theme_file(theme: str) -> Path:
+    """The path of the JSON file of a theme"""
+    return THEMES_PATH / Path("%s.json" % theme)
+
+
+def load_theme_index(theme: str) -> ThemeIndex:
+    """
+        Load the compiled index of a theme, once per process
+
+    The index is read from its compiled file, memory-mapped, unless the file is
+     missing or was compiled from another version of the theme JSON file, in
+     which case the index is compiled again and its file is rewritten
+
+    Parameters
+    ----------
+    theme : str
+        The name of the theme
+
+    Returns
+    -------
+    ThemeIndex
+        The index of the theme, shared by all its users in the process
+    """
+    with _loaded_indexes_lock:
+        if theme in _loaded_indexes:
+            return _loaded_indexes[theme]
+
+        source_file = theme_file(theme)
+        if not (Path.exists(source_file) and Path.is_file(source_file)):
+            raise FileNotFoundError("Theme file not found")
+        source = source_file.read_bytes()
+        source_hash = hashlib.sha256(source).digest()
+
+        index_file = INDEX_PATH / Path("%s.idx" % theme)
+        payload = _read_index_file(index_file, source_hash)
+        if payload is None:
+            payload = ThemeIndex.compile(json.loads(source))
+            _write_index_file(index_file, source_hash, payload)
+
+        theme_index = ThemeIndex(theme, source_hash, payload)
+        _loaded_indexes[theme] = theme_index
+        return theme_index
+
+
+_word_themes: dict[tuple[str, ...], dict[str, frozenset[str]]] = {}
+
+
+def load_word_themes(themes: list[str]) -> dict[str, frozenset[str]]:
+    """
+        Load the inverted index of the words of the given themes, once per process
+
+    Parameters
+    ----------
+    themes : list[str]
+        The names of the themes to be indexed
+
+    Returns
+    -------
+    dict[str, frozenset[str]]
+        The set of themes containing each word
+    """
+    themes_key = tuple(sorted(themes))
+    if themes_key not in _word_themes:
+        word_themes = {}
+        for each_theme in themes_key:
+            for word in load_theme_index(each_theme).wordlist:
+                word_themes.setdefault(word, set()).add(each_theme)
+        word_themes = {word: frozenset(themes) for word, themes in word_themes.items()}
+        with _loaded_indexes_lock:
+            _word_themes.setdefault(themes_key, word_themes)
+    return _word_themes[themes_key]
+
+
+def _first_indexes(words) -> dict[str, int]:
+    indexes = {}
+    for word_index, word in enumerate(words):
+        indexes.setdefault(word, word_index)
+    return indexes
+
+
+def _intern_words(value):
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [_intern_words(item) for item in value]
+    if isinstance(value, dict):
+        return {sys.intern(key): _intern_words(item) for key, item in value.items()}
+    return value
+
+
+def _read_index_file(index_file: Path, source_hash: bytes) -> Optional[dict]:
+    """Read a compiled index file, None when it is missing, stale or corrupted"""
+    try:
+        with open(index_file, "rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped:
+            *header, payload_hash = INDEX_HEADER.unpack_from(mapped)
+            header[3] = header[3].rstrip(b"\0")
+            if header != [
+                INDEX_MAGIC,
+                INDEX_VERSION,
+                INDEX_MARSHAL_VERSION,
+                INDEX_CACHE_TAG,
+                source_hash,
+            ]:
+                return None
+            with memoryview(mapped) as view, view[INDEX_HEADER.size :] as payload:
+                if hashlib.sha256(payload).digest() != payload_hash:
+                    return None
+                return marshal.loads(payload)
+    except (OSError, ValueError, EOFError, TypeError, struct.error):
+        return None
+
+
+def _write_index_file(index_file: Path, source_hash: bytes, payload: dict) -> None:
+    """Write a compiled index file, the index is still usable if this fails"""
+    try:
+        index_file.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = index_file.with_suffix(".%d.tmp" % os.getpid())
+        data = marshal.dumps(payload)
+        with open(temporary_file, "wb") as file:
+            file.write(
+                INDEX_HEADER.pack(
+                    INDEX_MAGIC,
+                    INDEX_VERSION,
+                    INDEX_MARSHAL_VERSION,
+                    INDEX_CACHE_TAG,
+                    source_hash,
+                    hashlib.sha256(data).digest(),
+                )
+            )
+            file.write(data)
+        os.replace(temporary_file, index_file)
+    except OSError:
+        pass
+
+
 # Refactored code segments from <https://github.com/keis/base58>
 def b58encode(v: bytes) -> str:
     alphabet = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
@@ -618,15 +1178,10 @@ class Mnemonic(object):
 
     def __init__(self, theme: str):
         self.base_theme = theme
-        theme_file = (
-            Path(__file__).parent.absolute() / Path("themes") / Path("%s.json" % theme)
-        )
-        if Path.exists(theme_file) and Path.is_file(theme_file):
-            with open(theme_file) as json_file:
-                self.words_dictionary = ThemeDict(json.load(json_file))
-        else:
-            raise FileNotFoundError("Theme file not found")
-        self.wordlist = self.words_dictionary.wordlist
+        # The index is shared by all the instances of the same theme
+        self.theme_index = load_theme_index(theme)
+        self.words_dictionary = self.theme_index.words_dictionary
+        self.wordlist = list(self.theme_index.wordlist)
         # Japanese must be joined by ideographic space
         self.delimiter = "\u3000" if theme == "BIP39_japanese" else " "
 
@@ -691,18 +1246,18 @@ class Mnemonic(object):
         if isinstance(code, list):
             code = " ".join(code)
         code = cls.normalize_string(code)
-        possible_themes = set(cls(each_theme) for each_theme in cls.find_themes())
+        themes = cls.find_themes()
+        word_themes = load_word_themes(themes)
+        possible_themes = frozenset(themes)
         for word in code.split():
-            possible_themes = set(
-                theme for theme in possible_themes if word in theme.wordlist
-            )
+            possible_themes &= word_themes.get(word, frozenset())
             if not possible_themes:
                 raise ThemeNotFound(f"Theme unrecognized for {word!r}")
         if len(possible_themes) == 1:
-            return possible_themes.pop().base_theme
+            return next(iter(possible_themes))
         else:
             raise ThemeAmbiguous(
-                f"Theme ambiguous between {', '.join( theme.base_theme for theme in possible_themes)}"
+                f"Theme ambiguous between {', '.join(possible_themes)}"
             )
 
     def generate(self, strength: int = 128) -> str:
@@ -781,9 +1336,7 @@ class Mnemonic(object):
         if not isinstance(words, list):
             words = words.split(" ")
         words_size = len(words)
-        words_dict = self.words_dictionary
-        phrase_amount = words_dict.get_phrase_amount(words)
-        phrase_size = words_dict.words_per_phrase
+        phrase_size = self.theme_index.words_per_phrase
         bits_per_checksum_bit = 33
         if words_size % phrase_size != 0:
             error_message = "The number of words must be a multiple of %d, but it is %d"
@@ -791,42 +1344,32 @@ class Mnemonic(object):
 
         # Look up all the words in the list and construct the
         # concatenation of the original entropy and the checksum.
+        concat_bits = self.theme_index.get_bits_from_sentences(words)
 
         # Determining strength of the password
-        number_phrases = words_size // words_dict.words_per_phrase
-        concat_len_bits = round(number_phrases * words_dict.bits_per_phrase)
-        checksum_length_bits = round(concat_len_bits // bits_per_checksum_bit)
-        entropy_length_bits = concat_len_bits - checksum_length_bits
-
-        idx = map(
-            lambda x, y: bin(x)[2:].zfill(y),
-            words_dict.get_phrase_indexes(words),
-            words_dict.bits_fill_sequence * phrase_amount,
-        )
-        concat_bits = [bit == "1" for bit in "".join(idx)]
+        checksum_length_bits = concat_bits.bit_length // bits_per_checksum_bit
+        entropy_length_bits = concat_bits.bit_length - checksum_length_bits
+        entropy_int, checksum = concat_bits.split(checksum_length_bits)
 
         # Extract original entropy as bytes.
-        entropy = bytearray(entropy_length_bits // 8)
-
-        # For every entropy byte
-        for entropy_idx in range(len(entropy)):
-            # For every entropy bit
-            for bit_idx in range(8):
-                # Run time performance is sacrificed to avoid side-channel attack
-                bit_int = 1 if concat_bits[(entropy_idx * 8) + bit_idx] else 0
-                entropy[entropy_idx] |= bit_int << (8 - 1 - bit_idx)
-        hash_bytes = hashlib.sha256(entropy).digest()
-        hash_bits = list(
-            itertools.chain.from_iterable(
-                [checksum_byte & (1 << (8 - 1 - bit_idx)) != 0 for bit_idx in range(8)]
-                for checksum_byte in hash_bytes
+        # NOTE: The bits are handled as whole integers, without branching on
+        # their values, to avoid side-channel attack.
+        entropy = bytearray(
+            (entropy_int >> (entropy_length_bits % 8)).to_bytes(
+                entropy_length_bits // 8, byteorder="big"
             )
         )
+        hash_bytes = hashlib.sha256(entropy).digest()
+        hash_checksum = int.from_bytes(hash_bytes, byteorder="big") >> (
+            256 - checksum_length_bits
+        )
 
         # Test checksum
-        valid = True
-        for bit_idx in range(checksum_length_bits):
-            valid &= concat_bits[entropy_length_bits + bit_idx] == hash_bits[bit_idx]
+        checksum_length_bytes = (checksum_length_bits + 7) // 8
+        valid = hmac.compare_digest(
+            checksum.to_bytes(checksum_length_bytes, byteorder="big"),
+            hash_checksum.to_bytes(checksum_length_bytes, byteorder="big"),
+        )
         if not valid:
             raise ValueError("Failed checksum.")
 
@@ -867,15 +1410,15 @@ class Mnemonic(object):
 
         hash_object = hashlib.sha256(data)
         hash_digest = hash_object.digest()
-        entropy_bits = bin(int.from_bytes(data, byteorder="big"))[2:].zfill(
-            len(data) * 8
+        # The entropy bits followed by the first bits of its hash as checksum
+        checksum_length_bits = len(data) * 8 // 32
+        data_bits = BitReader(
+            int.from_bytes(data + hash_digest, byteorder="big")
+            >> (256 - checksum_length_bits),
+            len(data) * 8 + checksum_length_bits,
         )
-        checksum_bits = bin(int.from_bytes(hash_digest, byteorder="big"))[2:].zfill(
-            256
-        )[: len(data) * 8 // 32]
-        data_bits = entropy_bits + checksum_bits
 
-        sentences = self.words_dictionary.get_sentences_from_bits(data_bits)
+        sentences = self.theme_index.get_sentences_from_bits(data_bits)
         mnemonic = self.delimiter.join(sentences)
         return mnemonic
 
@@ -926,24 +1469,11 @@ class Mnemonic(object):
             and len(mnemonic_list) not in [i for i in range(6, 49, 6)]
         ):
             return False
-        words_dict = self.words_dictionary
-        phrase_amount = words_dict.get_phrase_amount(mnemonic_list)
         try:
-            # Get the bits from the filling indexes with the size of word in sequence for phrases
-            idx = map(
-                lambda x, y: bin(x)[2:].zfill(y),
-                words_dict.get_phrase_indexes(mnemonic_list),
-                words_dict.bits_fill_sequence * phrase_amount,
-            )
-            b = "".join(idx)
+            self.to_entropy(mnemonic_list)
         except ValueError:
             return False
-        l = len(b)  # noqa: E741
-        d = b[: l // 33 * 32]
-        h = b[-l // 33 :]
-        nd = int(d, 2).to_bytes(l // 33 * 4, byteorder="big")
-        nh = bin(int(hashlib.sha256(nd).hexdigest(), 16))[2:].zfill(256)[: l // 33]
-        return h == nh
+        return True
 
     def expand_word(self, prefix: str) -> str:
         if prefix in self.wordlist:
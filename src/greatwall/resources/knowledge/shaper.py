@@ -1,13 +1,17 @@
 import math
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
 from PIL import Image, ImageDraw
 
 
 class Shaper:
-    def __init__(self, size: int = 101):
+    def __init__(self, size: int = 101, icons_dir: Optional[Path] = None):
         self.size = size
+        # The folder the shapes are saved in, the package one by default
+        if icons_dir is None:
+            icons_dir = Path(__file__).parent / "Icons"
+        self.icons_dir = icons_dir
 
         # Create a new image with a black background
         self.image = Image.new("RGB", (size, size), "black")
@@ -46,9 +50,7 @@ class Shaper:
         return self.save_image(sides)
 
     def save_image(self, name):
-        parent_path = Path(__file__).parent
-        icons_folder_name = f"Icons"
         filename = f"s{name}-polygon.png"
-        file_path = parent_path / Path(icons_folder_name) / Path(filename)
+        file_path = Path(self.icons_dir) / Path(filename)
         self.image.save(file_path, format="png")
         return file_path
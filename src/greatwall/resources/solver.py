@@ -0,0 +1,473 @@
+import http.server
+import json
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .batch import BatchJob
+from .greatwall import GreatWall
+from .helpers.checkpoint import TLPCheckpoint
+from .helpers.profiles import DEFAULT_TLP_PROFILE, TLP_PROFILES, get_tlp_profile
+from .helpers.scheduler import hash_scheduler
+
+SOLVER_PATH = (
+    Path(os.environ.get("GREATWALL_CACHE_DIR", Path.home() / ".cache" / "greatwall"))
+    / "solver"
+)
+
+# Statuses of a solver job
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class SolverBusyError(Exception):
+    """The solver has as many queued jobs as it takes."""
+
+
+class SolverJob:
+    """A time-lock puzzle outsourced to the solver, from SA1 to SA2."""
+
+    SA1_MAX_BYTES: int = 1024
+
+    def __init__(
+        self,
+        job_id: str,
+        sa1: Optional[bytes],
+        tlp_param: int,
+        tlp_profile: int = DEFAULT_TLP_PROFILE,
+        status: str = QUEUED,
+        sa2: Optional[bytes] = None,
+        error: Optional[str] = None,
+        submitted: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            job_id (str): The random identifier of the job, which is also
+                what gives access to its SA2.
+            sa1 (Optional[bytes]): The state the time-lock puzzle starts
+                from, None once the job is finished.
+            tlp_param (int): The number of iterations of the long hash.
+            tlp_profile (int): The version of the TLP profile of the long hash.
+            status (str): The status of the job, `QUEUED`, `RUNNING`, `DONE`
+                or `FAILED`.
+            sa2 (Optional[bytes]): The state the puzzle ends on, once done.
+            error (Optional[str]): Why the job failed, if it did.
+            submitted (Optional[float]): The time the job was submitted at,
+                now by default.
+        """
+        self.job_id: str = job_id
+        self.sa1: Optional[bytes] = sa1
+        self.tlp_param: int = tlp_param
+        self.tlp_profile: int = tlp_profile
+        self.status: str = status
+        self.sa2: Optional[bytes] = sa2
+        self.error: Optional[str] = error
+        self.submitted: float = time.time() if submitted is None else submitted
+        self.progress: dict = GreatWall._new_long_hash_progress(tlp_param, 0)
+
+    @classmethod
+    def from_dict(cls, job: dict) -> "SolverJob":
+        """Build a job from its saved JSON object."""
+        return cls(
+            job_id=job["id"],
+            sa1=None if job["sa1"] is None else bytes.fromhex(job["sa1"]),
+            tlp_param=job["tlp_param"],
+            tlp_profile=job["tlp_profile"],
+            status=job["status"],
+            sa2=None if job["sa2"] is None else bytes.fromhex(job["sa2"]),
+            error=job["error"],
+            submitted=job["submitted"],
+        )
+
+    def as_dict(self) -> dict:
+        """The JSON object the job is saved as."""
+        return {
+            "id": self.job_id,
+            "sa1": None if self.sa1 is None else self.sa1.hex(),
+            "tlp_param": self.tlp_param,
+            "tlp_profile": self.tlp_profile,
+            "status": self.status,
+            "sa2": None if self.sa2 is None else self.sa2.hex(),
+            "error": self.error,
+            "submitted": self.submitted,
+        }
+
+    def info(self) -> dict:
+        """The status, progress and, once done, SA2 of the job, without SA1."""
+        return {
+            "id": self.job_id,
+            "status": self.status,
+            "tlp_param": self.tlp_param,
+            "tlp_profile": self.tlp_profile,
+            "iterations_done": self.progress["iterations_done"],
+            "iterations": self.progress["iterations"],
+            "remaining": self.progress["remaining"],
+            "sa2": None if self.sa2 is None else self.sa2.hex(),
+            "error": self.error,
+        }
+
+    @property
+    def memory_bytes(self) -> int:
+        """The memory the time-lock puzzle of the job takes."""
+        return get_tlp_profile(self.tlp_profile).memory_bytes
+
+    def validate(self) -> None:
+        if not 0 < len(self.sa1) <= self.SA1_MAX_BYTES:
+            raise ValueError(f"The sa1 must be 1 to {self.SA1_MAX_BYTES} bytes.")
+        value_range = BatchJob.TLP_PARAM_RANGE
+        # NOTE: A bool is an int, true would be taken as 1.
+        if (
+            isinstance(self.tlp_param, bool)
+            or not isinstance(self.tlp_param, int)
+            or self.tlp_param not in value_range
+        ):
+            raise ValueError(
+                f"The tlp_param must be an integer from {value_range.start} "
+                f"to {value_range.stop - 1}."
+            )
+        if (
+            isinstance(self.tlp_profile, bool)
+            or not isinstance(self.tlp_profile, int)
+            or self.tlp_profile not in TLP_PROFILES
+        ):
+            raise ValueError(
+                f"The tlp_profile must be one of {', '.join(map(str, TLP_PROFILES))}."
+            )
+
+
+class TLPSolver:
+    """A persistent queue of time-lock puzzles solved in background threads.
+
+    The jobs are saved in the state directory as soon as they are submitted
+    and checkpointed while they run, so a restarted solver resumes the jobs
+    it had. The jobs are started in the order they were submitted while the
+    memory their TLP profile takes fits in the budget, a job taking more
+    than the whole budget is run alone. A finished job is kept until it is
+    deleted, which its client does once it got SA2.
+
+    WARNING: The state directory holds the SA1 and SA2 of the jobs, and who
+    has them and SA0 skips the time-lock puzzle, so it should only be kept
+    on a trusted machine. The directory and the files of the jobs are only
+    accessible by their owner, and SA1 is forgotten once a job is finished.
+    """
+
+    CHECKPOINT_INTERVAL: int = 1
+    MAX_QUEUED_JOBS: int = 64
+
+    def __init__(
+        self,
+        memory_budget: int,
+        max_workers: Optional[int] = None,
+        state_dir: Optional[Path] = None,
+        max_queued_jobs: int = MAX_QUEUED_JOBS,
+    ) -> None:
+        """
+        Args:
+            memory_budget (int): The memory the running jobs can take, in bytes.
+            max_workers (Optional[int]): The number of jobs run at the same
+                time at most, by default the number of CPUs.
+            state_dir (Optional[Path]): The directory of the saved jobs and
+                their checkpoints, by default `SOLVER_PATH`.
+            max_queued_jobs (int): The number of jobs waiting to run at most,
+                beyond which new jobs are refused.
+        """
+        self.memory_budget: int = memory_budget
+        self.max_queued_jobs: int = max_queued_jobs
+        self.max_workers: int = max_workers or os.cpu_count() or 1
+        self.state_dir: Path = SOLVER_PATH if state_dir is None else Path(state_dir)
+        self.jobs_dir: Path = self.state_dir / "jobs"
+        self.checkpoint_dir: Path = self.state_dir / "checkpoints"
+
+        self._jobs: dict[str, SolverJob] = {}
+        self._running: dict[str, GreatWall] = {}
+        self._reserved_bytes: int = 0
+        self._condition = threading.Condition()
+        self._is_stopped: bool = True
+        self._thread: Optional[threading.Thread] = None
+        self._load_jobs()
+
+    def _load_jobs(self) -> None:
+        try:
+            job_files = sorted(self.jobs_dir.glob("*.json"))
+        except OSError:
+            return
+        jobs = []
+        for job_file in job_files:
+            try:
+                job = SolverJob.from_dict(json.loads(job_file.read_text()))
+            except (OSError, ValueError, KeyError):
+                continue
+            jobs.append(job)
+        for job in sorted(jobs, key=lambda job: job.submitted):
+            self._jobs[job.job_id] = job
+
+    def _save_job(self, job: SolverJob) -> None:
+        self.state_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.jobs_dir.mkdir(mode=0o700, exist_ok=True)
+        job_file = self.jobs_dir / f"{job.job_id}.json"
+        # NOTE: The temporary file is created only readable by its owner.
+        descriptor, temporary_file = tempfile.mkstemp(suffix=".tmp", dir=self.jobs_dir)
+        try:
+            with os.fdopen(descriptor, "w") as file:
+                file.write(json.dumps(job.as_dict()))
+            os.replace(temporary_file, job_file)
+        except OSError:
+            os.unlink(temporary_file)
+            raise
+
+    def _remove_checkpoint(self, job: SolverJob) -> None:
+        # NOTE: The jobs of the same puzzle share their checkpoint.
+        if job.sa1 is None or any(
+            other_job.sa1 == job.sa1 and other_job.tlp_profile == job.tlp_profile
+            for other_job in self._jobs.values()
+            if other_job is not job
+        ):
+            return
+        TLPCheckpoint(job.sa1, self.checkpoint_dir, job.tlp_profile).remove()
+
+    def _remove_job(self, job: SolverJob) -> None:
+        try:
+            (self.jobs_dir / f"{job.job_id}.json").unlink()
+        except FileNotFoundError:
+            pass
+        self._remove_checkpoint(job)
+
+    def start(self) -> None:
+        """Start running the queued jobs in the background."""
+        with self._condition:
+            if not self._is_stopped:
+                return
+            self._is_stopped = False
+        self._thread = threading.Thread(target=self._schedule, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the solver, the running jobs are resumed when it restarts."""
+        with self._condition:
+            self._is_stopped = True
+            for greatwall in self._running.values():
+                greatwall.cancel_execution()
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(
+        self, sa1: bytes, tlp_param: int, tlp_profile: int = DEFAULT_TLP_PROFILE
+    ) -> SolverJob:
+        """Queue the time-lock puzzle of SA1.
+
+        Raises:
+            ValueError: If the parameters of the job are not valid.
+            SolverBusyError: If `max_queued_jobs` jobs are already queued.
+        """
+        job = SolverJob(secrets.token_hex(16), sa1, tlp_param, tlp_profile)
+        job.validate()
+        with self._condition:
+            queued_jobs = sum(
+                queued_job.status == QUEUED for queued_job in self._jobs.values()
+            )
+            if queued_jobs >= self.max_queued_jobs:
+                raise SolverBusyError(
+                    f"The solver has {queued_jobs} queued jobs, try again later."
+                )
+            self._save_job(job)
+            self._jobs[job.job_id] = job
+            self._condition.notify_all()
+        return job
+
+    def get(self, job_id: str) -> Optional[SolverJob]:
+        """The job of the identifier, None if there is none."""
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def delete(self, job_id: str) -> bool:
+        """Delete the job, canceling it if it is running.
+
+        Returns:
+            Whether there was a job of the identifier.
+        """
+        with self._condition:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return False
+            if job_id in self._running:
+                self._running[job_id].cancel_execution()
+            self._remove_job(job)
+            return True
+
+    def info(self) -> dict:
+        """The number of jobs by status and the memory the running ones take.
+
+        The queue depth and wait times of the process-wide hash scheduler
+        are given as `scheduler`.
+        """
+        with self._condition:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                "queued": statuses.count(QUEUED),
+                "running": statuses.count(RUNNING),
+                "done": statuses.count(DONE),
+                "failed": statuses.count(FAILED),
+                "reserved_bytes": self._reserved_bytes,
+                "memory_budget": self.memory_budget,
+                "scheduler": hash_scheduler.info(),
+            }
+
+    def _next_job(self) -> Optional[SolverJob]:
+        for job in self._jobs.values():
+            if job.status != QUEUED:
+                continue
+            if self._running and (
+                len(self._running) >= self.max_workers
+                or self._reserved_bytes + job.memory_bytes > self.memory_budget
+            ):
+                return None
+            return job
+        return None
+
+    def _schedule(self) -> None:
+        with self._condition:
+            while not self._is_stopped:
+                job = self._next_job()
+                if job is None:
+                    self._condition.wait()
+                    continue
+                greatwall = GreatWall()
+                greatwall.set_prefetch_budget(0)
+                greatwall.set_checkpointing(
+                    self.CHECKPOINT_INTERVAL, self.checkpoint_dir
+                )
+                job.status = RUNNING
+                self._running[job.job_id] = greatwall
+                self._reserved_bytes += job.memory_bytes
+                threading.Thread(
+                    target=self._run_job, args=(job, greatwall), daemon=True
+                ).start()
+
+    def _run_job(self, job: SolverJob, greatwall: GreatWall) -> None:
+        def record_progress(event):
+            job.progress = greatwall.long_hash_progress()
+
+        greatwall.add_progress_listener(record_progress)
+        sa2 = None
+        error = None
+        try:
+            greatwall.set_tlp_param(job.tlp_param)
+            greatwall.set_tlp_profile(job.tlp_profile)
+            greatwall.state = job.sa1
+            greatwall.update_with_long_hash()
+            sa2 = greatwall.state
+        # NOTE: A failed job must not stop the solver.
+        except Exception as error_raised:
+            error = str(error_raised)
+
+        with self._condition:
+            del self._running[job.job_id]
+            self._reserved_bytes -= job.memory_bytes
+            if job.job_id not in self._jobs:
+                # NOTE: The job was deleted while running, the checkpoint saved
+                # on its cancel goes with it.
+                self._remove_job(job)
+            elif greatwall.is_canceled:
+                # NOTE: The solver was stopped, the job resumes from its
+                # checkpoint when it starts again.
+                job.status = QUEUED
+            else:
+                if error is not None:
+                    job.status = FAILED
+                    job.error = error
+                else:
+                    job.status = DONE
+                    job.sa2 = sa2
+                # NOTE: SA1 is of no more use, the checkpoint neither.
+                self._remove_checkpoint(job)
+                job.sa1 = None
+                self._save_job(job)
+            self._condition.notify_all()
+
+
+class SolverRequestHandler(http.server.BaseHTTPRequestHandler):
+    """The JSON API of the solver.
+
+    `POST /jobs` with the hexadecimal `sa1`, the `tlp_param` and optionally
+    the `tlp_profile` queues a job, `GET /jobs/<id>` gives its status and
+    progress, and its `sa2` once done, and `DELETE /jobs/<id>` deletes it.
+    `GET /status` gives the number of jobs by status and the metrics of the
+    hash scheduler.
+    """
+
+    MAX_BODY_BYTES: int = 64 * 1024
+
+    server: "SolverServer"
+
+    def _send_json(self, status: int, body: Optional[dict] = None) -> None:
+        data = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _job_id(self) -> Optional[str]:
+        match = re.fullmatch(r"/jobs/([0-9a-f]{32})", self.path)
+        return None if match is None else match.group(1)
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            return self._send_json(404, {"error": "Not found."})
+        # NOTE: A web page can only send a simple POST without a preflight
+        # request with a form or plain text content type.
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type.lower() != "application/json":
+            return self._send_json(415, {"error": "The body must be JSON."})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if not 0 < length <= self.MAX_BODY_BYTES:
+                raise ValueError("The body must be a JSON object.")
+            body = json.loads(self.rfile.read(length))
+            if not isinstance(body, dict):
+                raise ValueError("The body must be a JSON object.")
+            if not isinstance(body.get("sa1"), str):
+                raise ValueError("The sa1 must be hexadecimal.")
+            job = self.server.solver.submit(
+                bytes.fromhex(body["sa1"]),
+                body.get("tlp_param"),
+                body.get("tlp_profile", DEFAULT_TLP_PROFILE),
+            )
+        except ValueError as error:
+            return self._send_json(400, {"error": str(error)})
+        except SolverBusyError as error:
+            return self._send_json(429, {"error": str(error)})
+        self._send_json(202, job.info())
+
+    def do_GET(self):
+        if self.path == "/status":
+            return self._send_json(200, self.server.solver.info())
+        job_id = self._job_id()
+        job = None if job_id is None else self.server.solver.get(job_id)
+        if job is None:
+            return self._send_json(404, {"error": "There is no such job."})
+        self._send_json(200, job.info())
+
+    def do_DELETE(self):
+        job_id = self._job_id()
+        if job_id is None or not self.server.solver.delete(job_id):
+            return self._send_json(404, {"error": "There is no such job."})
+        self._send_json(204)
+
+
+class SolverServer(http.server.ThreadingHTTPServer):
+    """The HTTP server of a solver, meant to listen on localhost only."""
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], solver: TLPSolver) -> None:
+        super().__init__(address, SolverRequestHandler)
+        self.solver: TLPSolver = solver
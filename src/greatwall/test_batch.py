@@ -0,0 +1,96 @@
+import io
+import time
+import unittest
+from unittest import mock
+
+from resources.batch import BatchJob, read_jobs, run_batch
+from resources.greatwall import GreatWall
+from resources.knowledge.mnemonic.mnemonic import Mnemonic
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.sa0 = Mnemonic("BIP39").to_mnemonic(bytes(range(16)))
+
+    def job(self, job_id, path, **kwargs) -> dict:
+        job = {
+            "id": job_id,
+            "sa0": self.sa0,
+            "tlp_param": 0,
+            "depth": len(path),
+            "arity": 3,
+            "path": path,
+        }
+        job.update(kwargs)
+        return job
+
+    def test_results_match_headless_derivation(self):
+        greatwall = GreatWall()
+        greatwall.set_themed_mnemo("BIP39")
+        greatwall.set_depth(2)
+        greatwall.set_arity(3)
+        greatwall.set_tlp_param(0)
+        greatwall.set_sa0(self.sa0)
+        expected_ka = greatwall.derive_key([3, 2]).hex()
+
+        results = list(
+            run_batch(
+                [self.job("a", [3, 2]), self.job("b", [3, 2], tacit_knowledge="Shape")],
+                memory_budget=1024**3,
+                max_workers=2,
+            )
+        )
+
+        self.assertEqual({"a", "b"}, {result["id"] for result in results})
+        self.assertEqual([expected_ka] * 2, [result["ka"] for result in results])
+
+    def test_invalid_jobs_are_reported(self):
+        lines = io.StringIO(
+            "not json\n\n"
+            + '{"id": "missing"}\n'
+            + '{"id": "path", "sa0": "", "tlp_param": 0, "depth": 2, "arity": 3, '
+            + '"path": [1, 4]}\n'
+            + '{"id": "profile", "sa0": "", "tlp_param": 0, "depth": 1, "arity": 3, '
+            + '"path": [1], "tlp_profile": 0}\n'
+        )
+
+        results = list(run_batch(read_jobs(lines), memory_budget=1024**3))
+
+        self.assertEqual(
+            [1, "missing", "path", "profile"], [result["id"] for result in results]
+        )
+        self.assertTrue(all("error" in result for result in results))
+        self.assertNotIn("not json", results[0]["error"])
+
+    def test_bool_values_are_not_integers(self):
+        for job in [
+            self.job("path", [True, 3]),
+            self.job("tlp_param", [1], tlp_param=True),
+            self.job("tlp_profile", [1], tlp_profile=True),
+        ]:
+            with self.assertRaises(ValueError):
+                BatchJob.from_dict(job)
+
+    def test_memory_budget_bounds_running_jobs(self):
+        running = []
+        max_running = []
+
+        def run(job, checkpoint_interval=0, tlp_solver=None):
+            running.append(job)
+            max_running.append(len(running))
+            time.sleep(0.05)
+            running.remove(job)
+            return bytes(1)
+
+        jobs = [BatchJob.from_dict(self.job(i, [1], tlp_param=1)) for i in range(6)]
+        with mock.patch.object(BatchJob, "run", autospec=True, side_effect=run):
+            results = list(
+                run_batch(jobs, memory_budget=2 * jobs[0].memory_bytes, max_workers=4)
+            )
+
+        self.assertEqual(6, len(results))
+        self.assertEqual(2, max(max_running))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import contextlib
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from benchmark import BENCHMARKS, Benchmark, compare_results, run_benchmarks
+from resources.knowledge.mnemonic import mnemonic
+
+module_patches = contextlib.ExitStack()
+
+
+def setUpModule():
+    # NOTE: The compiled indexes go to a temporary directory, not the cache of
+    # the user.
+    index_dir = module_patches.enter_context(tempfile.TemporaryDirectory())
+    module_patches.enter_context(
+        mock.patch.object(mnemonic, "INDEX_PATH", Path(index_dir))
+    )
+    module_patches.enter_context(mock.patch.dict(mnemonic._loaded_indexes, clear=True))
+
+
+def tearDownModule():
+    module_patches.close()
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run(self):
+        calls = []
+        benchmark = Benchmark(
+            "test", lambda: lambda: calls.append(None), repeats=3, number=20
+        )
+        result = benchmark.run()
+        self.assertEqual(60, len(calls))
+        self.assertEqual((3, 20), (result["repeats"], result["number"]))
+        self.assertLessEqual(result["min"], result["median"])
+        self.assertLessEqual(result["median"], result["max"])
+        result = benchmark.run(quick=True)
+        self.assertEqual((1, 2), (result["repeats"], result["number"]))
+
+    def test_run_tears_down_each_repeat(self):
+        torn_down = []
+        benchmark = Benchmark(
+            "test", lambda: time.perf_counter, repeats=3, teardown=torn_down.append
+        )
+        benchmark.run()
+        self.assertEqual([time.perf_counter] * 3, torn_down)
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks("mnemonic/to_", quick=True)
+        self.assertEqual(
+            {"mnemonic/to_mnemonic", "mnemonic/to_entropy"},
+            set(results["results"]),
+        )
+        self.assertIn("machine", results)
+        self.assertEqual(
+            len(BENCHMARKS), len({benchmark.name for benchmark in BENCHMARKS})
+        )
+
+    def test_compare_results(self):
+        baseline = {"results": {"a": {"median": 1.0}, "b": {"median": 1.0}}}
+        results = {
+            "results": {
+                "a": {"median": 1.2},
+                "b": {"median": 1.5},
+                "c": {"median": 9.0},
+            }
+        }
+        comparisons, regressions = compare_results(results, baseline, 0.25)
+        self.assertEqual(["a", "b"], [comparison["name"] for comparison in comparisons])
+        self.assertAlmostEqual(1.5, comparisons[1]["ratio"])
+        self.assertEqual(["b"], regressions)
+
+
+if __name__ == "__main__":
+    unittest.main()
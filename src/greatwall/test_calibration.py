@@ -0,0 +1,73 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from resources.calibration import (
+    TLP_PARAM_MAX,
+    calibrate_tlp,
+    load_calibrations,
+    parse_duration,
+    recommend_tlp_param,
+    save_calibration,
+)
+from resources.greatwall import GreatWall
+
+
+class TestCalibration(unittest.TestCase):
+    def test_parse_duration(self):
+        self.assertEqual(8 * 3600, parse_duration("8 hours"))
+        self.assertEqual(5400, parse_duration("1h30m"))
+        self.assertEqual(90, parse_duration("90"))
+        self.assertEqual(1.5 * 86400, parse_duration("1.5 days"))
+        self.assertEqual(0.03, parse_duration("30ms"))
+        self.assertEqual(120, parse_duration("2 mins"))
+        self.assertEqual(2, parse_duration("2 secs"))
+        for duration in [
+            "8 hours later",
+            "5 parsecs",
+            "",
+            "30 hs",
+            "30 mss",
+            "nan",
+            "inf",
+            "-5",
+            "0 h",
+        ]:
+            with self.assertRaises(ValueError):
+                parse_duration(duration)
+
+    def test_calibration_needs_iterations(self):
+        with self.assertRaises(ValueError):
+            calibrate_tlp(0)
+        greatwall = GreatWall()
+        greatwall.LONG_HASH_MEMORY_COST = 64
+        greatwall.cancel_execution()
+        with self.assertRaises(RuntimeError):
+            calibrate_tlp(2, greatwall=greatwall)
+
+    def test_recommend_tlp_param(self):
+        self.assertEqual(1440, recommend_tlp_param(20.0, 8 * 3600))
+        self.assertEqual(TLP_PARAM_MAX, recommend_tlp_param(1.0, 8 * 3600))
+        self.assertEqual(1, recommend_tlp_param(10.0, 1))
+
+    def test_calibration_is_saved(self):
+        greatwall = GreatWall()
+        greatwall.LONG_HASH_MEMORY_COST = 64
+        calibrations_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(calibrations_dir.cleanup)
+        calibrations_path = Path(calibrations_dir.name) / "calibration.jsonl"
+
+        calibration = calibrate_tlp(3, 60.0, greatwall=greatwall)
+        save_calibration(calibration, calibrations_path)
+        save_calibration(calibration, calibrations_path)
+
+        self.assertEqual(3, calibration["iterations"])
+        self.assertEqual(
+            recommend_tlp_param(calibration["seconds_per_iteration"], 60.0),
+            calibration["recommended_tlp_param"],
+        )
+        self.assertEqual([calibration] * 2, load_calibrations(calibrations_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
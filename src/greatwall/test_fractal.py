@@ -0,0 +1,121 @@
+import math
+import unittest
+
+import numpy as np
+
+from resources.helpers import constants
+from resources.knowledge.fractal import Fractal
+
+
+def scalar_escape_time(func_type, x_min, x_max, y_min, y_max, real_p, imag_p,
+                       width, height, escape_radius=4, max_iters=30):
+    """The reference pixel by pixel implementation of the fractal sets."""
+    x = np.linspace(x_min, x_max, width)
+    y = np.linspace(y_min, y_max, height)
+
+    pixels = np.zeros((height, width))
+    for i in range(height):
+        for j in range(width):
+            c = x[j] + y[i] * 1j
+            z = c
+            for escape_count in range(max_iters):
+                if abs(z) > escape_radius:
+                    smooth_value = (
+                        escape_count + 1 - math.log(math.log(abs(z))) / math.log(2)
+                    )
+                    pixels[i, j] = max(0.0, min(smooth_value / max_iters, 1.0))
+                    break
+                if func_type == constants.BURNING_SHIP:
+                    z = (abs(z.real) + (1j * abs(z.imag))) ** complex(real_p, imag_p) + c
+                else:
+                    z = z ** complex(real_p, imag_p) + c
+            else:
+                pixels[i, j] = 1
+    return pixels
+
+
+class TestFractal(unittest.TestCase):
+    def setUp(self):
+        self.fractal = Fractal()
+
+    def assert_same_pixels(self, func_type, bounds, real_p, imag_p):
+        width, height = 48, 40
+        pixels = self.fractal.update(
+            func_type=func_type,
+            real_p=real_p,
+            imag_p=imag_p,
+            width=width,
+            height=height,
+        )
+        expected = scalar_escape_time(
+            func_type, *bounds, real_p, imag_p, width, height
+        )
+        self.assertEqual((height, width), pixels.shape)
+        self.assertEqual(expected.tobytes(), pixels.tobytes())
+
+    def test_mandelbrot_matches_scalar_engine(self):
+        for real_p, imag_p in [(2.0, 0.0), (2.5371, 0.123), (2.9182736, 0.9921)]:
+            self.assert_same_pixels(
+                constants.MANDELBROT, (-2.2, 1, -1.2, 1.2), real_p, imag_p
+            )
+
+    def test_burningship_matches_scalar_engine(self):
+        for real_p, imag_p in [(2.0, 0.0), (2.5371, 0.123), (2.9182736, 0.9921)]:
+            self.assert_same_pixels(
+                constants.BURNING_SHIP, (-2.5, 2.0, -2, 0.8), real_p, imag_p
+            )
+
+    def test_mandelbrot_interior_bailout_matches_scalar_engine(self):
+        width, height, max_iters = 40, 32, 100
+        for bounds in [
+            (-2.2, 1, -1.2, 1.2),
+            (0.2, 0.3, -0.05, 0.05),
+            (-0.8, -0.7, 0, 0.1),
+        ]:
+            pixels = self.fractal.update(
+                constants.MANDELBROT,
+                *bounds,
+                real_p=2.0,
+                imag_p=0.0,
+                width=width,
+                height=height,
+                max_iters=max_iters,
+            )
+            expected = scalar_escape_time(
+                constants.MANDELBROT, *bounds, 2.0, 0.0, width, height,
+                max_iters=max_iters,
+            )
+            self.assertEqual(expected.tobytes(), pixels.tobytes())
+
+        c = np.array([0, -1, 0.24, 0.26, -0.5 + 0.5j, -1.3, 1j])
+        self.assertEqual(
+            [True, True, True, False, True, False, False],
+            Fractal._mandelbrot_interior(c).tolist(),
+        )
+
+    def test_supersampling_averages_samples_of_each_pixel(self):
+        pixels = self.fractal.update(
+            func_type=constants.BURNING_SHIP,
+            real_p=2.5371,
+            imag_p=0.123,
+            width=24,
+            height=20,
+            supersampling=2,
+        )
+        samples = Fractal().update(
+            func_type=constants.BURNING_SHIP,
+            real_p=2.5371,
+            imag_p=0.123,
+            width=48,
+            height=40,
+        )
+        self.assertEqual((20, 24), pixels.shape)
+        np.testing.assert_allclose(
+            samples.reshape(20, 2, 24, 2).mean(axis=(1, 3)), pixels
+        )
+        with self.assertRaises(ValueError):
+            self.fractal.update(func_type=constants.BURNING_SHIP, supersampling=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,363 @@
+import multiprocessing
+import random
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from argon2 import low_level
+
+from resources.greatwall import GreatWall
+from resources.helpers import constants
+from resources.helpers.checkpoint import TLPCheckpoint
+from resources.helpers.progress import LEVEL, SA0_TO_SA1, SA1_TO_SA2, SA2_TO_SA3
+from resources.helpers.scheduler import LONG_HASH, HashScheduler
+from resources.knowledge.fractal import render_fractal
+
+
+class TestGreatWall(unittest.TestCase):
+    def setUp(self):
+        self.greatwall = GreatWall()
+        self.greatwall.set_themed_mnemo("BIP39")
+        self.greatwall.set_depth(2)
+        self.greatwall.set_arity(3)
+        self.greatwall.state = bytes(range(128))
+        self.greatwall._saved_states[self.greatwall._derivation_path] = (
+            self.greatwall.state
+        )
+
+    def derive(self, greatwall: GreatWall, choices: list[int]) -> list:
+        random.seed(0)
+        outputs = []
+        for choice in choices:
+            outputs.append(greatwall.get_li_str_query())
+            greatwall._prefetcher.join()
+            greatwall.derive_from_user_choice(choice)
+        outputs.append(greatwall.state)
+        return outputs
+
+    def test_prefetched_derivation_matches_direct_derivation(self):
+        expected_greatwall = GreatWall()
+        expected_greatwall.set_themed_mnemo("BIP39")
+        expected_greatwall.set_depth(2)
+        expected_greatwall.set_arity(3)
+        expected_greatwall.set_prefetch_budget(0)
+        expected_greatwall.state = self.greatwall.state
+        expected_greatwall._saved_states[
+            expected_greatwall._derivation_path
+        ] = expected_greatwall.state
+
+        self.assertEqual(
+            self.derive(expected_greatwall, [2, 1]),
+            self.derive(self.greatwall, [2, 1]),
+        )
+
+    def test_derive_key_matches_user_choices(self):
+        mnemonic = self.greatwall.mnemo.to_mnemonic(bytes(range(16)))
+        self.greatwall.set_tlp_param(0)
+        self.greatwall.set_sa0(mnemonic)
+        self.greatwall.init_state_hashes()
+        natural_path = []
+        for choice in [3, 1]:
+            self.greatwall._shuffle_arity_indxes()
+            natural_path.append(self.greatwall.shuffled_arity_indxes[choice - 1] + 1)
+            self.greatwall.derive_from_user_choice(choice)
+
+        headless_greatwall = GreatWall()
+        headless_greatwall.set_themed_mnemo("BIP39")
+        headless_greatwall.set_depth(2)
+        headless_greatwall.set_arity(3)
+        headless_greatwall.set_tlp_param(0)
+        headless_greatwall.set_sa0(mnemonic)
+
+        self.assertEqual(
+            self.greatwall.state, headless_greatwall.derive_key(natural_path)
+        )
+        with self.assertRaises(ValueError):
+            headless_greatwall.derive_key([1, 4])
+
+    def test_fractal_query_previews_options_to_refine(self):
+        self.greatwall.set_rendering_workers(1)
+        self.greatwall.set_prefetch_budget(0)
+        self.assertEqual([], self.greatwall.get_fractal_query_params())
+
+        previews = self.greatwall.get_fractal_query()[1:]
+        fractals_params = self.greatwall.get_fractal_query_params()
+        self.assertEqual(3, len(fractals_params))
+        size = GreatWall.FRACTAL_PREVIEW_SIZE
+        for preview, fractal_params in zip(previews, fractals_params):
+            self.assertEqual((size, size), preview.shape)
+            self.assertEqual(
+                render_fractal(*fractal_params, size, size).tobytes(),
+                preview.tobytes(),
+            )
+
+    def test_saved_fractal_previews_match_rendered_ones(self):
+        self.greatwall.set_rendering_workers(1)
+        self.greatwall.set_prefetch_budget(0)
+        self.greatwall.set_fractal_preview_size(16, supersampling=2)
+        random.seed(0)
+        previews = self.greatwall.get_fractal_query()
+
+        self.greatwall.set_fractal_preview_size(24)
+        self.assertEqual((24, 24), self.greatwall.get_fractal_query()[1].shape)
+        self.greatwall.set_fractal_preview_size(16, supersampling=2)
+        saved_previews = self.greatwall.get_fractal_query()
+
+        for preview, saved_preview, fractal_params in zip(
+            previews[1:],
+            saved_previews[1:],
+            self.greatwall.get_fractal_query_params(),
+        ):
+            self.assertEqual(preview.tobytes(), saved_preview.tobytes())
+            self.assertEqual(
+                render_fractal(*fractal_params, 16, 16, 2).tobytes(),
+                preview.tobytes(),
+            )
+
+
+class TestLongHashCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.checkpoint_dir = tempfile.TemporaryDirectory()
+        self.checkpoint_path = Path(self.checkpoint_dir.name)
+        self.sa1 = bytes(range(128))
+        self.expected_state = self.long_hash(GreatWall())
+
+    def tearDown(self):
+        self.checkpoint_dir.cleanup()
+
+    def long_hash(self, greatwall: GreatWall) -> bytes:
+        greatwall.LONG_HASH_MEMORY_COST = 64
+        greatwall.set_tlp_param(5)
+        greatwall.state = self.sa1
+        greatwall.update_with_long_hash()
+        return greatwall.state
+
+    def test_interrupted_long_hash_resumes_from_checkpoint(self):
+        long_hash = GreatWall._long_hash
+        hashes_before_crash = [long_hash] * 3
+
+        def crashing_hash(greatwall, secret, hash_arena):
+            if not hashes_before_crash:
+                raise RuntimeError("Crash")
+            return hashes_before_crash.pop()(greatwall, secret, hash_arena)
+
+        interrupted_greatwall = GreatWall()
+        interrupted_greatwall.set_checkpointing(2, self.checkpoint_path)
+        with mock.patch.object(GreatWall, "_long_hash", crashing_hash):
+            with self.assertRaises(RuntimeError):
+                self.long_hash(interrupted_greatwall)
+        checkpoint_files = list(self.checkpoint_path.iterdir())
+        self.assertEqual(1, len(checkpoint_files))
+        self.assertNotIn(self.sa1, checkpoint_files[0].read_bytes())
+
+        resumed_greatwall = GreatWall()
+        resumed_greatwall.set_checkpointing(2, self.checkpoint_path)
+        self.assertEqual(self.expected_state, self.long_hash(resumed_greatwall))
+        progress = resumed_greatwall.long_hash_progress()
+        self.assertEqual(2, progress["resumed_iterations"])
+        self.assertEqual(5, progress["iterations_done"])
+        self.assertEqual(0, progress["remaining"])
+        self.assertEqual([], list(self.checkpoint_path.iterdir()))
+
+    def test_long_hash_is_the_same_without_hash_arena(self):
+        greatwall = GreatWall()
+        greatwall.set_hash_arena(False)
+        with mock.patch.object(
+            low_level, "hash_secret_raw", wraps=low_level.hash_secret_raw
+        ) as hash_secret_raw:
+            self.assertEqual(self.expected_state, self.long_hash(greatwall))
+        self.assertEqual(5, hash_secret_raw.call_count)
+
+    def test_tlp_profiles_have_their_own_long_hash_and_checkpoints(self):
+        greatwall = GreatWall()
+        with self.assertRaises(ValueError):
+            greatwall.set_tlp_profile(0)
+        greatwall.set_tlp_profile(2)
+        self.assertEqual(4, greatwall.LONG_HASH_PARALLELISM)
+        greatwall.set_checkpointing(2, self.checkpoint_path)
+        TLPCheckpoint(self.sa1, self.checkpoint_path).save(4, bytes(128))
+
+        state = self.sa1
+        for _ in range(5):
+            state = low_level.hash_secret_raw(
+                secret=state,
+                salt=GreatWall.ARGON2_SALT,
+                time_cost=8,
+                memory_cost=64,
+                parallelism=4,
+                hash_len=128,
+                type=low_level.Type.I,
+            )
+        self.assertEqual(state, self.long_hash(greatwall))
+        self.assertNotEqual(self.expected_state, state)
+        self.assertEqual(0, greatwall.long_hash_progress()["resumed_iterations"])
+
+    def test_concurrent_long_hashes_take_turns(self):
+        scheduler = HashScheduler(64 * 1024)
+        greatwalls = [GreatWall(), GreatWall()]
+        for greatwall in greatwalls:
+            greatwall.hash_scheduler = scheduler
+        threads = [
+            threading.Thread(target=self.long_hash, args=(greatwall,))
+            for greatwall in greatwalls
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([self.expected_state] * 2, [gw.state for gw in greatwalls])
+        info = scheduler.info()[LONG_HASH]
+        self.assertEqual(0, info["running"])
+        self.assertEqual(0, info["reserved_bytes"])
+        self.assertGreaterEqual(info["waits"]["count"], 2)
+
+    def test_checkpoints_are_private(self):
+        checkpoint_dir = self.checkpoint_path / "checkpoints"
+        checkpoint = TLPCheckpoint(self.sa1, checkpoint_dir)
+        threads = [
+            threading.Thread(target=checkpoint.save, args=(iteration, bytes(128)))
+            for iteration in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([checkpoint.path], list(checkpoint_dir.iterdir()))
+        self.assertIn(checkpoint.load()[0], range(8))
+        self.assertEqual(0o700, checkpoint_dir.stat().st_mode & 0o777)
+        self.assertEqual(0o600, checkpoint.path.stat().st_mode & 0o777)
+
+    def test_tampered_checkpoint_is_ignored(self):
+        checkpoint = TLPCheckpoint(self.sa1, self.checkpoint_path)
+        checkpoint.save(3, bytes(128))
+        checkpoint_data = bytearray(checkpoint.path.read_bytes())
+        checkpoint_data[-1] ^= 1
+        checkpoint.path.write_bytes(checkpoint_data)
+
+        greatwall = GreatWall()
+        greatwall.set_checkpointing(1, self.checkpoint_path)
+        self.assertIsNone(checkpoint.load())
+        self.assertEqual(self.expected_state, self.long_hash(greatwall))
+        self.assertEqual(0, greatwall.long_hash_progress()["resumed_iterations"])
+
+
+class TestProgress(unittest.TestCase):
+    def test_derivation_emits_progress_of_each_phase(self):
+        greatwall = GreatWall()
+        greatwall.LONG_HASH_MEMORY_COST = 64
+        greatwall.set_themed_mnemo("BIP39")
+        greatwall.set_tlp_param(3)
+        greatwall.set_depth(1)
+        greatwall.set_arity(2)
+        greatwall.set_sa0(greatwall.mnemo.to_mnemonic(bytes(range(16))))
+        events = []
+        greatwall.add_progress_listener(events.append)
+
+        greatwall.derive_key([2])
+
+        self.assertEqual(
+            [
+                (SA0_TO_SA1, 0, 1),
+                (SA0_TO_SA1, 1, 1),
+                (SA1_TO_SA2, 0, 3),
+                (SA1_TO_SA2, 1, 3),
+                (SA1_TO_SA2, 2, 3),
+                (SA1_TO_SA2, 3, 3),
+                (SA2_TO_SA3, 0, 1),
+                (SA2_TO_SA3, 1, 1),
+                (LEVEL, 0, 1),
+                (LEVEL, 1, 1),
+            ],
+            [(event.phase, event.iteration, event.iterations) for event in events],
+        )
+        self.assertEqual(0, events[-1].remaining)
+        self.assertEqual(3, greatwall.timing_info()[SA1_TO_SA2]["count"])
+
+        greatwall.remove_progress_listener(events.append)
+        greatwall.derive_key([1])
+        self.assertEqual(10, len(events))
+
+
+class TestCancellation(unittest.TestCase):
+    # NOTE: Slack for thread scheduling on top of the hash in flight.
+    LATENCY_MARGIN_SECONDS = 0.5
+
+    def setUp(self):
+        self.greatwall = GreatWall()
+        self.greatwall.LONG_HASH_MEMORY_COST = 4096
+        self.greatwall.set_themed_mnemo("BIP39")
+        self.greatwall.set_depth(1)
+        self.greatwall.set_arity(256)
+        self.greatwall.set_hashing_workers(1)
+        self.greatwall.set_prefetch_budget(0)
+
+    def cancel_after(self, seconds: float, task) -> float:
+        """Run the task in a thread, cancel it and return the cancel latency."""
+        thread = threading.Thread(target=task)
+        thread.start()
+        time.sleep(seconds)
+        cancel_time = time.perf_counter()
+        self.greatwall.cancel_execution()
+        thread.join(timeout=60)
+        self.assertFalse(thread.is_alive())
+        return time.perf_counter() - cancel_time
+
+    def test_cancel_stops_long_hash_within_one_iteration(self):
+        checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(checkpoint_dir.cleanup)
+        self.greatwall.set_checkpointing(1000, Path(checkpoint_dir.name))
+        self.greatwall.set_tlp_param(24 * 7 * 4 * 3)
+        self.greatwall.set_sa0(self.greatwall.mnemo.to_mnemonic(bytes(16)))
+
+        latency = self.cancel_after(0.5, self.greatwall.init_state_hashes)
+
+        max_iteration_seconds = self.greatwall.timing_info()[SA1_TO_SA2]["max"]
+        self.assertLess(latency, max_iteration_seconds + self.LATENCY_MARGIN_SECONDS)
+        self.assertFalse(self.greatwall.is_initialized)
+        iterations_done = self.greatwall.long_hash_progress()["iterations_done"]
+        self.assertLess(iterations_done, 24 * 7 * 4 * 3)
+        checkpoint = TLPCheckpoint(self.greatwall.sa1, Path(checkpoint_dir.name))
+        self.assertEqual(iterations_done, checkpoint.load()[0])
+
+    def test_cancel_stops_branches_hashing_within_one_hash(self):
+        self.greatwall.state = bytes(range(128))
+
+        queries = []
+        latency = self.cancel_after(
+            0.2, lambda: queries.append(self.greatwall.get_li_str_query())
+        )
+
+        quick_hash_seconds = 0.1
+        self.assertLess(latency, quick_hash_seconds + self.LATENCY_MARGIN_SECONDS)
+        self.assertEqual([""], queries)
+
+    def test_cancel_terminates_rendering_processes(self):
+        self.greatwall.set_rendering_workers(2)
+        self.addCleanup(self.greatwall.shutdown_rendering_pool)
+        fractals_params = [(constants.MANDELBROT, 2.5371, 0.123)] * 8
+        self.greatwall._render_fractals(fractals_params[:2], 8)
+        processes = multiprocessing.active_children()
+
+        fractals = []
+        latency = self.cancel_after(
+            0.2,
+            lambda: fractals.append(self.greatwall._render_fractals(fractals_params)),
+        )
+
+        self.assertLess(latency, self.LATENCY_MARGIN_SECONDS)
+        self.assertEqual([None], fractals)
+        for process in processes:
+            process.join(timeout=5)
+            self.assertFalse(process.is_alive())
+        self.greatwall.is_canceled = False
+        fractals = self.greatwall._render_fractals(fractals_params[:2], 8)
+        self.assertEqual(2, len(fractals))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,15 @@
 import sys
+import time
 import unittest
+from unittest import mock
 
 from PyQt5.QtCore import QState, QCoreApplication, Qt
 from PyQt5.QtTest import QTest
 from PyQt5.QtWidgets import QApplication
 
-from gui import GreatWallGui
+from gui import GreatWallGui, GreatWallThread
 from resources.greatwall import GreatWall
+from resources.helpers import constants
 
 app = QApplication(sys.argv)
 
@@ -19,6 +22,33 @@ class TestGreatWallGui(unittest.TestCase):
     def tearDown(self):
         self.greatWallGui.close()
 
+    def test_thread_removes_its_progress_listener(self):
+        greatwall = GreatWall()
+        thread = GreatWallThread(greatwall)
+        thread._is_initializing = False
+        with mock.patch.object(greatwall, "derive_from_user_choice"):
+            thread.run()
+            thread.run()
+
+        self.assertEqual([], greatwall._progress_listeners)
+
+    def test_stale_fractal_refinements_are_dropped(self):
+        gui = self.greatWallGui
+        gui.greatwall.FRACTAL_SIZE = 8
+        gui.fractal_query_params = [(constants.MANDELBROT, 2.5371, 0.123)] * 3
+        refined = []
+        gui.on_fractal_refined = lambda option, params, pixels: refined.append(option)
+        # NOTE: The pool is kept busy until the level changes.
+        gui.fractal_refinement_pool.start(lambda: time.sleep(0.2))
+        gui.on_fractal_refinement_request(1)
+        gui.cancel_fractal_refinements()
+        gui.on_fractal_refinement_request(2)
+        gui.on_fractal_refinement_request(2)
+        gui.fractal_refinement_pool.waitForDone()
+        QCoreApplication.processEvents()
+
+        self.assertEqual([2], refined)
+
     def test_formosa_BIP39_integration(self):
         # test_init_main_app_state
         main_gui_state_machine = self.greatWallGui.main_gui_state
@@ -0,0 +1,201 @@
+import contextlib
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from resources.knowledge.mnemonic import mnemonic
+from resources.knowledge.mnemonic.mnemonic import (
+    Mnemonic,
+    ThemeAmbiguous,
+    ThemeNotFound,
+)
+
+module_patches = contextlib.ExitStack()
+
+
+def setUpModule():
+    # NOTE: The compiled indexes go to a temporary directory, not the cache of
+    # the user.
+    index_dir = module_patches.enter_context(tempfile.TemporaryDirectory())
+    module_patches.enter_context(
+        mock.patch.object(mnemonic, "INDEX_PATH", Path(index_dir))
+    )
+    module_patches.enter_context(mock.patch.dict(mnemonic._loaded_indexes, clear=True))
+
+
+def tearDownModule():
+    module_patches.close()
+
+
+class TestThemeIndex(unittest.TestCase):
+    def setUp(self):
+        self.index_dir = tempfile.TemporaryDirectory()
+        self.patches = [
+            mock.patch.object(mnemonic, "INDEX_PATH", Path(self.index_dir.name)),
+            mock.patch.dict(mnemonic._loaded_indexes, clear=True),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.index_dir.cleanup()
+
+    def test_instances_share_the_theme_index(self):
+        first_mnemo = Mnemonic("medieval_fantasy")
+        second_mnemo = Mnemonic("medieval_fantasy")
+
+        self.assertIs(first_mnemo.theme_index, second_mnemo.theme_index)
+        self.assertIs(first_mnemo.words_dictionary, second_mnemo.words_dictionary)
+        self.assertTrue((Path(self.index_dir.name) / "medieval_fantasy.idx").is_file())
+
+    def test_stale_index_file_is_compiled_again(self):
+        index_file = Path(self.index_dir.name) / "BIP39.idx"
+        expected_wordlist = Mnemonic("BIP39").wordlist
+        stale_hash = bytes(32)
+        mnemonic._write_index_file(
+            index_file, stale_hash, mnemonic.ThemeIndex.compile({"FILLING_ORDER": []})
+        )
+        mnemonic._loaded_indexes.clear()
+
+        self.assertEqual(expected_wordlist, Mnemonic("BIP39").wordlist)
+        self.assertNotEqual(
+            stale_hash, mnemonic.INDEX_HEADER.unpack_from(index_file.read_bytes())[4]
+        )
+
+    def test_corrupted_index_file_is_compiled_again(self):
+        index_file = Path(self.index_dir.name) / "BIP39.idx"
+        expected_wordlist = Mnemonic("BIP39").wordlist
+        index_data = bytearray(index_file.read_bytes())
+        index_data[-1] ^= 1
+        index_file.write_bytes(index_data)
+        mnemonic._loaded_indexes.clear()
+
+        self.assertEqual(expected_wordlist, Mnemonic("BIP39").wordlist)
+        self.assertNotEqual(index_data, index_file.read_bytes())
+
+    def test_index_file_of_another_interpreter_is_compiled_again(self):
+        index_file = Path(self.index_dir.name) / "BIP39.idx"
+        Mnemonic("BIP39")
+        mnemonic._loaded_indexes.clear()
+
+        with mock.patch.object(mnemonic, "INDEX_CACHE_TAG", b"other-310"):
+            Mnemonic("BIP39")
+            header = mnemonic.INDEX_HEADER.unpack_from(index_file.read_bytes())
+        self.assertEqual(b"other-310", header[3].rstrip(b"\0"))
+
+    def test_index_matches_theme_dictionary(self):
+        theme_index = Mnemonic("cute_pets").theme_index
+        words_dictionary = theme_index.words_dictionary
+
+        self.assertEqual(words_dictionary.wordlist, list(theme_index.wordlist))
+        self.assertEqual(words_dictionary.natural_map, list(theme_index.natural_map))
+        self.assertEqual(words_dictionary.filling_map, list(theme_index.filling_map))
+        self.assertEqual(
+            words_dictionary.bits_fill_sequence, list(theme_index.bits_fill_sequence)
+        )
+
+
+class TestThemeDict(unittest.TestCase):
+    def test_structural_properties_are_memoized(self):
+        words_dictionary = mnemonic.ThemeDict(
+            Mnemonic("medieval_fantasy").words_dictionary.inner_dict
+        )
+
+        self.assertIs(words_dictionary["VERB"], words_dictionary["VERB"])
+        self.assertIs(
+            words_dictionary.restriction_sequence, words_dictionary.restriction_sequence
+        )
+        self.assertIs(words_dictionary["VERB"].mapping, words_dictionary["VERB"].mapping)
+
+    def test_modification_clears_memoized_properties(self):
+        words_dictionary = mnemonic.ThemeDict(
+            {"FILLING_ORDER": ["VERB"], "NATURAL_ORDER": ["VERB"]}
+        )
+        self.assertEqual([0], words_dictionary.natural_map)
+
+        words_dictionary["FILLING_ORDER"] = ["SUBJECT", "VERB"]
+        words_dictionary["NATURAL_ORDER"] = ["VERB", "SUBJECT"]
+
+        self.assertEqual([1, 0], words_dictionary.natural_map)
+        self.assertEqual(1, words_dictionary.natural_index("SUBJECT"))
+        with self.assertRaises(ValueError):
+            words_dictionary.fill_index("OBJECT")
+
+    def test_compiled_indexes_match_theme_dictionary(self):
+        for theme in ["medieval_fantasy", "BIP39"]:
+            mnemo = Mnemonic(theme)
+            mnemonic_words = mnemo.to_mnemonic(bytes(range(32))).split(" ")
+            self.assertEqual(
+                mnemo.words_dictionary.get_phrase_indexes(mnemonic_words),
+                mnemo.theme_index.get_phrase_indexes(mnemonic_words),
+            )
+            self.assertEqual(bytes(range(32)), mnemo.to_entropy(mnemonic_words))
+
+    def test_compiled_indexes_reject_unknown_words(self):
+        mnemo = Mnemonic("medieval_fantasy")
+        mnemonic_words = mnemo.to_mnemonic(bytes(range(4))).split(" ")
+        mnemonic_words[-1] = "abandon"
+
+        with self.assertRaises(ValueError):
+            mnemo.theme_index.get_phrase_indexes(mnemonic_words)
+        self.assertFalse(mnemo.check(mnemonic_words))
+
+
+class TestBitStream(unittest.TestCase):
+    def test_reader_reads_big_endian_fields(self):
+        data_bits = mnemonic.BitReader.from_bytes(bytes([0b00010110, 0b10000001]))
+
+        self.assertEqual(0b0001, data_bits.read(4))
+        self.assertEqual(0b0110100, data_bits.read(7))
+        self.assertEqual(0b00001, data_bits.read(5))
+        with self.assertRaises(ValueError):
+            data_bits.read(1)
+
+    def test_writer_keeps_leading_zeroes(self):
+        data_bits = mnemonic.BitWriter()
+        data_bits.write(0, 11)
+        data_bits.write(0b101, 3)
+        data_bits.write(1, 2)
+
+        self.assertEqual(16, data_bits.bit_length)
+        self.assertEqual(0b101 << 2 | 1, data_bits.value)
+        self.assertEqual((0, 0b10101), data_bits.split(5))
+        with self.assertRaises(ValueError):
+            data_bits.write(4, 2)
+
+    def test_mnemonic_round_trip(self):
+        for theme in ["cute_pets", "BIP39"]:
+            mnemo = Mnemonic(theme)
+            for entropy in [bytes(4), bytes(range(16)), b"\xff" * 32]:
+                mnemonic_words = mnemo.to_mnemonic(entropy)
+                self.assertEqual(entropy, mnemo.to_entropy(mnemonic_words))
+                self.assertTrue(mnemo.check(mnemonic_words))
+
+
+class TestDetectTheme(unittest.TestCase):
+    def test_detect_theme_of_each_theme(self):
+        for theme in Mnemonic.find_themes():
+            mnemonic_words = Mnemonic(theme).to_mnemonic(bytes(range(16)))
+            self.assertEqual(theme, Mnemonic.detect_theme(mnemonic_words))
+
+    def test_detect_theme_errors(self):
+        with self.assertRaises(ThemeNotFound):
+            Mnemonic.detect_theme("abandon zzzz")
+        with self.assertRaises(ThemeAmbiguous):
+            Mnemonic.detect_theme("abandon")
+
+    def test_themes_are_loaded_once(self):
+        with mock.patch.object(
+            mnemonic, "load_theme_index", wraps=mnemonic.load_theme_index
+        ) as load_theme_index, mock.patch.dict(mnemonic._word_themes, clear=True):
+            Mnemonic.detect_theme("abandon ability")
+            Mnemonic.detect_theme("abandon ability")
+
+        self.assertEqual(len(Mnemonic.find_themes()), load_theme_index.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from pathlib import Path
+from unittest import mock
+
+from resources.batch import BatchJob, run_batch
+from resources.greatwall import GreatWall
+from resources.helpers.checkpoint import TLPCheckpoint
+from resources.helpers.profiles import TLP_PROFILES, TLPProfile
+from resources.helpers.solver_client import (
+    TLPSolverClient,
+    TLPSolverConnectionError,
+    TLPSolverError,
+)
+from resources.knowledge.mnemonic.mnemonic import Mnemonic
+from resources.solver import DONE, QUEUED, SolverServer, TLPSolver
+
+
+class TestSolver(unittest.TestCase):
+    def setUp(self):
+        profiles = mock.patch.dict(
+            TLP_PROFILES,
+            {1: TLPProfile(1, 8, 64, 1, "v1"), 2: TLPProfile(2, 8, 64, 4, "v2")},
+        )
+        profiles.start()
+        self.addCleanup(profiles.stop)
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.state_dir.cleanup)
+        self.sa1 = bytes(range(128))
+
+    def long_hash(self, tlp_param: int, tlp_profile: int) -> bytes:
+        greatwall = GreatWall()
+        greatwall.set_tlp_param(tlp_param)
+        greatwall.set_tlp_profile(tlp_profile)
+        greatwall.state = self.sa1
+        greatwall.update_with_long_hash()
+        return greatwall.state
+
+    def start_solver(self, **kwargs) -> tuple[TLPSolver, str]:
+        solver = TLPSolver(
+            1024**3, max_workers=2, state_dir=self.state_dir.name, **kwargs
+        )
+        server = SolverServer(("127.0.0.1", 0), solver)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        solver.start()
+        self.addCleanup(solver.stop)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return solver, f"http://127.0.0.1:{server.server_port}"
+
+    def wait_until_done(self, solver: TLPSolver, job_id: str):
+        for _ in range(1000):
+            if solver.get(job_id).status == DONE:
+                return
+            time.sleep(0.01)
+        self.fail("The job is not done.")
+
+    def test_greatwall_outsources_long_hash(self):
+        _, url = self.start_solver()
+        greatwall = GreatWall()
+        greatwall.SOLVER_POLL_SECONDS = 0.01
+        greatwall.set_tlp_solver(url)
+        greatwall.set_tlp_param(3)
+        greatwall.set_tlp_profile(2)
+        greatwall.state = self.sa1
+        greatwall.update_with_solver()
+
+        self.assertEqual(self.long_hash(3, 2), greatwall.state)
+        self.assertEqual(3, greatwall.long_hash_progress()["iterations_done"])
+        client = TLPSolverClient(url)
+        with self.assertRaises(TLPSolverError):
+            client.submit(self.sa1, 3, 0)
+        with self.assertRaises(TLPSolverError):
+            client.get("0" * 32)
+
+    def test_greatwall_polls_unreachable_solver_again(self):
+        _, url = self.start_solver()
+        greatwall = GreatWall()
+        greatwall.SOLVER_POLL_SECONDS = 0.01
+        greatwall.set_tlp_solver(url)
+        greatwall.set_tlp_param(2)
+        greatwall.state = self.sa1
+        get = greatwall.tlp_solver.get
+        failed_gets = []
+
+        def get_once_reachable(job_id):
+            if len(failed_gets) < 2:
+                failed_gets.append(job_id)
+                raise TLPSolverConnectionError("The solver cannot be reached.")
+            return get(job_id)
+
+        with mock.patch.object(
+            greatwall.tlp_solver, "get", side_effect=get_once_reachable
+        ), mock.patch.object(greatwall.tlp_solver, "delete") as delete:
+            greatwall.update_with_solver()
+
+        self.assertEqual(2, len(failed_gets))
+        self.assertEqual(self.long_hash(2, 1), greatwall.state)
+        delete.assert_called_once()
+
+    def test_batch_outsources_long_hashes(self):
+        _, url = self.start_solver()
+        job = {
+            "sa0": Mnemonic("BIP39").to_mnemonic(bytes(range(16))),
+            "tlp_param": 2,
+            "depth": 1,
+            "arity": 2,
+            "path": [1],
+        }
+        local_result = next(run_batch([job], memory_budget=1024**3))
+        solver_result = next(
+            run_batch([job], memory_budget=BatchJob.BASE_MEMORY_BYTES, tlp_solver=url)
+        )
+        self.assertEqual(local_result["ka"], solver_result["ka"])
+
+    def test_requests_are_refused(self):
+        solver, url = self.start_solver(max_queued_jobs=1)
+        solver.stop()
+        body = json.dumps({"sa1": self.sa1.hex(), "tlp_param": 1}).encode()
+
+        def post(content_type: str, data: bytes = body) -> int:
+            request = urllib.request.Request(
+                url + "/jobs", data=data, headers={"Content-Type": content_type}
+            )
+            try:
+                with urllib.request.urlopen(request) as response:
+                    return response.status
+            except urllib.error.HTTPError as error:
+                return error.code
+
+        self.assertEqual(415, post("text/plain"))
+        self.assertEqual(415, post("application/x-www-form-urlencoded"))
+        for job in [
+            {"sa1": self.sa1.hex(), "tlp_param": True},
+            {"sa1": self.sa1.hex(), "tlp_param": 1, "tlp_profile": True},
+        ]:
+            self.assertEqual(400, post("application/json", json.dumps(job).encode()))
+        self.assertEqual(202, post("application/json; charset=utf-8"))
+        self.assertEqual(429, post("application/json"))
+
+    def test_jobs_are_private(self):
+        solver = TLPSolver(1024**3, state_dir=self.state_dir.name)
+        job = solver.submit(self.sa1, 2)
+        other_job = solver.submit(self.sa1, 2)
+        checkpoint = TLPCheckpoint(self.sa1, solver.checkpoint_dir)
+        checkpoint.save(1, bytes(128))
+
+        state_dir = Path(self.state_dir.name)
+        self.assertEqual(0o700, stat.S_IMODE(os.stat(state_dir).st_mode))
+        self.assertEqual(0o700, stat.S_IMODE(os.stat(solver.jobs_dir).st_mode))
+        job_file = solver.jobs_dir / f"{job.job_id}.json"
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(job_file).st_mode))
+
+        # NOTE: The checkpoint of the puzzle is kept for the other job.
+        solver.delete(job.job_id)
+        self.assertIsNotNone(checkpoint.load())
+        solver.start()
+        self.addCleanup(solver.stop)
+        self.wait_until_done(solver, other_job.job_id)
+        self.assertIsNone(checkpoint.load())
+        self.assertIsNone(solver.get(other_job.job_id).sa1)
+        other_job_file = solver.jobs_dir / f"{other_job.job_id}.json"
+        self.assertIsNone(json.loads(other_job_file.read_text())["sa1"])
+
+    def test_queued_jobs_survive_restart(self):
+        solver = TLPSolver(1024**3, state_dir=self.state_dir.name)
+        job = solver.submit(self.sa1, 2)
+
+        restarted_solver = TLPSolver(1024**3, state_dir=self.state_dir.name)
+        self.assertEqual(QUEUED, restarted_solver.get(job.job_id).status)
+        restarted_solver.start()
+        self.addCleanup(restarted_solver.stop)
+        self.wait_until_done(restarted_solver, job.job_id)
+        self.assertEqual(self.long_hash(2, 1), restarted_solver.get(job.job_id).sa2)
+
+        self.assertTrue(restarted_solver.delete(job.job_id))
+        self.assertIsNone(
+            TLPSolver(1024**3, state_dir=self.state_dir.name).get(job.job_id)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
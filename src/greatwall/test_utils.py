@@ -0,0 +1,245 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+from argon2 import exceptions, low_level
+
+from resources.helpers.arena import Argon2Arena
+from resources.helpers.cache import LRUCache
+from resources.helpers.progress import PhaseTimings, ProgressEvent
+from resources.helpers.scheduler import LONG_HASH, QUICK_HASH, HashScheduler
+from resources.helpers.utils import (
+    DerivationPath,
+    FormosaTacitKnowledgeParam,
+    FractalTacitKnowledgeParam,
+    TacitKnowledgeParam,
+)
+
+
+class TestDerivationPath(unittest.TestCase):
+    def test_paths_are_structurally_equal(self):
+        path = DerivationPath().child(1).child(11)
+
+        self.assertEqual(DerivationPath((1, 11)), path)
+        self.assertEqual(hash(DerivationPath((1, 11))), hash(path))
+        self.assertNotEqual(DerivationPath((11, 1)), path)
+        self.assertNotEqual(DerivationPath((1, 1, 1)), path)
+        self.assertEqual("1 -> 11", str(path))
+
+    def test_contains_matches_whole_nodes(self):
+        path = DerivationPath((11, 2))
+
+        self.assertIn(11, path)
+        self.assertNotIn(1, path)
+
+    def test_prefix_and_parent(self):
+        path = DerivationPath((3, 1, 2))
+
+        self.assertEqual(DerivationPath((3, 1)), path.parent)
+        self.assertEqual(DerivationPath(), DerivationPath().parent)
+        self.assertTrue(DerivationPath().is_prefix_of(path))
+        self.assertTrue(path.parent.is_prefix_of(path))
+        self.assertTrue(path.is_prefix_of(path))
+        self.assertFalse(path.is_prefix_of(path.parent))
+        self.assertFalse(DerivationPath((3, 2)).is_prefix_of(path))
+
+
+class TestTacitKnowledgeParam(unittest.TestCase):
+    def setUp(self):
+        self.state = bytes(range(128))
+        self.branch_idxs = [3, 0, 2, 1]
+
+    def test_branches_values_match_single_values(self):
+        values = FormosaTacitKnowledgeParam.get_branches_values(
+            self.state, self.branch_idxs, max_workers=2
+        )
+        expected = [
+            FormosaTacitKnowledgeParam(
+                self.state, branch_idx=idx.to_bytes(length=4, byteorder="big")
+            ).get_value()
+            for idx in self.branch_idxs
+        ]
+        self.assertEqual(expected, values)
+
+    def test_fractal_branches_values_match_single_values(self):
+        values = FractalTacitKnowledgeParam.get_branches_values(
+            self.state, self.branch_idxs, imag_p="imag_p".encode(encoding="utf-8")
+        )
+        expected = [
+            FractalTacitKnowledgeParam(
+                self.state,
+                branch_idx=idx.to_bytes(length=4, byteorder="big"),
+                imag_p="imag_p".encode(encoding="utf-8"),
+            ).get_value()
+            for idx in self.branch_idxs
+        ]
+        self.assertEqual(expected, values)
+
+    def test_chains_hash_their_shared_prefix_once(self):
+        TacitKnowledgeParam.clear_links()
+        branch_idx = (2).to_bytes(length=4, byteorder="big")
+
+        def chain(*params_bytes):
+            state = self.state
+            for param_bytes in params_bytes:
+                state = low_level.hash_secret_raw(
+                    secret=state + param_bytes,
+                    salt=TacitKnowledgeParam.ARGON2_SALT,
+                    time_cost=32,
+                    memory_cost=1024,
+                    parallelism=1,
+                    hash_len=128,
+                    type=low_level.Type.I,
+                )
+            return state[: TacitKnowledgeParam.NUM_BYTES_FORM]
+
+        expected_real_p = chain(branch_idx, b"real_p")
+        expected_imag_p = chain(branch_idx, b"imag_p")
+        with mock.patch.object(
+            low_level, "hash_secret_raw", wraps=low_level.hash_secret_raw
+        ) as hash_secret_raw:
+            real_p = TacitKnowledgeParam(
+                self.state, branch_idx=branch_idx, real_p=b"real_p"
+            ).get_value()
+            imag_p = TacitKnowledgeParam(
+                self.state, branch_idx=branch_idx, imag_p=b"imag_p"
+            ).get_value()
+        self.assertEqual(3, hash_secret_raw.call_count)
+        self.assertEqual((expected_real_p, expected_imag_p), (real_p, imag_p))
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(max_bytes=8)
+        cache["a"] = b"1234"
+        cache["b"] = b"5678"
+        self.assertEqual(b"1234", cache.get("a"))
+        cache["c"] = b"90"
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(6, cache.size)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((1, 1, 1), (cache.hits, cache.misses, cache.evictions))
+
+    def test_pinned_entry_is_not_evicted(self):
+        cache = LRUCache(max_bytes=4, is_pinned=lambda key: key == "a")
+        cache["a"] = b"1234"
+        cache["b"] = b"5678"
+
+        self.assertEqual(["a"], cache.keys())
+
+    def test_uint8_storage_keeps_displayed_levels(self):
+        pixels = np.random.default_rng(0).random((16, 16))
+        pixels[0, 0], pixels[0, 1] = 0.0, 1.0
+        cache = LRUCache(dtype=np.uint8)
+        cache["a"] = ["label", pixels]
+
+        label, stored_pixels = cache["a"]
+        self.assertEqual("label", label)
+        self.assertEqual(16 * 16, cache.size - len("label"))
+        np.testing.assert_array_equal(
+            np.require(pixels * 255, np.uint8, "C"),
+            np.require(stored_pixels * 255, np.uint8, "C"),
+        )
+
+
+class TestArgon2Arena(unittest.TestCase):
+    def test_hashes_match_low_level(self):
+        hash_kwargs = dict(
+            salt=bytes(16),
+            time_cost=2,
+            memory_cost=64,
+            parallelism=1,
+            hash_len=128,
+            type=low_level.Type.I,
+        )
+        with Argon2Arena(64, huge_pages=True) as arena:
+            for secret in [b"secret", bytes(range(128))]:
+                self.assertEqual(
+                    low_level.hash_secret_raw(secret=secret, **hash_kwargs),
+                    arena.hash_secret_raw(secret=secret, **hash_kwargs),
+                )
+            with self.assertRaises(exceptions.HashingError):
+                arena.hash_secret_raw(
+                    secret=b"secret", **dict(hash_kwargs, memory_cost=128)
+                )
+        with self.assertRaises(exceptions.HashingError):
+            arena.hash_secret_raw(secret=b"secret", **hash_kwargs)
+
+
+class TestHashScheduler(unittest.TestCase):
+    def test_long_hashes_take_turns_within_budget(self):
+        available_bytes = [100]
+        scheduler = HashScheduler(15, available_memory=lambda: available_bytes[0])
+        scheduler.POLL_SECONDS = 0.01
+        self.assertTrue(scheduler.acquire(10))
+        admitted = []
+        waiting_hash = threading.Thread(
+            target=lambda: admitted.append(scheduler.acquire(10))
+        )
+        waiting_hash.start()
+        while not scheduler.info()[LONG_HASH]["queued"]:
+            time.sleep(0.01)
+
+        self.assertTrue(scheduler.has_waiting_long_hashes())
+        self.assertFalse(scheduler.acquire(1, is_canceled=lambda: True))
+        self.assertTrue(scheduler.acquire(1024, interactive=True))
+        scheduler.release(1024, interactive=True)
+        scheduler.release(10)
+        waiting_hash.join()
+        self.assertEqual([True], admitted)
+
+        available_bytes[0] = 3
+        admitted.clear()
+        waiting_hash = threading.Thread(
+            target=lambda: admitted.append(scheduler.acquire(4))
+        )
+        waiting_hash.start()
+        time.sleep(0.05)
+        self.assertEqual([], admitted)
+        available_bytes[0] = 100
+        waiting_hash.join()
+        self.assertEqual([True], admitted)
+
+        info = scheduler.info()
+        self.assertEqual(2, info[LONG_HASH]["running"])
+        self.assertEqual(14, info[LONG_HASH]["reserved_bytes"])
+        self.assertEqual(3, info[LONG_HASH]["waits"]["count"])
+        self.assertEqual(1, info[QUICK_HASH]["waits"]["count"])
+        self.assertEqual(0, info[QUICK_HASH]["running"])
+
+    def test_long_hash_larger_than_budget_runs_alone(self):
+        scheduler = HashScheduler(10, available_memory=lambda: None)
+        self.assertTrue(scheduler.acquire(20))
+        self.assertFalse(scheduler.acquire(1, is_canceled=lambda: True))
+        scheduler.release(20)
+        self.assertTrue(scheduler.acquire(1))
+
+
+class TestPhaseTimings(unittest.TestCase):
+    def test_hash_times_are_bucketed_by_phase(self):
+        phase_timings = PhaseTimings()
+        for phase, hash_seconds in [
+            ("A", None),
+            ("A", 0.0005),
+            ("A", 0.003),
+            ("A", 0.004),
+            ("B", 1.5),
+        ]:
+            phase_timings.record(ProgressEvent(phase, 1, 1, hash_seconds=hash_seconds))
+
+        timings = phase_timings.info()
+        self.assertEqual({1: 1, 4: 2}, timings["A"]["histogram"])
+        self.assertEqual(3, timings["A"]["count"])
+        self.assertEqual(0.0005, timings["A"]["min"])
+        self.assertEqual({2048: 1}, timings["B"]["histogram"])
+
+        phase_timings.clear()
+        self.assertEqual({}, phase_timings.info())
+
+
+if __name__ == '__main__':
+    unittest.main()